@@ -0,0 +1,86 @@
+"""
+异步并发大模型客户端
+在asyncio中并发执行阻塞的大模型调用,统一控制并发数、RPM/TPM限流和 Retry-After 退避
+"""
+import asyncio
+from typing import Any, Callable, List, Optional
+
+from api_clients.rate_limiter import RateLimiter, extract_total_tokens, get_retry_after
+
+
+class AsyncLLMClient:
+    """异步并发大模型客户端"""
+
+    def __init__(self, max_concurrent: int = 4, rate_limiter: Optional[RateLimiter] = None,
+                 max_retries: int = 3):
+        """
+        初始化客户端
+        :param max_concurrent: 最大并发调用数
+        :param rate_limiter: 限流器(与同步调用共享同一个实例即可统一限流)
+        :param max_retries: 遇到限流错误时的最大重试次数
+        """
+        self.max_concurrent = max(1, max_concurrent)
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.max_retries = max_retries
+        self._semaphore = None
+        self._loop = None
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        """信号量绑定在事件循环上,每个事件循环单独创建"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+        return self._semaphore
+
+    async def call(self, func: Callable, *args, estimated_tokens: int = 0, **kwargs) -> Any:
+        """
+        限流后在线程中执行一次大模型调用
+        :param func: 阻塞调用函数,返回值中如有 usage 字段将用于修正TPM预估
+        :param estimated_tokens: 预估的Token数(输入+输出)
+        :return: 调用结果
+        """
+        async with self._get_semaphore():
+            for attempt in range(self.max_retries + 1):
+                await self.rate_limiter.acquire_async(estimated_tokens)
+                try:
+                    result = await asyncio.to_thread(func, *args, **kwargs)
+                except Exception as e:
+                    retry_after = get_retry_after(e)
+                    if retry_after is None or attempt >= self.max_retries:
+                        raise
+                    print(f"大模型限流,{retry_after:.1f}秒后重试 (第{attempt + 1}次)")
+                    self.rate_limiter.reconcile(estimated_tokens, 0)
+                    self.rate_limiter.pause(retry_after)
+                    continue
+
+                self.rate_limiter.reconcile(estimated_tokens, extract_total_tokens(result))
+                return result
+
+    async def run_task(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        在并发上限内于线程中执行一个任务(任务内部的大模型调用自行限流)
+        :param func: 阻塞任务函数
+        :return: 任务结果
+        """
+        async with self._get_semaphore():
+            return await asyncio.to_thread(func, *args, **kwargs)
+
+    async def gather(self, coroutines: List) -> List:
+        """
+        并发执行并按提交顺序返回结果,单个失败不影响其他任务
+        :param coroutines: 协程列表
+        :return: 结果列表,失败的位置为异常对象
+        """
+        return await asyncio.gather(*coroutines, return_exceptions=True)
+
+    def run(self, make_coroutines: Callable[[], List]) -> List:
+        """
+        在新的事件循环中执行一批协程(供同步代码调用)
+        :param make_coroutines: 返回协程列表的函数(协程需在事件循环内创建)
+        :return: 结果列表,失败的位置为异常对象
+        """
+        async def _main():
+            return await self.gather(make_coroutines())
+
+        return asyncio.run(_main())
@@ -4,190 +4,787 @@ Claude API 客户端封装
 """
 import json
 import os
-from typing import Dict, List, Optional
-from requests import Session
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from api_clients.async_llm_client import AsyncLLMClient
+from api_clients.json_stream import IncrementalJSONArrayParser, extract_json
+from api_clients.llm_cache import LLMResponseCache, get_default_cache
+from api_clients.llm_provider import ClaudeProvider, create_session
+from api_clients.rate_limiter import RateLimiter, extract_total_tokens
+from api_clients.usage_tracker import BudgetExceededError, UsageTracker, usage_context
+from processors.bm25_index import QUERY_FIELDS, candidate_pairs, checkpoint_text
+from processors.checkpoint_merger import CheckpointMerger
+from processors.text_chunker import TextChunker, estimate_tokens
+from utils.prompt_registry import get_prompt_registry
+
+
+# 单次请求发送的招标文件长度;参考答案和评估请求使用同一段文本作为前缀,以便命中服务端提示词缓存
+DOCUMENT_PREFIX_CHARS = 6000
+# 评估请求的前缀不缓存时只发送招标文件开头的摘录(没有缓存读取的折扣,不值得发送完整前缀)
+EVALUATION_EXCERPT_CHARS = 2000
+
+_DEFAULT_REFERENCE_PROMPT = """请分析上述招标文件，提取关键检查点（checkpoints）。
+
+请以JSON格式返回检查点列表，每个检查点包含：
+- id: 检查点ID
+- category: 分类（如：资质要求、投标截止时间、保证金等）
+- content: 检查点内容
+- importance: 重要程度（高/中/低）
+
+返回格式：
+{{
+  "checkpoints": [
+    {{
+      "id": "1",
+      "category": "分类",
+      "content": "具体内容",
+      "importance": "高"
+    }}
+  ]
+}}"""
+
+_DEFAULT_EVALUATION_PROMPT = """请评估上述招标文件解析算法的输出质量。
+
+算法输出：
+{algorithm_output}
+
+参考检查点：
+{reference_checkpoints}
+
+请从以下维度进行评估：
+1. 完整性：是否提取了所有关键信息
+2. 准确性：提取的信息是否正确
+3. 一致性：与参考答案的匹配度
+
+请以JSON格式返回评估结果：
+{{
+  "overall_score": 85,
+  "completeness_score": 80,
+  "accuracy_score": 90,
+  "consistency_score": 85,
+  "missing_checkpoints": [],
+  "incorrect_checkpoints": [],
+  "suggestions": []
+}}"""
+
+_DEFAULT_CONSOLIDATION_PROMPT = """以下检查点是从同一份招标文件的不同片段分别提取的，可能存在含义相同的重复项。
+
+检查点列表：
+{checkpoints}
+
+请合并含义相同的检查点（保留信息最完整的表述和最高的重要程度），不要新增或删除信息，按原顺序重新编号，以JSON格式返回：
+{{
+  "checkpoints": [
+    {{
+      "id": "1",
+      "category": "分类",
+      "content": "具体内容",
+      "importance": "高"
+    }}
+  ]
+}}"""
+
+_DEFAULT_PAIR_JUDGING_PROMPT = """以下是招标文件解析算法输出的检查点(A编号)，每个检查点下列出了按文本相似度检索到的参考检查点候选(R编号，标准答案)。
+
+{pairs}
+
+请结合上述招标文件逐个判断算法检查点：
+- reference: 与之对应的候选编号（如 "R3"），没有对应的候选时为 null
+- verdict: correct（与参考检查点一致）、incorrect（对应该参考检查点但内容有误）或 unmatched（没有对应的候选）
+- reason: verdict 为 incorrect 时说明错误原因
+
+只返回JSON：
+{{
+  "judgements": [
+    {{"algorithm": "A1", "reference": "R3", "verdict": "correct", "reason": ""}}
+  ]
+}}"""
+
+# 模板文件不存在时使用默认提示词;招标文件文本不在模板中,由 build_document_prefix 放在 system 前缀里
+get_prompt_registry().register('reference_generation', 'prompts/reference_generation.txt',
+                               default=_DEFAULT_REFERENCE_PROMPT)
+get_prompt_registry().register('evaluation', 'prompts/evaluation.txt', default=_DEFAULT_EVALUATION_PROMPT,
+                               required_fields=['algorithm_output', 'reference_checkpoints'])
+get_prompt_registry().register('pair_judging', 'prompts/pair_judging.txt', default=_DEFAULT_PAIR_JUDGING_PROMPT,
+                               required_fields=['pairs'])
+get_prompt_registry().register('reference_consolidation', 'prompts/reference_consolidation.txt',
+                               default=_DEFAULT_CONSOLIDATION_PROMPT, required_fields=['checkpoints'])
 
 
 class ClaudeClient:
     """Claude API客户端"""
 
-    def __init__(self, api_key: str = None, base_url: str = "https://api.anthropic.com"):
+    def __init__(self, api_key: str = None, base_url: str = "https://api.anthropic.com",
+                 cache: Optional[LLMResponseCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None, max_retries: int = 3,
+                 stream: bool = False, hedge_percentile: Optional[float] = None,
+                 prompt_caching: bool = True, usage_tracker: Optional[UsageTracker] = None):
         """
         初始化Claude客户端
         :param api_key: Claude API密钥(从环境变量读取)
         :param base_url: API基础URL
+        :param cache: 响应缓存(默认使用进程内共享的缓存)
+        :param rate_limiter: RPM/TPM限流器,多线程并发调用时共享同一实例
+        :param max_retries: 限流、超时和服务端错误的最大重试次数(指数退避,优先使用 Retry-After)
+        :param stream: 是否以流式方式调用(长输出不会因整体超时失败,并记录首Token延迟和生成速度)
+        :param hedge_percentile: 耗时超过该分位数时发出对冲请求,见 LLMProvider
+        :param prompt_caching: 是否为招标文件前缀加 cache_control,同一文件的后续请求按缓存价格计费且首Token更快
+        :param usage_tracker: 用量统计(默认使用进程内共享的统计)
         """
         self.api_key = api_key or os.getenv('CLAUDE_API_KEY', '')
         self.base_url = base_url
-        self.session = Session()
-        self.session.headers.update({
-            "x-api-key": self.api_key,
-            "anthropic-version": "2023-06-01",
-            "content-type": "application/json"
-        })
+        self.cache = cache if cache is not None else get_default_cache()
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.stream = stream
+        self.prompt_caching = prompt_caching
+        self.last_stream_metrics = None
+        self.session = create_session(self.api_key)
+        self.provider = ClaudeProvider(
+            self.api_key, base_url, session=self.session, cache=self.cache,
+            rate_limiter=rate_limiter, max_retries=max_retries, hedge_percentile=hedge_percentile,
+            usage_tracker=usage_tracker
+        )
 
-    def generate_reference_checkpoints(self, document_text: str, model: str = "claude-3-5-sonnet-20241022") -> List[Dict]:
+    def generate_reference_checkpoints(self, document_text: str, model: str = "claude-3-5-sonnet-20241022",
+                                       on_checkpoint: Optional[Callable[[Dict], None]] = None) -> List[Dict]:
         """
         生成参考答案检查点
         :param document_text: 招标文件文本内容
         :param model: Claude模型名称
+        :param on_checkpoint: 流式模式下每解析出一个完整检查点即回调,下游匹配可以提前开始
         :return: 参考检查点列表
         """
-        from conf.set_conf import read_yaml
-        import pathlib
+        payload = self.build_reference_payload(document_text, model)
 
-        # 读取提示词模板
-        prompt_file = pathlib.Path(__file__).parents[1] / 'config' / 'prompts' / 'reference_generation.txt'
         try:
-            with open(prompt_file, 'r', encoding='utf-8') as f:
-                template = f.read()
-        except FileNotFoundError:
-            # 如果模板文件不存在,使用默认提示词
-            template = """请分析以下招标文件，提取关键检查点（checkpoints）。
+            with usage_context(stage='reference_generation'):
+                return self._parse_checkpoints_response(self._send_reference(payload, on_checkpoint))
+        except BudgetExceededError:
+            raise
+        except Exception as e:
+            print(f"调用Claude API失败: {str(e)}")
+            return []
 
-招标文件内容：
-{document_text}
+    def _send_reference(self, payload: Dict, on_checkpoint: Optional[Callable[[Dict], None]]) -> Dict:
+        """发送参考答案请求,流式模式下边生成边回调检查点"""
+        if not self.stream:
+            return self.create_message(payload)
 
-请以JSON格式返回检查点列表，每个检查点包含：
-- id: 检查点ID
-- category: 分类（如：资质要求、投标截止时间、保证金等）
-- content: 检查点内容
-- importance: 重要程度（高/中/低）
+        parser = IncrementalJSONArrayParser('checkpoints')
 
-返回格式：
-{{
-  "checkpoints": [
-    {{
-      "id": "1",
-      "category": "分类",
-      "content": "具体内容",
-      "importance": "高"
-    }}
-  ]
-}}"""
+        def _emit_checkpoints(text):
+            for checkpoint in parser.feed(text):
+                on_checkpoint(checkpoint)
+        return self.stream_message(payload, on_text=_emit_checkpoints if on_checkpoint else None)
 
-        prompt = template.format(
-            document_text=document_text[:6000]  # 限制长度
-        )
+    def build_document_prefix(self, document_text: str, max_chars: Optional[int] = DOCUMENT_PREFIX_CHARS,
+                              cache: Optional[bool] = None) -> List[Dict]:
+        """
+        构造招标文件的 system 前缀
+        同一文件的参考答案和评估请求前缀逐字节相同,加 cache_control 后第二次起按缓存读取计费
+        (短于模型最小缓存长度时服务端忽略该标记)
+        :param document_text: 招标文件文本内容
+        :param max_chars: 文本截断长度,None表示不截断
+        :param cache: 是否标记为可缓存,None时按 prompt_caching 设置
+        :return: system 内容块列表
+        """
+        block = {
+            "type": "text",
+            "text": "招标文件内容：\n" + (document_text[:max_chars] if max_chars else document_text)
+        }
+        if self.prompt_caching if cache is None else cache:
+            block["cache_control"] = {"type": "ephemeral"}
+        return [block]
 
-        payload = {
+    def _evaluation_prefix(self, document_text: str, cache_prefix: Optional[bool]) -> List[Dict]:
+        """
+        评估请求的招标文件前缀: 可缓存时与参考答案请求相同(完整前缀),否则只发送开头的摘录
+        :param cache_prefix: 是否缓存招标文件前缀,None时按 prompt_caching 设置
+        """
+        cache = self.prompt_caching if cache_prefix is None else cache_prefix
+        max_chars = DOCUMENT_PREFIX_CHARS if cache else EVALUATION_EXCERPT_CHARS
+        return self.build_document_prefix(document_text, max_chars, cache)
+
+    def build_reference_payload(self, document_text: str, model: str = "claude-3-5-sonnet-20241022",
+                                max_chars: Optional[int] = DOCUMENT_PREFIX_CHARS,
+                                cache_prefix: Optional[bool] = None) -> Dict:
+        """
+        构造生成参考答案的请求体
+        :param document_text: 招标文件文本内容
+        :param model: Claude模型名称
+        :param max_chars: 文本截断长度,None表示不截断(分块生成时每块已控制长度)
+        :param cache_prefix: 是否缓存招标文件前缀,None时按 prompt_caching 设置
+        :return: /v1/messages 请求体
+        """
+        return {
             "model": model,
             "max_tokens": 4000,
-            "messages": [{"role": "user", "content": prompt}],
+            "system": self.build_document_prefix(document_text, max_chars, cache_prefix),
+            "messages": [{"role": "user", "content": get_prompt_registry().render('reference_generation')}],
             "temperature": 0.1  # 低温度确保稳定性
         }
 
-        try:
-            response = self.session.post(
-                f"{self.base_url}/v1/messages",
-                json=payload,
-                timeout=60
+    def generate_reference_checkpoints_map_reduce(self, document_text: str,
+                                                  model: str = "claude-3-5-sonnet-20241022",
+                                                  chunk_tokens: int = 3000, overlap_tokens: int = 200,
+                                                  max_concurrent: int = 4, similarity_threshold: float = 0.8,
+                                                  consolidation_model: Optional[str] = None) -> List[Dict]:
+        """
+        分块生成参考答案(map-reduce),覆盖整份招标文件而不只是前6000字
+        map: 按章节/句子边界分块,各块并发提取(限流由 rate_limiter 控制,每块的响应单独缓存,未变化的块不会重复请求)
+        reduce: 本地按内容相似度合并去重,可选再用较便宜的模型做一次整理
+        :param document_text: 招标文件全文
+        :param model: 分块提取使用的模型
+        :param chunk_tokens: 每块的Token上限
+        :param overlap_tokens: 相邻块的重叠Token数
+        :param max_concurrent: 最大并发请求数
+        :param similarity_threshold: 本地合并的内容相似度阈值
+        :param consolidation_model: 整理使用的模型,None表示不做整理
+        :return: 参考检查点列表,每项附带 source_chunks(来源分块序号)
+        """
+        chunks = TextChunker(chunk_tokens, overlap_tokens).chunk(document_text)
+        if not chunks:
+            return []
+        print(f"分块生成参考答案: {len(chunks)} 个分块 (并发数: {max_concurrent})")
+
+        llm_client = AsyncLLMClient(max_concurrent=max_concurrent)
+        with usage_context(stage='reference_generation'):
+            responses = llm_client.run(lambda: [
+                # 分块只请求一次,不值得付缓存写入的溢价
+                llm_client.run_task(self.create_message,
+                                    self.build_reference_payload(chunk['text'], model, None, cache_prefix=False))
+                for chunk in chunks
+            ])
+
+        merger = CheckpointMerger(similarity_threshold)
+        extracted = 0
+        for chunk, response in zip(chunks, responses):
+            if isinstance(response, BudgetExceededError):
+                raise response
+            if isinstance(response, Exception):
+                print(f"分块 {chunk['index']} 提取失败: {str(response)}")
+                continue
+            for checkpoint in self._parse_checkpoints_response(response) or []:
+                extracted += 1
+                merger.add(dict(checkpoint, source_chunks=[chunk['index']]))
+        checkpoints = merger.result()
+        print(f"分块提取 {extracted} 个检查点,合并去重后 {len(checkpoints)} 个")
+
+        if consolidation_model and len(checkpoints) > 1:
+            checkpoints = self._consolidate_checkpoints(checkpoints, consolidation_model)
+        return checkpoints
+
+    def _consolidate_checkpoints(self, checkpoints: List[Dict], model: str) -> List[Dict]:
+        """用大模型合并本地未识别出的同义检查点,失败时返回本地合并结果"""
+        prompt = get_prompt_registry().render(
+            'reference_consolidation',
+            checkpoints=json.dumps(
+                [{k: v for k, v in cp.items() if k != 'source_chunks'} for cp in checkpoints],
+                ensure_ascii=False, indent=2
             )
-            response.raise_for_status()
-            result = response.json()
-            return self._parse_checkpoints_response(result)
+        )
+        try:
+            with usage_context(stage='reference_consolidation'):
+                result = self.create_message({
+                    "model": model,
+                    "max_tokens": 8000,
+                    "messages": [{"role": "user", "content": prompt}],
+                    "temperature": 0
+                })
+            consolidated = self._parse_checkpoints_response(result)
+        except BudgetExceededError:
+            raise
         except Exception as e:
-            print(f"调用Claude API失败: {str(e)}")
-            return []
+            print(f"整理参考答案失败,使用本地合并结果: {str(e)}")
+            return checkpoints
+        if not consolidated:
+            return checkpoints
+        print(f"整理后 {len(consolidated)} 个检查点")
+        return consolidated
 
     def evaluate_checkpoints(self, document_text: str,
                             algorithm_output: List[Dict],
                             reference_checkpoints: List[Dict],
-                            model: str = "claude-3-5-sonnet-20241022") -> Dict:
+                            model: str = "claude-3-5-sonnet-20241022",
+                            cache_prefix: Optional[bool] = None) -> Dict:
         """
         评估算法输出
         :param document_text: 招标文件文本
         :param algorithm_output: 算法模型输出的检查点
         :param reference_checkpoints: 参考检查点
         :param model: Claude模型名称
+        :param cache_prefix: 是否缓存招标文件前缀,None时按 prompt_caching 设置;
+                             前缀没有被之前的请求写入缓存时应传False,否则只付写入溢价而没有读取
         :return: 评估结果
         """
-        import pathlib
+        payload = self.build_evaluation_payload(document_text, algorithm_output, reference_checkpoints, model,
+                                                cache_prefix)
 
-        # 读取评估提示词模板
-        prompt_file = pathlib.Path(__file__).parents[1] / 'config' / 'prompts' / 'evaluation.txt'
         try:
-            with open(prompt_file, 'r', encoding='utf-8') as f:
-                template = f.read()
-        except FileNotFoundError:
-            # 如果模板文件不存在,使用默认提示词
-            template = """请评估以下招标文件解析算法的输出质量。
-
-招标文件预览：
-{document_preview}
-
-算法输出：
-{algorithm_output}
-
-参考检查点：
-{reference_checkpoints}
-
-请从以下维度进行评估：
-1. 完整性：是否提取了所有关键信息
-2. 准确性：提取的信息是否正确
-3. 一致性：与参考答案的匹配度
-
-请以JSON格式返回评估结果：
-{{
-  "overall_score": 85,
-  "completeness_score": 80,
-  "accuracy_score": 90,
-  "consistency_score": 85,
-  "missing_checkpoints": [],
-  "incorrect_checkpoints": [],
-  "suggestions": []
-}}"""
+            with usage_context(stage='evaluation'):
+                result = self.stream_message(payload) if self.stream else self.create_message(payload)
+            return self._parse_evaluation_response(result)
+        except BudgetExceededError:
+            raise
+        except Exception as e:
+            print(f"评估Claude API失败: {str(e)}")
+            return {
+                "error": str(e),
+                "overall_score": 0,
+                "completeness_score": 0,
+                "accuracy_score": 0,
+                "consistency_score": 0
+            }
 
-        prompt = template.format(
-            document_preview=document_text[:2000],
+    def build_evaluation_payload(self, document_text: str,
+                                 algorithm_output: List[Dict],
+                                 reference_checkpoints: List[Dict],
+                                 model: str = "claude-3-5-sonnet-20241022",
+                                 cache_prefix: Optional[bool] = None) -> Dict:
+        """
+        构造评估算法输出的请求体
+        :param document_text: 招标文件文本
+        :param algorithm_output: 算法模型输出的检查点
+        :param reference_checkpoints: 参考检查点
+        :param model: Claude模型名称
+        :param cache_prefix: 是否缓存招标文件前缀,None时按 prompt_caching 设置
+        :return: /v1/messages 请求体(缓存前缀时与 build_reference_payload 的前缀相同,可复用其缓存;否则只含开头摘录)
+        """
+        prompt = get_prompt_registry().render(
+            'evaluation',
             algorithm_output=json.dumps(algorithm_output, ensure_ascii=False, indent=2),
             reference_checkpoints=json.dumps(reference_checkpoints, ensure_ascii=False, indent=2)
         )
 
-        payload = {
+        return {
             "model": model,
             "max_tokens": 4000,
+            "system": self._evaluation_prefix(document_text, cache_prefix),
             "messages": [{"role": "user", "content": prompt}],
             "temperature": 0.1
         }
 
-        try:
-            response = self.session.post(
-                f"{self.base_url}/v1/messages",
-                json=payload,
-                timeout=60
-            )
-            response.raise_for_status()
-            result = response.json()
-            return self._parse_evaluation_response(result)
-        except Exception as e:
-            print(f"评估Claude API失败: {str(e)}")
+    def judge_checkpoint_pairs(self, document_text: str,
+                               algorithm_output: List[Dict],
+                               reference_checkpoints: List[Dict],
+                               model: str = "claude-3-5-sonnet-20241022",
+                               top_k: int = 3, batch_size: int = 30,
+                               cache_prefix: Optional[bool] = None) -> Dict:
+        """
+        按候选对评估算法输出: 本地BM25为每个算法检查点检索前 top_k 个参考检查点,
+        大模型分批判断候选对是否匹配,评分在本地按判断结果统计(字段与 evaluate_checkpoints 一致)
+        :param document_text: 招标文件文本
+        :param algorithm_output: 算法模型输出的检查点
+        :param reference_checkpoints: 参考检查点
+        :param model: Claude模型名称
+        :param top_k: 每个算法检查点的候选数
+        :param batch_size: 每次请求判断的算法检查点数
+        :param cache_prefix: 是否缓存招标文件前缀,见 evaluate_checkpoints;多于一批时各批共用前缀,按 prompt_caching 设置
+        :return: 评估结果,pair_judgements 为每个算法检查点的判断;部分批次失败时保留其余批次的判断,
+                 error 为失败概要,batch_errors 为各失败批次的算法检查点序号和错误信息
+        """
+        candidates = candidate_pairs(algorithm_output, reference_checkpoints, top_k)
+        # 没有候选的算法检查点不需要大模型判断,直接记为未匹配
+        judged = [i for i, row in enumerate(candidates) if row]
+        if len(judged) > batch_size and cache_prefix is False:
+            cache_prefix = None
+        judgements = {}
+        batch_errors = []
+        for start in range(0, len(judged), batch_size):
+            batch = judged[start:start + batch_size]
+            try:
+                payload = self.build_pair_judging_payload(
+                    document_text, algorithm_output, reference_checkpoints,
+                    {i: candidates[i] for i in batch}, model, cache_prefix
+                )
+                with usage_context(stage='evaluation'):
+                    result = self.stream_message(payload) if self.stream else self.create_message(payload)
+                judgements.update(self._parse_pair_judgements(result, candidates, batch))
+            except BudgetExceededError:
+                raise
+            except Exception as e:
+                # 单批失败只影响本批的算法检查点,已完成批次的判断保留(响应已缓存,重新运行时只补发失败的批次)
+                print(f"候选对评估第 {start // batch_size + 1} 批Claude API失败: {str(e)}")
+                batch_errors.append({'algorithm': batch, 'error': str(e)})
+                for i in batch:
+                    judgements[i] = {'reference': None, 'verdict': 'error', 'reason': str(e)}
+        batches = (len(judged) + batch_size - 1) // batch_size
+        print(f"候选对评估: {len(judged)}/{len(algorithm_output)} 个算法检查点有候选, {batches} 次请求")
+        if batch_errors and len(batch_errors) == batches:
             return {
-                "error": str(e),
+                "error": batch_errors[0]['error'],
                 "overall_score": 0,
                 "completeness_score": 0,
                 "accuracy_score": 0,
                 "consistency_score": 0
             }
 
+        evaluation_result = self._score_pair_judgements(algorithm_output, reference_checkpoints, judgements)
+        if batch_errors:
+            evaluation_result['error'] = f"{len(batch_errors)}/{batches} 批候选对判断失败,失败批次的算法检查点按未匹配计分"
+            evaluation_result['batch_errors'] = batch_errors
+        return evaluation_result
+
+    def build_pair_judging_payload(self, document_text: str,
+                                   algorithm_output: List[Dict],
+                                   reference_checkpoints: List[Dict],
+                                   candidates: Dict[int, List], model: str = "claude-3-5-sonnet-20241022",
+                                   cache_prefix: Optional[bool] = None) -> Dict:
+        """
+        构造一批候选对的判断请求体,每个检查点一行(编号为在完整列表中的序号,跨批次不变)
+        :param document_text: 招标文件文本
+        :param algorithm_output: 算法模型输出的检查点
+        :param reference_checkpoints: 参考检查点
+        :param candidates: {算法检查点序号: [(参考检查点序号, 得分)]}
+        :param model: Claude模型名称
+        :param cache_prefix: 是否缓存招标文件前缀,None时按 prompt_caching 设置
+        :return: /v1/messages 请求体(缓存前缀时与 build_reference_payload 的前缀相同,可复用其缓存;否则只含开头摘录)
+        """
+        lines = []
+        for i, row in candidates.items():
+            lines.append(f"A{i + 1} {checkpoint_text(algorithm_output[i], QUERY_FIELDS)}")
+            for j, _ in row:
+                reference = reference_checkpoints[j]
+                category = reference.get('category')
+                content = reference.get('content') or reference.get('label', '')
+                lines.append(f"  R{j + 1} {f'[{category}] ' if category else ''}{content}")
+        prompt = get_prompt_registry().render('pair_judging', pairs='\n'.join(lines))
+
+        return {
+            "model": model,
+            "max_tokens": 4000,
+            "system": self._evaluation_prefix(document_text, cache_prefix),
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": 0
+        }
+
+    def create_message(self, payload: Dict, timeout: int = 60) -> Dict:
+        """
+        调用 /v1/messages 接口,相同请求优先从缓存读取
+        :param payload: 请求体(model/max_tokens/messages/temperature等)
+        :param timeout: 请求超时时间(秒)
+        :return: API响应字典
+        """
+        return self.provider.create(payload, timeout)
+
+    def stream_message(self, payload: Dict, timeout: tuple = (10, 60),
+                       on_text: Optional[Callable[[str], None]] = None) -> Dict:
+        """
+        以流式(SSE)方式调用 /v1/messages,组装为与 create_message 相同格式的响应
+        超时只约束建立连接和相邻两段数据之间的间隔,长输出不会整体超时
+        :param payload: 请求体
+        :param timeout: (连接超时, 读取间隔超时)秒
+        :param on_text: 每收到一段文本时的回调
+        :return: API响应字典;本次的首Token延迟和生成速度记录在 last_stream_metrics
+        """
+        cache_args = self.provider.cache_args(payload)
+        cached = self.cache.get(*cache_args)
+        if cached is not None:
+            if on_text:
+                on_text(cached.get('content', [{}])[0].get('text', ''))
+            self.provider.usage_tracker.record('claude', payload.get('model', ''), cached.get('usage'),
+                                               cache_hit=True)
+            return cached
+
+        estimated_tokens = self.provider.estimate_tokens(payload)
+        started_at = time.monotonic()
+        response = self.provider.open_stream(payload, timeout, estimated_tokens)
+
+        text_parts = []
+        message = {}
+        usage = {}
+        first_token_at = None
+        try:
+            event_type = None
+            for line in response.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                if line.startswith('event:'):
+                    event_type = line[len('event:'):].strip()
+                    continue
+                if not line.startswith('data:'):
+                    continue
+
+                data = json.loads(line[len('data:'):].strip())
+                event_type = data.get('type', event_type)
+                if event_type == 'message_start':
+                    message = data.get('message', {})
+                    usage.update(message.get('usage') or {})
+                elif event_type == 'content_block_delta':
+                    text = data.get('delta', {}).get('text')
+                    if text:
+                        if first_token_at is None:
+                            first_token_at = time.monotonic()
+                        text_parts.append(text)
+                        if on_text:
+                            on_text(text)
+                elif event_type == 'message_delta':
+                    message.update(data.get('delta') or {})
+                    usage.update(data.get('usage') or {})
+                elif event_type == 'error':
+                    raise RuntimeError(f"Claude流式响应错误: {data.get('error')}")
+                elif event_type == 'message_stop':
+                    break
+        finally:
+            response.close()
+
+        finished_at = time.monotonic()
+        output_tokens = usage.get('output_tokens') or estimate_tokens(''.join(text_parts))
+        generation_time = finished_at - (first_token_at or finished_at)
+        self.last_stream_metrics = {
+            'time_to_first_token': round(first_token_at - started_at, 3) if first_token_at else None,
+            'total_time': round(finished_at - started_at, 3),
+            'output_tokens': output_tokens,
+            'cache_read_tokens': usage.get('cache_read_input_tokens') or 0,
+            'tokens_per_second': round(output_tokens / generation_time, 2) if generation_time > 0 else None
+        }
+        print(f"Claude流式响应: 首Token {self.last_stream_metrics['time_to_first_token']}秒, "
+              f"{output_tokens} tokens, {self.last_stream_metrics['tokens_per_second']} tokens/秒, "
+              f"提示词缓存读取 {self.last_stream_metrics['cache_read_tokens']} tokens")
+
+        result = {
+            'id': message.get('id'),
+            'model': message.get('model', payload.get('model')),
+            'role': 'assistant',
+            'content': [{'type': 'text', 'text': ''.join(text_parts)}],
+            'stop_reason': message.get('stop_reason'),
+            'usage': usage
+        }
+        if self.rate_limiter:
+            self.rate_limiter.reconcile(estimated_tokens, extract_total_tokens(result))
+        self.provider.usage_tracker.record('claude', payload.get('model', ''), usage,
+                                           latency=finished_at - started_at)
+        if text_parts:
+            self.cache.set(*cache_args, result)
+        return result
+
+    def generate_response(self, prompt: str, model: str = "claude-3-5-sonnet-20241022",
+                          max_tokens: int = 4000, temperature: float = 0.1) -> str:
+        """
+        发送单轮提示词并返回文本
+        :param prompt: 提示词
+        :param model: Claude模型名称
+        :param max_tokens: 最大输出Token数
+        :param temperature: 温度
+        :return: 响应文本
+        """
+        result = self.create_message({
+            "model": model,
+            "max_tokens": max_tokens,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature
+        })
+        return result.get("content", [{}])[0].get("text", "")
+
+    def generate_reference_checkpoints_batch(self, documents: Dict[str, str], batch_dir: str,
+                                             model: str = "claude-3-5-sonnet-20241022",
+                                             poll_interval: float = 60) -> Dict[str, List[Dict]]:
+        """
+        通过Message Batches接口批量生成参考答案(适用于离线大批量评估)
+        :param documents: {custom_id: 招标文件文本},custom_id 只能包含字母、数字、下划线和连字符
+        :param batch_dir: 批处理文件和断点状态的保存目录
+        :param model: Claude模型名称
+        :param poll_interval: 轮询间隔(秒)
+        :return: {custom_id: 参考检查点列表},失败、过期或解析不出检查点的请求为 {'error': 错误信息}
+        """
+        # 参考答案和评估分两个批次提交,间隔通常超过缓存有效期,前缀不加缓存标记
+        requests = {cid: self.build_reference_payload(text, model, cache_prefix=False)
+                    for cid, text in documents.items()}
+        results = self.run_batch(requests, batch_dir, 'reference', poll_interval)
+        return {
+            cid: result if 'error' in result else (self._parse_checkpoints_response(result) or {'error': '解析失败'})
+            for cid, result in results.items()
+        }
+
+    def evaluate_checkpoints_batch(self, items: Dict[str, Dict], batch_dir: str,
+                                   model: str = "claude-3-5-sonnet-20241022",
+                                   poll_interval: float = 60) -> Dict[str, Dict]:
+        """
+        通过Message Batches接口批量评估算法输出
+        :param items: {custom_id: {'document_text', 'algorithm_output', 'reference_checkpoints'}}
+        :param batch_dir: 批处理文件和断点状态的保存目录
+        :param model: Claude模型名称
+        :param poll_interval: 轮询间隔(秒)
+        :return: {custom_id: 评估结果}
+        """
+        requests = {
+            cid: self.build_evaluation_payload(
+                item['document_text'], item['algorithm_output'], item['reference_checkpoints'], model,
+                cache_prefix=False
+            )
+            for cid, item in items.items()
+        }
+        results = self.run_batch(requests, batch_dir, 'evaluation', poll_interval)
+        return {
+            cid: result if 'error' in result else (self._parse_evaluation_response(result) or {'error': '解析失败'})
+            for cid, result in results.items()
+        }
+
+    def run_batch(self, requests: Dict[str, Dict], batch_dir: str, name: str = 'batch',
+                  poll_interval: float = 60, timeout: Optional[float] = None) -> Dict[str, Dict]:
+        """
+        提交一批请求并等待结果,已缓存的请求不再提交
+        提交后批次ID保存在 {batch_dir}/{name}.state.json,进程中断后再次调用会继续等待同一批次
+        :param requests: {custom_id: /v1/messages 请求体}
+        :param batch_dir: 批处理文件和断点状态的保存目录
+        :param name: 批次名称(同一目录下区分不同阶段的批次)
+        :param poll_interval: 轮询间隔(秒)
+        :param timeout: 最长等待时间(秒),None表示一直等待
+        :return: {custom_id: API响应字典},失败的请求为 {'error': 错误信息}
+        """
+        results = {}
+        pending = {}
+        tracker = self.provider.usage_tracker
+        for custom_id, payload in requests.items():
+            cached = self.cache.get(*self.provider.cache_args(payload))
+            if cached is not None:
+                tracker.record('claude', payload.get('model', ''), cached.get('usage'), cache_hit=True)
+                results[custom_id] = cached
+            else:
+                pending[custom_id] = payload
+
+        if not pending:
+            print(f"批次 {name} 的 {len(requests)} 个请求全部命中缓存")
+            return results
+
+        batch_dir = Path(batch_dir)
+        batch_dir.mkdir(parents=True, exist_ok=True)
+        state_path = batch_dir / f"{name}.state.json"
+
+        batch_id = None
+        if state_path.exists():
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if sorted(state.get('custom_ids', [])) == sorted(pending):
+                batch_id = state['batch_id']
+                print(f"从断点恢复批次: {batch_id}")
+            else:
+                print(f"断点状态与当前请求不一致,忽略: {state_path}")
+
+        if batch_id is None:
+            tracker.check_budget(sum(self.provider.estimate_tokens(p) for p in pending.values()))
+            batch_file = batch_dir / f"{name}.jsonl"
+            self.write_batch_file(pending, str(batch_file))
+            batch_id = self.submit_batch(str(batch_file))
+            with open(state_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'batch_id': batch_id,
+                    'batch_file': str(batch_file),
+                    'custom_ids': list(pending),
+                    'submitted_at': time.strftime('%Y-%m-%d %H:%M:%S')
+                }, f, ensure_ascii=False, indent=2)
+            print(f"已提交批次 {batch_id},包含 {len(pending)} 个请求")
+
+        batch = self.wait_for_batch(batch_id, poll_interval, timeout)
+        batch_results = self.get_batch_results(batch)
+
+        for custom_id, payload in pending.items():
+            result = batch_results.get(custom_id, {'error': '批次结果中缺少该请求'})
+            tracker.record('claude', payload.get('model', ''), result.get('usage'), stage=f"batch:{name}")
+            if result.get('content'):
+                self.cache.set(*self.provider.cache_args(payload), result)
+            results[custom_id] = result
+
+        state_path.unlink()
+        return results
+
+    @staticmethod
+    def write_batch_file(requests: Dict[str, Dict], batch_file: str):
+        """
+        将请求序列化为批处理文件(JSONL,每行一个 {custom_id, params})
+        :param requests: {custom_id: /v1/messages 请求体}
+        :param batch_file: 输出文件路径
+        """
+        with open(batch_file, 'w', encoding='utf-8') as f:
+            for custom_id, payload in requests.items():
+                f.write(json.dumps({'custom_id': custom_id, 'params': payload}, ensure_ascii=False) + '\n')
+
+    def submit_batch(self, batch_file: str) -> str:
+        """
+        提交批处理文件
+        :param batch_file: write_batch_file 生成的文件路径
+        :return: 批次ID
+        """
+        with open(batch_file, 'r', encoding='utf-8') as f:
+            batch_requests = [json.loads(line) for line in f if line.strip()]
+
+        response = self.session.post(
+            f"{self.base_url}/v1/messages/batches",
+            json={'requests': batch_requests},
+            timeout=120
+        )
+        response.raise_for_status()
+        return response.json()['id']
+
+    def get_batch(self, batch_id: str) -> Dict:
+        """
+        查询批次状态
+        :param batch_id: 批次ID
+        :return: 批次信息(processing_status/request_counts/results_url等)
+        """
+        response = self.session.get(f"{self.base_url}/v1/messages/batches/{batch_id}", timeout=60)
+        response.raise_for_status()
+        return response.json()
+
+    def wait_for_batch(self, batch_id: str, poll_interval: float = 60,
+                       timeout: Optional[float] = None) -> Dict:
+        """
+        轮询直到批次处理结束
+        :param batch_id: 批次ID
+        :param poll_interval: 轮询间隔(秒)
+        :param timeout: 最长等待时间(秒),None表示一直等待
+        :return: 处理结束的批次信息
+        """
+        started_at = time.monotonic()
+        while True:
+            batch = self.get_batch(batch_id)
+            if batch.get('processing_status') == 'ended':
+                return batch
+            if timeout is not None and time.monotonic() - started_at > timeout:
+                raise TimeoutError(f"等待批次 {batch_id} 超时,可稍后从断点恢复")
+            print(f"批次 {batch_id} 处理中: {batch.get('request_counts', {})}")
+            time.sleep(poll_interval)
+
+    def get_batch_results(self, batch: Dict) -> Dict[str, Dict]:
+        """
+        下载批次结果
+        :param batch: 处理结束的批次信息
+        :return: {custom_id: API响应字典},失败/取消/过期的请求为 {'error': 错误信息}
+        """
+        response = self.session.get(batch['results_url'], timeout=300)
+        response.raise_for_status()
+
+        results = {}
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            result = item.get('result', {})
+            if result.get('type') == 'succeeded':
+                results[item['custom_id']] = result['message']
+            else:
+                error = result.get('error') or result.get('type', 'unknown')
+                results[item['custom_id']] = {'error': json.dumps(error, ensure_ascii=False)
+                                              if isinstance(error, dict) else str(error)}
+        return results
+
     def _parse_checkpoints_response(self, response: Dict) -> List[Dict]:
         """
         解析Claude的检查点响应
         :param response: API响应
         :return: 检查点列表
         """
-        try:
-            content = response.get("content", [{}])[0].get("text", "{}")
-            # 提取JSON部分（Claude可能返回带解释的文本）
-            json_start = content.find('{')
-            json_end = content.rfind('}') + 1
-            if json_start >= 0 and json_end > json_start:
-                json_str = content[json_start:json_end]
-                data = json.loads(json_str)
-                return data.get("checkpoints", [])
-        except Exception as e:
-            print(f"解析参考答案失败: {e}")
+        content = response.get("content", [{}])[0].get("text", "")
+        extraction = extract_json(content, 'checkpoints')
+        if extraction.data is None:
+            print(f"解析参考答案失败: {extraction.error}")
             return []
+        if not extraction.complete:
+            print(f"参考答案{extraction.describe()}")
+        return extraction.data.get("checkpoints", [])
 
     def _parse_evaluation_response(self, response: Dict) -> Dict:
         """
@@ -195,13 +792,110 @@ class ClaudeClient:
         :param response: API响应
         :return: 评估结果字典
         """
-        try:
-            content = response.get("content", [{}])[0].get("text", "{}")
-            json_start = content.find('{')
-            json_end = content.rfind('}') + 1
-            if json_start >= 0 and json_end > json_start:
-                json_str = content[json_start:json_end]
-                return json.loads(json_str)
-        except Exception as e:
-            print(f"解析评估结果失败: {e}")
+        content = response.get("content", [{}])[0].get("text", "")
+        extraction = extract_json(content)
+        if not isinstance(extraction.data, dict):
+            print(f"解析评估结果失败: {extraction.error or '不是JSON对象'}")
             return {"error": "解析失败"}
+        if not extraction.complete:
+            print(f"评估结果{extraction.describe()}")
+        return extraction.data
+
+    @staticmethod
+    def _parse_pair_judgements(response: Dict, candidates: List[List], batch: List[int]) -> Dict[int, Dict]:
+        """
+        解析候选对判断,只接受本批次的算法检查点和其候选中的参考检查点
+        :param response: API响应
+        :param candidates: 每个算法检查点的候选
+        :param batch: 本批次的算法检查点序号
+        :return: {算法检查点序号: {'reference': 参考检查点序号或None, 'verdict', 'reason'}}
+        """
+        content = response.get("content", [{}])[0].get("text", "")
+        extraction = extract_json(content, 'judgements')
+        if extraction.data is None:
+            raise ValueError(f"解析候选对判断失败: {extraction.error}")
+        if not extraction.complete:
+            print(f"候选对判断{extraction.describe()}")
+
+        judgements = {}
+        for item in extraction.data.get('judgements', []):
+            try:
+                i = int(str(item.get('algorithm', '')).lstrip('Aa')) - 1
+                reference = item.get('reference')
+                j = int(str(reference).lstrip('Rr')) - 1 if reference else None
+            except ValueError:
+                continue
+            if i not in batch:
+                continue
+            verdict = item.get('verdict')
+            if j is None or j not in {ref for ref, _ in candidates[i]} or verdict not in ('correct', 'incorrect'):
+                j, verdict = None, 'unmatched'
+            judgements[i] = {'reference': j, 'verdict': verdict, 'reason': item.get('reason', '')}
+        return judgements
+
+    @staticmethod
+    def _score_pair_judgements(algorithm_output: List[Dict], reference_checkpoints: List[Dict],
+                               judgements: Dict[int, Dict]) -> Dict:
+        """
+        按候选对判断统计评分(百分制整数)
+        完整性为被对应到的参考检查点占比,准确性为对应到参考检查点的算法检查点中内容正确的占比,
+        一致性为内容正确的算法检查点占全部算法检查点的比例,总体评分取三者平均
+        每个参考检查点只对应一个算法检查点(优先第一个判断为正确的),其余记为未匹配
+        """
+        owners = {}
+        for i, judgement in sorted(judgements.items()):
+            j = judgement['reference']
+            if j is None:
+                continue
+            owner = owners.get(j)
+            if owner is None or (judgement['verdict'] == 'correct' and judgements[owner]['verdict'] != 'correct'):
+                owners[j] = i
+        kept = set(owners.values())
+        judgements = {
+            i: judgement if judgement['reference'] is None or i in kept else {
+                'reference': None, 'verdict': 'unmatched',
+                'reason': f"R{judgement['reference'] + 1} 已对应 A{owners[judgement['reference']] + 1}"
+            }
+            for i, judgement in judgements.items()
+        }
+
+        covered = set()
+        correct = 0
+        incorrect_checkpoints = []
+        for i, judgement in sorted(judgements.items()):
+            j = judgement['reference']
+            if j is None:
+                continue
+            covered.add(j)
+            if judgement['verdict'] == 'correct':
+                correct += 1
+            else:
+                incorrect_checkpoints.append({
+                    "algorithm_output": checkpoint_text(algorithm_output[i], QUERY_FIELDS),
+                    "correct_content": reference_checkpoints[j].get('content', ''),
+                    "reason": judgement['reason']
+                })
+        answered = correct + len(incorrect_checkpoints)
+
+        completeness = len(covered) / len(reference_checkpoints) if reference_checkpoints else 0
+        accuracy = correct / answered if answered else 0
+        consistency = correct / len(algorithm_output) if algorithm_output else 0
+        return {
+            "overall_score": round((completeness + accuracy + consistency) / 3 * 100),
+            "completeness_score": round(completeness * 100),
+            "accuracy_score": round(accuracy * 100),
+            "consistency_score": round(consistency * 100),
+            "missing_checkpoints": [
+                {
+                    "category": reference.get('category', ''),
+                    "expected_content": reference.get('content', ''),
+                    "reason": "没有对应的算法检查点"
+                }
+                for j, reference in enumerate(reference_checkpoints) if j not in covered
+            ],
+            "incorrect_checkpoints": incorrect_checkpoints,
+            "pair_judgements": [
+                dict(judgements.get(i, {'reference': None, 'verdict': 'unmatched', 'reason': ''}), algorithm=i)
+                for i in range(len(algorithm_output))
+            ]
+        }
@@ -0,0 +1,233 @@
+"""
+增量JSON解析
+流式响应逐段到达时,从尚未完整的JSON文本中提取已经完整的数组元素(如每个检查点对象);
+完整响应用 extract_json 提取,兼容代码块标记、前后说明文字和被截断的输出
+"""
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+class IncrementalJSONArrayParser:
+    """增量解析指定键下的JSON数组,每个元素对象一完整就返回"""
+
+    def __init__(self, array_key: Optional[str] = 'checkpoints'):
+        """
+        初始化解析器
+        :param array_key: 目标数组的键名;None表示解析顶层数组
+        """
+        self.array_key = array_key
+        self.buffer = ''
+        self._pos = 0
+        self._stack = []            # 每层容器: [类型('{'或'['), 是否为目标数组]
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None    # 最近一个完整字符串(对象内用作键名)
+        self._after_colon = False
+        self._item_start = None     # 当前目标数组元素的起始位置
+
+    def feed(self, text: str) -> List[Dict]:
+        """
+        追加一段文本
+        :param text: 新到达的文本片段
+        :return: 本次新完成的数组元素列表
+        """
+        self.buffer += text
+        completed = []
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = buffer[self._string_start:i]
+                continue
+
+            if not self._stack:
+                # JSON开始前的说明文字或代码块标记直接跳过
+                if char == '{' or (char == '[' and self.array_key is None):
+                    self._open(char, i)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = i + 1
+            elif char == ':':
+                self._after_colon = True
+                continue
+            elif char in '{[':
+                self._open(char, i)
+            elif char in '}]':
+                item = self._close(i)
+                if item is not None:
+                    completed.append(item)
+            if not char.isspace():
+                self._after_colon = False
+
+        self._pos = len(buffer)
+        return completed
+
+    def _open(self, char: str, index: int):
+        """进入一个对象或数组"""
+        parent_is_target = bool(self._stack) and self._stack[-1][1]
+        if parent_is_target and self._item_start is None:
+            self._item_start = index
+
+        is_target = False
+        if char == '[':
+            if self.array_key is None:
+                is_target = not self._stack
+            else:
+                is_target = (self._after_colon and self._stack[-1][0] == '{'
+                             and self._last_string == self.array_key)
+        self._stack.append([char, is_target])
+        self._after_colon = False
+
+    def _close(self, index: int) -> Optional[Dict]:
+        """离开一个对象或数组,目标数组的元素完整时返回该元素"""
+        self._stack.pop()
+        if self._item_start is None or not self._stack or not self._stack[-1][1]:
+            return None
+
+        raw = self.buffer[self._item_start:index + 1]
+        self._item_start = None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+
+@dataclass
+class JSONExtraction:
+    """extract_json 的结果"""
+    data: Any = None            # 解析出的JSON值,失败时为None
+    complete: bool = False      # False且data不为None表示从截断的输出中恢复
+    salvaged_items: int = 0     # 恢复的条目数(目标数组的元素数,或顶层对象的字段数)
+    dropped_text: str = ''      # 截断时丢弃的不完整末尾
+    error: Optional[str] = None
+
+    def describe(self) -> str:
+        """说明提取情况,用于日志"""
+        if self.data is None:
+            return f"未能提取JSON: {self.error}"
+        if self.complete:
+            return "JSON完整"
+        return (f"输出不完整,恢复了 {self.salvaged_items} 项,"
+                f"丢弃末尾 {len(self.dropped_text)} 个字符: {self.dropped_text[:50]!r}")
+
+
+def extract_json(text: str, array_key: Optional[str] = None) -> JSONExtraction:
+    """
+    从大模型输出中提取JSON
+    依次尝试每个 { 或 [ 起点,按括号配对(忽略字符串内的括号)找到完整的JSON;```json 代码块优先,
+    说明文字中的括号配对失败后跳过;输出被截断时在最后一个完整条目处截断并补齐括号,
+    不会恢复出缺字段的数组元素
+    :param text: 模型输出文本
+    :param array_key: 期望的数组键名(如 checkpoints);给定时优先选择包含该键的对象(截断恢复只接受包含该键的),
+                      顶层数组按该键包装
+    :return: 提取结果
+    """
+    if not text or not text.strip():
+        return JSONExtraction(error="响应为空")
+
+    fence = text.find('```json')
+    starts = [fence + len('```json')] if fence >= 0 else []
+    starts.append(0)
+
+    fallback = None
+    error = "未找到JSON"
+    for scan_from in starts:
+        for start in _candidate_starts(text, scan_from):
+            status, end, open_stack = _scan_balanced(text, start)
+            if status == 'invalid':
+                continue
+            if status == 'complete':
+                try:
+                    data = json.loads(text[start:end], strict=False)
+                except ValueError as e:
+                    error = f"JSON格式错误: {e}"
+                    continue
+                result = _make_result(data, array_key, complete=True)
+            else:
+                if end is None:
+                    error = "输出被截断,没有完整的条目"
+                    continue
+                try:
+                    data = json.loads(text[start:end] + ''.join(_CLOSERS[c] for c in reversed(open_stack)),
+                                      strict=False)
+                except ValueError as e:
+                    error = f"截断的JSON无法恢复: {e}"
+                    continue
+                result = _make_result(data, array_key, complete=False)
+                result.dropped_text = text[end:].lstrip(', \t\r\n')
+
+            if array_key is None or (isinstance(result.data, dict) and array_key in result.data):
+                return result
+            if fallback is None and result.complete:
+                fallback = result
+        if fallback is not None:
+            return fallback
+    return JSONExtraction(error=error)
+
+
+def _candidate_starts(text: str, scan_from: int):
+    """依次给出可能的JSON起点"""
+    for i in range(scan_from, len(text)):
+        if text[i] in _CLOSERS:
+            yield i
+
+
+def _scan_balanced(text: str, start: int):
+    """
+    从 start 处的 { 或 [ 开始按括号配对扫描
+    :return: ('complete', 结束位置, None)
+             ('truncated', 最后一个安全截断位置或None, 该位置未闭合的容器)
+             ('invalid', None, None) 括号不匹配,不是JSON
+    安全截断位置只出现在任何数组元素都不处于未完成状态时,截断后补齐括号不会产生残缺的元素
+    """
+    stack = []
+    in_string = escape = False
+    safe_end, safe_stack = None, None
+    for i in range(start, len(text)):
+        char = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(char)
+        elif char in '}]':
+            if not stack or _CLOSERS[stack[-1]] != char:
+                return 'invalid', None, None
+            stack.pop()
+            if not stack:
+                return 'complete', i + 1, None
+            if '[' not in stack[:-1]:
+                safe_end, safe_stack = i + 1, list(stack)
+        elif char == ',' and '[' not in stack[:-1]:
+            safe_end, safe_stack = i, list(stack)
+    return 'truncated', safe_end, safe_stack
+
+
+def _make_result(data: Any, array_key: Optional[str], complete: bool) -> JSONExtraction:
+    if array_key is not None and isinstance(data, list):
+        data = {array_key: data}
+    if isinstance(data, dict):
+        items = data.get(array_key) if array_key is not None and isinstance(data.get(array_key), list) else data
+    else:
+        items = data if isinstance(data, list) else []
+    return JSONExtraction(data=data, complete=complete, salvaged_items=len(items))
@@ -0,0 +1,177 @@
+"""
+大模型响应缓存
+基于SQLite的本地持久化缓存,相同的提示词和参数不再重复调用大模型
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from conf.set_conf import resolve_path
+from utils.env_config import get_env, get_env_bool, get_env_int
+
+DEFAULT_CACHE_PATH = './test_data/cache/llm_cache.sqlite'
+
+
+class LLMResponseCache:
+    """大模型响应缓存"""
+
+    def __init__(self, db_path: str = DEFAULT_CACHE_PATH, ttl_seconds: Optional[int] = None,
+                 max_entries: Optional[int] = None, bypass: bool = False):
+        """
+        初始化缓存
+        :param db_path: SQLite数据库路径(相对路径基于项目根目录)
+        :param ttl_seconds: 缓存有效期(秒),None表示永不过期
+        :param max_entries: 最大缓存条数,超出时淘汰最久未使用的条目,None表示不限制
+        :param bypass: 为True时不读取缓存(仍会写入最新响应)
+        """
+        self.db_path = resolve_path(db_path)
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def normalize_prompt(prompt: Any) -> str:
+        """
+        规范化提示词: 统一换行符并去除行尾空白;消息列表等结构化内容序列化为稳定的JSON
+        :param prompt: 提示词文本或消息列表
+        :return: 规范化后的文本
+        """
+        if not isinstance(prompt, str):
+            prompt = json.dumps(prompt, ensure_ascii=False, sort_keys=True)
+        lines = prompt.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+        return '\n'.join(line.rstrip() for line in lines).strip()
+
+    @classmethod
+    def make_key(cls, provider: str, model: str, prompt: Any,
+                 temperature: Optional[float], max_tokens: Optional[int]) -> str:
+        """
+        生成缓存键
+        :return: 由提供方、模型、规范化提示词、温度和最大Token数计算的哈希
+        """
+        prompt_hash = hashlib.sha256(cls.normalize_prompt(prompt).encode('utf-8')).hexdigest()
+        raw = json.dumps([provider, model, prompt_hash, temperature, max_tokens])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, provider: str, model: str, prompt: Any,
+            temperature: Optional[float], max_tokens: Optional[int]) -> Optional[Dict]:
+        """
+        读取缓存的响应
+        :return: 缓存的响应字典,未命中返回None
+        """
+        if self.bypass:
+            self.misses += 1
+            return None
+
+        key = self.make_key(provider, model, prompt, temperature, max_tokens)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row and self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+
+        return json.loads(row[0])
+
+    def set(self, provider: str, model: str, prompt: Any,
+            temperature: Optional[float], max_tokens: Optional[int], response: Dict):
+        """写入响应,并按容量上限淘汰最久未使用的条目"""
+        key = self.make_key(provider, model, prompt, temperature, max_tokens)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, provider, model, response, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, provider, model, json.dumps(response, ensure_ascii=False), now, now)
+            )
+            if self.max_entries is not None:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+            self._conn.commit()
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict:
+        """
+        缓存统计
+        :return: {'hits', 'misses', 'hit_rate', 'entries'}
+        """
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total * 100, 2) if total > 0 else 0,
+            'entries': entries
+        }
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache: Optional[LLMResponseCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> LLMResponseCache:
+    """
+    获取进程内共享的默认缓存,配置来自环境变量:
+        - LLM_CACHE_PATH: 数据库路径
+        - LLM_CACHE_TTL: 有效期(秒),0表示永不过期
+        - LLM_CACHE_MAX_ENTRIES: 最大条数,0表示不限制
+        - LLM_CACHE_BYPASS: 是否跳过缓存读取
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            ttl = get_env_int('LLM_CACHE_TTL', 0)
+            max_entries = get_env_int('LLM_CACHE_MAX_ENTRIES', 10000)
+            _default_cache = LLMResponseCache(
+                db_path=get_env('LLM_CACHE_PATH', DEFAULT_CACHE_PATH),
+                ttl_seconds=ttl or None,
+                max_entries=max_entries or None,
+                bypass=get_env_bool('LLM_CACHE_BYPASS', False)
+            )
+        return _default_cache
@@ -0,0 +1,503 @@
+"""
+大模型服务统一调用层
+Claude 和智谱AI 共用的缓存、限流、指数退避重试、熔断和对冲请求
+"""
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+from api_clients.llm_cache import LLMResponseCache, get_default_cache
+from api_clients.rate_limiter import RateLimiter, extract_total_tokens, get_retry_after
+from api_clients.usage_tracker import UsageTracker, get_usage_tracker
+from processors.text_chunker import estimate_tokens
+from utils.env_config import get_env_int
+
+
+class CircuitOpenError(RuntimeError):
+    """熔断器处于打开状态,请求被直接拒绝"""
+
+
+class CircuitBreaker:
+    """熔断器: 连续失败达到阈值后打开,冷却后放行一个试探请求"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        """
+        初始化熔断器
+        :param failure_threshold: 连续失败多少次后打开
+        :param reset_timeout: 打开后多久允许试探请求(秒)
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """closed / open / half_open"""
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+    def before_call(self, name: str = ''):
+        """
+        请求前检查,打开状态下抛出 CircuitOpenError;半开状态只放行一个试探请求
+        :param name: 用于错误信息的名称
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+            if remaining > 0 or self._probing:
+                raise CircuitOpenError(f"{name} 熔断中,{max(remaining, 0):.0f}秒后重试")
+            self._probing = True
+
+    def record_success(self):
+        """请求成功,关闭熔断器"""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def release_probe(self):
+        """试探请求因请求本身的错误结束时,释放试探名额但不改变熔断状态"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        """请求失败,达到阈值(或试探失败)时打开熔断器"""
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class LatencyTracker:
+    """记录最近的请求耗时,用于计算对冲请求的触发阈值"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, percentile: float, min_samples: int = 20) -> Optional[float]:
+        """
+        计算耗时分位数
+        :param percentile: 分位数(0-100)
+        :param min_samples: 样本不足时返回None
+        :return: 耗时(秒)
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < min_samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * percentile / 100))
+        return samples[index]
+
+
+_breakers: Dict[tuple, CircuitBreaker] = {}
+_latencies: Dict[tuple, LatencyTracker] = {}
+_zhipuai_clients: Dict[str, Any] = {}
+_registry_lock = threading.Lock()
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_circuit_breaker(provider: str, model: str, failure_threshold: int = 5,
+                        reset_timeout: float = 60.0) -> CircuitBreaker:
+    """获取进程内共享的熔断器(按服务商和模型区分)"""
+    with _registry_lock:
+        key = (provider, model)
+        if key not in _breakers:
+            _breakers[key] = CircuitBreaker(failure_threshold, reset_timeout)
+        return _breakers[key]
+
+
+def get_latency_tracker(provider: str, model: str) -> LatencyTracker:
+    """获取进程内共享的耗时统计(按服务商和模型区分)"""
+    with _registry_lock:
+        return _latencies.setdefault((provider, model), LatencyTracker())
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    with _registry_lock:
+        if _hedge_executor is None:
+            _hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='llm-hedge')
+        return _hedge_executor
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    判断错误是否值得重试: 网络错误、超时、限流和服务端错误可重试,其余4xx错误不重试
+    :param error: 调用异常
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is None:
+        return True
+    return status in (408, 409, 429) or status >= 500
+
+
+class LLMProvider:
+    """大模型服务基类,子类实现 _send 完成一次原始调用"""
+
+    name = ''
+
+    def __init__(self, cache: Optional[LLMResponseCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None, max_retries: int = 3,
+                 base_delay: float = 1.0, max_delay: float = 60.0,
+                 hedge_percentile: Optional[float] = None, hedge_min_samples: int = 20,
+                 failure_threshold: int = 5, reset_timeout: float = 60.0,
+                 usage_tracker: Optional[UsageTracker] = None):
+        """
+        初始化服务
+        :param cache: 响应缓存(默认使用进程内共享的缓存)
+        :param rate_limiter: RPM/TPM限流器
+        :param max_retries: 可重试错误的最大重试次数
+        :param base_delay: 指数退避的初始等待(秒),服务端给出 Retry-After 时以其为准
+        :param max_delay: 单次退避的最长等待(秒)
+        :param hedge_percentile: 请求耗时超过该分位数(如95)仍未返回时发出对冲请求,取先返回的结果;None表示不对冲
+                                 (默认读取环境变量 LLM_HEDGE_PERCENTILE,0表示不对冲)
+        :param hedge_min_samples: 耗时样本达到该数量后才启用对冲
+        :param failure_threshold: 熔断器连续失败阈值
+        :param reset_timeout: 熔断器冷却时间(秒)
+        :param usage_tracker: 用量统计(默认使用进程内共享的统计)
+        """
+        self.cache = cache if cache is not None else get_default_cache()
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        if hedge_percentile is None:
+            hedge_percentile = get_env_int('LLM_HEDGE_PERCENTILE', 0) or None
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.usage_tracker = usage_tracker if usage_tracker is not None else get_usage_tracker()
+
+    def create(self, payload: Dict, timeout: float = 60, read_cache: bool = True) -> Dict:
+        """
+        调用大模型,相同请求优先从缓存读取
+        :param payload: Claude /v1/messages 格式的请求体(model/max_tokens/messages/temperature)
+        :param timeout: 单次请求超时时间(秒)
+        :param read_cache: 为False时跳过缓存读取(调用方已自行查询过缓存)
+        :return: Claude格式的响应字典 {'content': [{'text'}], 'model', 'usage'}
+        """
+        model = payload.get('model', '')
+        cache_args = self.cache_args(payload)
+        if read_cache:
+            cached = self.cache.get(*cache_args)
+            if cached is not None:
+                self.usage_tracker.record(self.name, model, cached.get('usage'), cache_hit=True)
+                return cached
+
+        estimated_tokens = self.estimate_tokens(payload)
+        self.usage_tracker.check_budget(estimated_tokens)
+        stats = {}
+        started_at = time.monotonic()
+        result = self.call_with_retries(
+            model,
+            lambda: self._call_hedged(payload, timeout, estimated_tokens),
+            stats
+        )
+        self.usage_tracker.record(self.name, model, result.get('usage'),
+                                  latency=time.monotonic() - started_at, retries=stats.get('retries', 0))
+        if result.get('content'):
+            self.cache.set(*cache_args, result)
+        return result
+
+    def call_with_retries(self, model: str, func: Callable[[], Any], stats: Optional[Dict] = None) -> Any:
+        """
+        经熔断器检查后执行调用,可重试错误按指数退避重试
+        :param model: 模型名称(熔断器按模型区分)
+        :param func: 执行一次调用的函数
+        :param stats: 传入字典时写入重试次数 {'retries'}
+        :return: 调用结果
+        """
+        breaker = get_circuit_breaker(self.name, model, self.failure_threshold, self.reset_timeout)
+        for attempt in range(self.max_retries + 1):
+            if stats is not None:
+                stats['retries'] = attempt
+            breaker.before_call(f"{self.name}/{model}")
+            try:
+                result = func()
+            except Exception as e:
+                if not is_retryable(e):
+                    # 请求错误(400/401等)不说明服务异常,不计入失败,但必须释放试探名额
+                    breaker.release_probe()
+                    raise
+                breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+
+                retry_after = get_retry_after(e)
+                delay = self.backoff_delay(attempt, retry_after)
+                print(f"[WARNING] {self.name} 调用失败: {str(e)[:100]}")
+                print(f"  等待{delay:.1f}秒后重试 (第{attempt + 1}次)")
+                if retry_after is not None and self.rate_limiter:
+                    # 服务端要求退避时,共享限流器的其他请求也一起等待
+                    self.rate_limiter.pause(delay)
+                else:
+                    time.sleep(delay)
+                continue
+            except BaseException:
+                breaker.release_probe()
+                raise
+
+            breaker.record_success()
+            return result
+
+    def backoff_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        计算重试等待时间: 优先使用服务端的 Retry-After,否则为带抖动的指数退避
+        :param attempt: 已失败的次数(从0开始)
+        :param retry_after: 服务端建议的等待秒数
+        """
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        delay = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return delay * random.uniform(0.5, 1.0)
+
+    def _call_hedged(self, payload: Dict, timeout: float, estimated_tokens: int) -> Dict:
+        """耗时超过分位数阈值时发出对冲请求,返回先成功的结果"""
+        model = payload.get('model', '')
+        threshold = None
+        if self.hedge_percentile:
+            threshold = get_latency_tracker(self.name, model).percentile(
+                self.hedge_percentile, self.hedge_min_samples
+            )
+        if threshold is None:
+            return self._timed_call(payload, timeout, estimated_tokens)
+
+        executor = _get_hedge_executor()
+        primary = executor.submit(self._timed_call, payload, timeout, estimated_tokens)
+        done, _ = wait([primary], timeout=threshold)
+        if done:
+            return primary.result()
+
+        print(f"{self.name}/{model} 请求超过P{self.hedge_percentile}耗时({threshold:.1f}秒),发出对冲请求")
+        hedge = executor.submit(self._timed_call, payload, timeout, estimated_tokens)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # 落败的请求同样计费,完成后计入用量统计(沿用当前的阶段和文档标记)
+                    context = contextvars.copy_context()
+                    for other in {primary, hedge} - {future}:
+                        other.add_done_callback(
+                            lambda f: context.run(self._record_hedge_loser, model, f)
+                        )
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _record_hedge_loser(self, model: str, future):
+        """记录对冲中落败但已成功返回的请求的用量"""
+        if future.cancelled() or future.exception() is not None:
+            return
+        self.usage_tracker.record(self.name, model, future.result().get('usage'))
+
+    def _timed_call(self, payload: Dict, timeout: float, estimated_tokens: int) -> Dict:
+        """限流后执行一次调用,记录耗时并按实际用量修正限流预估"""
+        if self.rate_limiter:
+            self.rate_limiter.acquire(estimated_tokens)
+        started_at = time.monotonic()
+        try:
+            result = self._send(payload, timeout)
+        except Exception:
+            if self.rate_limiter:
+                self.rate_limiter.reconcile(estimated_tokens, 0)
+            raise
+        get_latency_tracker(self.name, payload.get('model', '')).record(time.monotonic() - started_at)
+        if self.rate_limiter:
+            self.rate_limiter.reconcile(estimated_tokens, extract_total_tokens(result))
+        return result
+
+    def _send(self, payload: Dict, timeout: float) -> Dict:
+        """执行一次原始调用(子类实现)"""
+        raise NotImplementedError
+
+    def cache_args(self, payload: Dict) -> tuple:
+        """请求体对应的缓存参数 (provider, model, prompt, temperature, max_tokens)"""
+        return (
+            self.name,
+            payload.get('model', ''),
+            {k: v for k, v in payload.items() if k not in ('model', 'temperature', 'max_tokens')},
+            payload.get('temperature'),
+            payload.get('max_tokens')
+        )
+
+    @staticmethod
+    def estimate_tokens(payload: Dict) -> int:
+        """预估请求的Token数(输入+最大输出),用于TPM限流"""
+        prompt_text = str(payload.get('system', '')) + ''.join(
+            str(m.get('content', '')) for m in payload.get('messages', []))
+        return estimate_tokens(prompt_text) + payload.get('max_tokens', 0)
+
+
+class ClaudeProvider(LLMProvider):
+    """Claude /v1/messages 接口"""
+
+    name = 'claude'
+
+    def __init__(self, api_key: str, base_url: str = "https://api.anthropic.com",
+                 session: Optional[Session] = None, **options):
+        """
+        :param api_key: Claude API密钥
+        :param base_url: API基础URL
+        :param session: 复用的HTTP会话(连接池),不传时新建
+        :param options: 见 LLMProvider
+        """
+        super().__init__(**options)
+        self.base_url = base_url
+        self.session = session or create_session(api_key)
+
+    def _send(self, payload: Dict, timeout: float) -> Dict:
+        response = self.session.post(f"{self.base_url}/v1/messages", json=payload, timeout=timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def open_stream(self, payload: Dict, timeout, estimated_tokens: int):
+        """
+        发起流式请求,建立连接前的错误按统一策略重试
+        :return: 尚未读取的requests响应对象
+        """
+        def _open():
+            if self.rate_limiter:
+                self.rate_limiter.acquire(estimated_tokens)
+            try:
+                response = self.session.post(f"{self.base_url}/v1/messages",
+                                             json=dict(payload, stream=True), timeout=timeout, stream=True)
+                response.raise_for_status()
+            except Exception:
+                if self.rate_limiter:
+                    self.rate_limiter.reconcile(estimated_tokens, 0)
+                raise
+            return response
+
+        self.usage_tracker.check_budget(estimated_tokens)
+        return self.call_with_retries(payload.get('model', ''), _open)
+
+
+class ZhipuAIProvider(LLMProvider):
+    """智谱AI chat.completions 接口,响应统一转换为Claude格式"""
+
+    name = 'zhipuai'
+
+    def __init__(self, api_key: str, **options):
+        """
+        :param api_key: 智谱AI API密钥(同一密钥的SDK客户端在进程内复用)
+        :param options: 见 LLMProvider
+        """
+        super().__init__(**options)
+        self.client = get_zhipuai_client(api_key)
+
+    def _send(self, payload: Dict, timeout: float) -> Dict:
+        response = self.client.chat.completions.create(
+            model=payload['model'],
+            messages=payload['messages'],
+            temperature=payload.get('temperature'),
+            max_tokens=payload.get('max_tokens'),
+            timeout=timeout
+        )
+        return {
+            "content": [
+                {
+                    "text": response.choices[0].message.content
+                }
+            ],
+            "model": response.model,
+            "usage": {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "total_tokens": response.usage.total_tokens
+            }
+        }
+
+    def cache_args(self, payload: Dict) -> tuple:
+        """单轮对话以提示词文本作为缓存键(与既有缓存条目保持一致)"""
+        messages = payload.get('messages', [])
+        prompt = messages[0]['content'] if len(messages) == 1 else messages
+        return (self.name, payload.get('model', ''), prompt,
+                payload.get('temperature'), payload.get('max_tokens'))
+
+
+def create_session(api_key: str, pool_size: int = 16) -> Session:
+    """
+    创建带连接池的Claude HTTP会话
+    :param api_key: Claude API密钥
+    :param pool_size: 连接池大小(并发调用时复用连接)
+    """
+    session = Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update({
+        "x-api-key": api_key,
+        "anthropic-version": "2023-06-01",
+        "content-type": "application/json"
+    })
+    return session
+
+
+def get_zhipuai_client(api_key: str):
+    """获取进程内复用的智谱AI SDK客户端"""
+    with _registry_lock:
+        if api_key not in _zhipuai_clients:
+            from zhipuai import ZhipuAI
+            _zhipuai_clients[api_key] = ZhipuAI(api_key=api_key)
+        return _zhipuai_clients[api_key]
+
+
+def call_zhipuai(api_key: str, prompt: str, model: str = "glm-4.7", max_retries: int = 3,
+                 temperature: float = 0.1, max_tokens: int = 8000) -> Optional[Dict]:
+    """
+    调用智谱AI单轮对话(供评估脚本使用)
+    :param api_key: 智谱AI API密钥
+    :param prompt: 提示词
+    :param model: 模型名称
+    :param max_retries: 最大尝试次数
+    :return: Claude格式的响应字典,失败返回None
+    """
+    provider = ZhipuAIProvider(api_key, max_retries=max(max_retries - 1, 0))
+    payload = {
+        "model": model,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+    cached = provider.cache.get(*provider.cache_args(payload))
+    if cached is not None:
+        print(f"\n[CACHE] 命中智谱AI响应缓存 (模型: {model})")
+        provider.usage_tracker.record(provider.name, model, cached.get('usage'), cache_hit=True)
+        return cached
+
+    print("\n正在调用智谱AI API...")
+    print(f"使用模型: {model}")
+    try:
+        result = provider.create(payload, read_cache=False)
+    except Exception as e:
+        print(f"[ERROR] 智谱AI API调用失败: {str(e)[:100]}")
+        return None
+    print("[OK] 智谱AI API调用成功")
+    return result
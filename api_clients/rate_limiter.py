@@ -0,0 +1,158 @@
+"""
+大模型调用限流
+按每分钟请求数(RPM)和每分钟Token数(TPM)的双令牌桶限流,线程和协程均可使用
+"""
+import asyncio
+import email.utils
+import threading
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """令牌桶(按分钟容量匀速补充)"""
+
+    def __init__(self, capacity_per_minute: float):
+        """
+        初始化令牌桶
+        :param capacity_per_minute: 每分钟容量,同时也是桶的最大容量
+        """
+        self.capacity = float(capacity_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        """按经过的时间补充令牌"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        预占令牌(余额允许为负,保证先到先得)
+        :param amount: 需要的令牌数,超过桶容量时按桶容量计算
+        :return: 需要等待的秒数
+        """
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def adjust(self, amount: float):
+        """
+        修正余额: 正数退还多预占的令牌,负数补扣少预占的令牌
+        :param amount: 修正量
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """RPM + TPM 双令牌桶限流器"""
+
+    def __init__(self, requests_per_minute: Optional[int] = None,
+                 tokens_per_minute: Optional[int] = None):
+        """
+        初始化限流器
+        :param requests_per_minute: 每分钟请求数上限,None表示不限制
+        :param tokens_per_minute: 每分钟Token数上限,None表示不限制
+        """
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, estimated_tokens: int) -> float:
+        """预占一次请求和预估的Token,返回需要等待的秒数"""
+        wait = 0.0
+        if self.request_bucket:
+            wait = max(wait, self.request_bucket.reserve(1))
+        if self.token_bucket and estimated_tokens > 0:
+            wait = max(wait, self.token_bucket.reserve(estimated_tokens))
+        with self._lock:
+            wait = max(wait, self._paused_until - time.monotonic())
+        return wait
+
+    def acquire(self, estimated_tokens: int = 0):
+        """
+        阻塞直到允许发送请求
+        :param estimated_tokens: 预估的本次请求Token数(输入+输出)
+        """
+        wait = self._reserve(estimated_tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, estimated_tokens: int = 0):
+        """acquire 的协程版本"""
+        wait = self._reserve(estimated_tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def reconcile(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """
+        用响应中的实际用量修正预估
+        :param estimated_tokens: 请求前预占的Token数
+        :param actual_tokens: 响应 usage 中的实际Token数,None表示未知
+        """
+        if self.token_bucket and actual_tokens is not None:
+            self.token_bucket.adjust(estimated_tokens - actual_tokens)
+
+    def pause(self, seconds: float):
+        """
+        服务端要求退避(Retry-After)时暂停所有请求
+        :param seconds: 暂停秒数
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """
+    从限流/过载错误中解析 Retry-After
+    :param error: 调用异常(requests.HTTPError 或带 response 的SDK异常)
+    :return: 建议等待的秒数;非限流类错误返回None
+    """
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+
+    status = getattr(response, 'status_code', None)
+    headers = getattr(response, 'headers', None) or {}
+    value = headers.get('retry-after') or headers.get('Retry-After')
+    if value:
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            try:
+                parsed = email.utils.parsedate_to_datetime(value)
+                return max(parsed.timestamp() - time.time(), 0.0)
+            except (TypeError, ValueError):
+                pass
+
+    if status in (429, 503, 529):
+        # 限流或过载但未给出等待时间
+        return 1.0
+    return None
+
+
+def extract_total_tokens(response: Optional[Dict]) -> Optional[int]:
+    """
+    从响应的 usage 字段读取实际Token用量
+    兼容智谱AI(total_tokens)和Claude(input_tokens + output_tokens,另加写入提示词缓存的Token)两种格式
+    :param response: API响应字典
+    :return: 总Token数,没有 usage 时返回None
+    """
+    if not isinstance(response, dict):
+        return None
+    usage = response.get('usage') or {}
+    if 'total_tokens' in usage:
+        return usage['total_tokens']
+    if 'input_tokens' in usage or 'output_tokens' in usage:
+        return (usage.get('input_tokens', 0) + usage.get('output_tokens', 0)
+                + (usage.get('cache_creation_input_tokens') or 0))
+    return None
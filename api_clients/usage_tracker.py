@@ -0,0 +1,225 @@
+"""
+大模型调用用量统计
+记录每次调用的服务商、模型、Token用量、耗时、重试次数、是否命中缓存和所属流水线阶段,
+按运行和文档汇总,并在预计Token消耗超出预算时中止运行
+"""
+import contextlib
+import json
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional
+
+_current_stage: ContextVar[Optional[str]] = ContextVar('llm_usage_stage', default=None)
+_current_document: ContextVar[Optional[str]] = ContextVar('llm_usage_document', default=None)
+
+
+class BudgetExceededError(RuntimeError):
+    """Token消耗(或预计消耗)超出预算"""
+
+
+@contextlib.contextmanager
+def usage_context(stage: Optional[str] = None, document: Optional[str] = None):
+    """
+    标记其中发生的大模型调用所属的阶段和文档(线程和协程各自独立,asyncio.to_thread 会继承)
+    :param stage: 流水线阶段,如 reference_generation / evaluation
+    :param document: 文档标识
+    """
+    tokens = []
+    if stage is not None:
+        tokens.append((_current_stage, _current_stage.set(stage)))
+    if document is not None:
+        tokens.append((_current_document, _current_document.set(document)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def normalize_usage(usage: Optional[Dict]) -> Dict:
+    """
+    统一Claude(input/output_tokens)和智谱AI(prompt/completion_tokens)的用量字段
+    Claude的 input_tokens 不含命中和写入提示词缓存的部分,这两部分分别计入 cache_read/cache_write_tokens
+    :return: {'prompt_tokens', 'completion_tokens', 'cache_read_tokens', 'cache_write_tokens'}
+    """
+    usage = usage or {}
+    return {
+        'prompt_tokens': usage.get('input_tokens', usage.get('prompt_tokens', 0)) or 0,
+        'completion_tokens': usage.get('output_tokens', usage.get('completion_tokens', 0)) or 0,
+        'cache_read_tokens': usage.get('cache_read_input_tokens', 0) or 0,
+        'cache_write_tokens': usage.get('cache_creation_input_tokens', 0) or 0
+    }
+
+
+class UsageTracker:
+    """大模型调用用量统计"""
+
+    def __init__(self, token_budget: Optional[int] = None, prices: Optional[Dict[str, Dict]] = None):
+        """
+        :param token_budget: 单次运行的Token预算(输入+输出),None表示不限制
+        :param prices: 模型单价 {model: {'input': 每百万输入Token价格, 'output': 每百万输出Token价格,
+                       'cache_read'/'cache_write': 提示词缓存读取/写入价格(默认为输入价格的0.1/1.25倍)}},用于估算费用
+        """
+        self.token_budget = token_budget
+        self.prices = prices or {}
+        self.records: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """开始新的一次运行"""
+        with self._lock:
+            self.records = []
+
+    def record(self, provider: str, model: str, usage: Optional[Dict] = None, latency: Optional[float] = None,
+               retries: int = 0, cache_hit: bool = False, stage: Optional[str] = None,
+               document: Optional[str] = None) -> Dict:
+        """
+        记录一次调用
+        :param usage: 响应中的 usage 字段(命中缓存时不计入消耗)
+        :param latency: 耗时(秒,含重试等待)
+        :param retries: 重试次数
+        :param cache_hit: 是否命中本地响应缓存
+        :param stage: 流水线阶段,默认取 usage_context 中的值
+        :param document: 文档标识,默认取 usage_context 中的值
+        :return: 记录
+        """
+        tokens = normalize_usage(None if cache_hit else usage)
+        record = {
+            'timestamp': time.time(),
+            'provider': provider,
+            'model': model,
+            'stage': stage or _current_stage.get() or 'unknown',
+            'document': document or _current_document.get(),
+            'prompt_tokens': tokens['prompt_tokens'],
+            'completion_tokens': tokens['completion_tokens'],
+            'cache_read_tokens': tokens['cache_read_tokens'],
+            'cache_write_tokens': tokens['cache_write_tokens'],
+            'latency': round(latency, 3) if latency is not None else None,
+            'retries': retries,
+            'cache_hit': cache_hit,
+            'cost': self._cost(model, tokens)
+        }
+        with self._lock:
+            self.records.append(record)
+        return record
+
+    def used_tokens(self) -> int:
+        """本次运行已消耗的Token数(提示词缓存读取按一折计费,不计入)"""
+        with self._lock:
+            return sum(r['prompt_tokens'] + r['cache_write_tokens'] + r['completion_tokens'] for r in self.records)
+
+    def check_budget(self, estimated_tokens: int = 0):
+        """
+        调用前检查: 已消耗加上本次预估超出预算时抛出 BudgetExceededError
+        :param estimated_tokens: 本次调用的预估Token数
+        """
+        if self.token_budget is None:
+            return
+        used = self.used_tokens()
+        if used + estimated_tokens > self.token_budget:
+            raise BudgetExceededError(
+                f"Token预算不足: 已使用 {used}, 本次预估 {estimated_tokens}, 预算 {self.token_budget}"
+            )
+
+    def check_projection(self, completed: int, total: int):
+        """
+        按已完成的比例推算整次运行的消耗,超出预算时抛出 BudgetExceededError
+        :param completed: 已完成的文档数
+        :param total: 文档总数
+        """
+        if self.token_budget is None or completed <= 0 or completed >= total:
+            return
+        used = self.used_tokens()
+        projected = used * total // completed
+        if projected > self.token_budget:
+            raise BudgetExceededError(
+                f"预计Token消耗 {projected} 超出预算 {self.token_budget} "
+                f"(已完成 {completed}/{total}, 已使用 {used})"
+            )
+
+    def summary(self) -> Dict:
+        """
+        汇总统计
+        :return: {'total', 'by_stage', 'by_document', 'by_model', 'token_budget'}
+        """
+        with self._lock:
+            records = list(self.records)
+        return {
+            'total': self._aggregate(records),
+            'by_stage': self._group(records, lambda r: r['stage']),
+            'by_document': self._group(records, lambda r: r['document'] or 'unknown'),
+            'by_model': self._group(records, lambda r: f"{r['provider']}/{r['model']}"),
+            'token_budget': self.token_budget
+        }
+
+    def save(self, path: str, include_records: bool = True) -> Path:
+        """
+        保存JSON汇总
+        :param path: 输出文件路径
+        :param include_records: 是否包含逐次调用明细
+        :return: 文件路径
+        """
+        data = self.summary()
+        if include_records:
+            with self._lock:
+                data['records'] = list(self.records)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        return path
+
+    def attach_to_allure(self, name: str = "大模型调用统计"):
+        """将JSON汇总作为附件添加到Allure报告(未安装allure时跳过)"""
+        try:
+            import allure
+        except ImportError:
+            return
+        allure.attach(json.dumps(self.summary(), ensure_ascii=False, indent=2), name,
+                      allure.attachment_type.JSON)
+
+    def _cost(self, model: str, tokens: Dict) -> Optional[float]:
+        price = self.prices.get(model)
+        if not price:
+            return None
+        input_price = price.get('input', 0)
+        return round((tokens['prompt_tokens'] * input_price
+                      + tokens['cache_read_tokens'] * price.get('cache_read', input_price * 0.1)
+                      + tokens['cache_write_tokens'] * price.get('cache_write', input_price * 1.25)
+                      + tokens['completion_tokens'] * price.get('output', 0)) / 1_000_000, 6)
+
+    @staticmethod
+    def _aggregate(records: List[Dict]) -> Dict:
+        latencies = sorted(r['latency'] for r in records if r['latency'] is not None and not r['cache_hit'])
+        costs = [r['cost'] for r in records if r['cost'] is not None]
+        calls = len(records)
+        cache_hits = sum(1 for r in records if r['cache_hit'])
+        return {
+            'calls': calls,
+            'cache_hits': cache_hits,
+            'cache_hit_rate': round(cache_hits / calls * 100, 2) if calls else 0,
+            'prompt_tokens': sum(r['prompt_tokens'] for r in records),
+            'completion_tokens': sum(r['completion_tokens'] for r in records),
+            'cache_read_tokens': sum(r['cache_read_tokens'] for r in records),
+            'cache_write_tokens': sum(r['cache_write_tokens'] for r in records),
+            'retries': sum(r['retries'] for r in records),
+            'avg_latency': round(sum(latencies) / len(latencies), 3) if latencies else None,
+            'p95_latency': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else None,
+            'cost': round(sum(costs), 6) if costs else None
+        }
+
+    def _group(self, records: List[Dict], key) -> Dict:
+        groups: Dict[str, List[Dict]] = {}
+        for record in records:
+            groups.setdefault(key(record), []).append(record)
+        return {name: self._aggregate(items) for name, items in groups.items()}
+
+
+_default_tracker = UsageTracker()
+
+
+def get_usage_tracker() -> UsageTracker:
+    """获取进程内共享的用量统计"""
+    return _default_tracker
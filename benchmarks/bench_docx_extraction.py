@@ -0,0 +1,123 @@
+"""
+Word文档提取性能对比
+对比 python-docx 对象模型加载(原实现)与流式解析的耗时和峰值内存
+
+用法:
+    python -m benchmarks.bench_docx_extraction                      # 生成不同规模的标书文档对比
+    python -m benchmarks.bench_docx_extraction test_cases/download  # 对比目录中已有的docx文件
+"""
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 生成文档的规模(章节数),每个章节包含若干段落和一张评分表
+GENERATED_SIZES = [50, 500, 2000]
+
+
+def generate_bid_document(file_path: Path, sections: int):
+    """
+    生成模拟的投标文件
+    :param file_path: 输出路径
+    :param sections: 章节数
+    """
+    from docx import Document
+
+    doc = Document()
+    for i in range(1, sections + 1):
+        doc.add_heading(f"第{i}章 技术方案", level=1)
+        doc.add_heading(f"{i}.1 实施方案", level=2)
+        for j in range(5):
+            doc.add_paragraph(f"投标人应具备信息系统集成资质,项目{i}-{j}须在合同签订后90日内完成部署并通过验收。")
+        table = doc.add_table(rows=4, cols=3)
+        for r, row in enumerate(table.rows):
+            row.cells[0].text = f"评分项{i}-{r}"
+            row.cells[1].text = f"{r + 1}分"
+            row.cells[2].text = "提供近三年类似项目业绩合同扫描件"
+    doc.save(str(file_path))
+
+
+def extract_with_python_docx(file_path: str) -> int:
+    """原实现: 加载完整对象模型,仅拼接段落文本"""
+    from docx import Document
+
+    doc = Document(file_path)
+    text = ""
+    for paragraph in doc.paragraphs:
+        text += paragraph.text + "\n"
+    return len(text)
+
+
+def extract_with_stream(file_path: str) -> int:
+    """流式解析: 段落和表格行"""
+    from processors.docx_stream import iter_docx_blocks
+
+    return sum(len(block['text']) + 1 for block in iter_docx_blocks(file_path))
+
+
+def _peak_memory_mb() -> float:
+    """当前进程的峰值常驻内存(MB)"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux返回KB,macOS返回字节
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        return float('nan')
+
+
+def _run_in_child(func_name: str, file_path: str, queue):
+    """在独立子进程中运行提取函数,避免互相影响峰值内存"""
+    func = globals()[func_name]
+    baseline = _peak_memory_mb()
+    start = time.perf_counter()
+    chars = func(file_path)
+    elapsed = time.perf_counter() - start
+    queue.put((elapsed, _peak_memory_mb() - baseline, chars))
+
+
+def measure(func_name: str, file_path: str) -> tuple:
+    """
+    测量提取函数的耗时、峰值内存增量和输出字符数
+    :return: (耗时秒, 峰值内存增量MB, 字符数)
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_run_in_child, args=(func_name, file_path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def run_benchmark(files):
+    """对每个文件运行两种提取方式并打印结果"""
+    print(f"{'文件':<40}{'大小(KB)':>10}  {'方式':<12}{'耗时(s)':>10}{'内存(MB)':>10}{'字符数':>10}")
+    print("-" * 96)
+    for file_path in files:
+        size_kb = Path(file_path).stat().st_size / 1024
+        for label, func_name in [('python-docx', 'extract_with_python_docx'),
+                                 ('stream', 'extract_with_stream')]:
+            elapsed, memory, chars = measure(func_name, str(file_path))
+            print(f"{Path(file_path).name[:38]:<40}{size_kb:>10.0f}  {label:<12}"
+                  f"{elapsed:>10.3f}{memory:>10.1f}{chars:>10}")
+
+
+def main():
+    if len(sys.argv) > 1:
+        files = sorted(Path(sys.argv[1]).glob('*.docx'))
+        run_benchmark(files)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files = []
+        for sections in GENERATED_SIZES:
+            file_path = Path(tmp_dir) / f"generated_bid_{sections}.docx"
+            print(f"生成测试文档: {file_path.name}")
+            generate_bid_document(file_path, sections)
+            files.append(file_path)
+        run_benchmark(files)
+
+
+if __name__ == '__main__':
+    main()
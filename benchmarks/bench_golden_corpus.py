@@ -0,0 +1,282 @@
+"""
+检查点匹配基准(黄金语料)
+在固定的算法响应和冻结的参考检查点上运行各个匹配器,报告与人工标注匹配对的一致程度、耗时和峰值内存,
+并与保存的基线对比,超出容差时以非零状态退出(可在CI中使用)
+
+语料为 benchmarks/golden_corpus/*.json,每个文件一个用例:
+    {
+      "name": "用例名",
+      "document": "招标文件",
+      "algorithm_response": {...},          # 算法接口原始响应(冻结)
+      "reference_checkpoints": [...],       # 参考检查点(冻结,每项有 id)
+      "labels": {
+        "labeled_by": "标注人",             # 为空表示尚未标注,只统计耗时和内存
+        "pairs": [["算法检查点id", "参考检查点id"], ...]
+      }
+    }
+标注必须由人工完成: scaffold 只生成未标注的用例,不会根据任何匹配器的结果预填匹配对
+没有已标注用例时准确度对比明确报告为 SKIPPED;没有基线时无法对比,报告 SKIPPED 并以状态码 2 退出
+
+须在仓库根目录以模块方式运行(直接运行 python benchmarks/bench_golden_corpus.py 时找不到项目模块):
+    python -m benchmarks.bench_golden_corpus                      # 运行并与基线对比
+    python -m benchmarks.bench_golden_corpus --update-baseline    # 运行并保存为新基线
+    python -m benchmarks.bench_golden_corpus scaffold 用例名 --response 算法响应.json --reference 对比结果.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from evaluate_checkpoints_with_claude import compare_checkpoints_simple
+from evaluate_checkpoints_with_claude_v2 import compare_checkpoints_improved, extract_algorithm_checkpoints
+from evaluators.claude_evaluator import ClaudeEvaluator
+
+CORPUS_DIR = Path(__file__).parent / 'golden_corpus'
+BASELINE_PATH = CORPUS_DIR / 'baseline.json'
+# 没有基线、无法判断是否退化时的退出状态码(区别于通过的0和发现退化的1)
+EXIT_SKIPPED = 2
+# 计时取多次运行的最小值
+REPEATS = 5
+# 准确度指标(百分点)允许的下降
+ACCURACY_TOLERANCE = 2.0
+# 耗时和峰值内存允许的相对增长;低于绝对下限的变化视为噪声
+TIME_TOLERANCE = 0.5
+TIME_NOISE_SECONDS = 0.005
+MEMORY_TOLERANCE = 0.5
+MEMORY_NOISE_KB = 64
+
+
+def _match_simple(algorithm: list, reference: list) -> dict:
+    return {'matched': compare_checkpoints_simple(algorithm, reference)['matched'], 'pairs': None}
+
+
+def _match_improved(algorithm: list, reference: list) -> dict:
+    result = compare_checkpoints_improved(algorithm, reference)
+    algorithm_index = {id(cp): i for i, cp in enumerate(algorithm)}
+    reference_index = {id(cp): j for j, cp in enumerate(reference)}
+    pairs = {(algorithm_index[id(pair['algorithm'])], reference_index[id(pair['zhipuai'])])
+             for pair in result['matched_pairs']}
+    return {'matched': result['matched'], 'pairs': pairs}
+
+
+def _match_local_statistics(algorithm: list, reference: list) -> dict:
+    # 算法检查点没有 content 字段,取标签和取值
+    algorithm = [dict(cp, content=' '.join(dict.fromkeys(filter(None, (cp.get('label'), cp.get('value'))))))
+                 for cp in algorithm]
+    return {'matched': ClaudeEvaluator(None)._calculate_statistics(algorithm, reference)['matched_checkpoints'],
+            'pairs': None}
+
+
+# 匹配器: (算法检查点, 参考检查点) -> {'matched': 匹配数, 'pairs': {(算法序号, 参考序号)} 或 None(不输出匹配对)}
+MATCHERS = {
+    'compare_checkpoints_simple': _match_simple,
+    'compare_checkpoints_improved': _match_improved,
+    'local_statistics': _match_local_statistics,
+}
+
+
+def load_corpus(corpus_dir: Path = CORPUS_DIR) -> list:
+    """
+    加载语料
+    :return: [{'name', 'algorithm', 'reference', 'labels'(人工匹配对集合,未标注为None)}]
+    """
+    cases = []
+    for path in sorted(corpus_dir.glob('*.json')):
+        if path == BASELINE_PATH or path.name == BASELINE_PATH.name:
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        algorithm = extract_algorithm_checkpoints(data['algorithm_response'])
+        reference = data['reference_checkpoints']
+
+        labels = None
+        if (data.get('labels') or {}).get('labeled_by'):
+            algorithm_ids = {str(cp.get('id')): i for i, cp in enumerate(algorithm)}
+            reference_ids = {str(cp.get('id')): j for j, cp in enumerate(reference)}
+            labels = set()
+            for algorithm_id, reference_id in data['labels']['pairs']:
+                if str(algorithm_id) not in algorithm_ids or str(reference_id) not in reference_ids:
+                    raise ValueError(f"{path.name}: 标注的检查点不存在: {algorithm_id} -> {reference_id}")
+                labels.add((algorithm_ids[str(algorithm_id)], reference_ids[str(reference_id)]))
+        cases.append({'name': data.get('name', path.stem), 'algorithm': algorithm,
+                      'reference': reference, 'labels': labels})
+    return cases
+
+
+def _f1(precision: float, recall: float) -> float:
+    return 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
+
+
+def _count_f1(matched: int, algorithm_count: int, reference_count: int) -> float:
+    """按匹配数计算的算法F1(百分比),即评估脚本报告给用户的分数"""
+    precision = matched / algorithm_count if algorithm_count else 0
+    recall = matched / reference_count if reference_count else 0
+    return _f1(precision, recall) * 100
+
+
+def run_matcher(matcher, cases: list) -> dict:
+    """
+    在全部用例上运行一个匹配器
+    :return: {
+        'seconds': 各用例最小耗时之和, 'peak_kb': 最大峰值内存,
+        'f1_error': 已标注用例上报告的F1与人工标注F1之差的平均绝对值(百分点),
+        'pair_precision'/'pair_recall'/'pair_f1': 匹配对与人工标注的一致程度(百分比,不输出匹配对的匹配器为None),
+        'labeled_cases': 已标注用例数
+    }
+    """
+    seconds, peak_kb = 0.0, 0.0
+    f1_errors, true_positive, predicted, expected = [], 0, 0, 0
+    has_pairs = True
+    for case in cases:
+        with contextlib.redirect_stdout(io.StringIO()):
+            best = None
+            for _ in range(REPEATS):
+                start = time.perf_counter()
+                result = matcher(case['algorithm'], case['reference'])
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+
+            tracemalloc.start()
+            matcher(case['algorithm'], case['reference'])
+            peak_kb = max(peak_kb, tracemalloc.get_traced_memory()[1] / 1024)
+            tracemalloc.stop()
+        seconds += best
+
+        labels = case['labels']
+        if labels is None:
+            continue
+        counts = len(case['algorithm']), len(case['reference'])
+        f1_errors.append(abs(_count_f1(result['matched'], *counts) - _count_f1(len(labels), *counts)))
+        if result['pairs'] is None:
+            has_pairs = False
+        else:
+            true_positive += len(result['pairs'] & labels)
+            predicted += len(result['pairs'])
+            expected += len(labels)
+
+    metrics = {'seconds': round(seconds, 6), 'peak_kb': round(peak_kb, 1), 'labeled_cases': len(f1_errors),
+               'f1_error': round(sum(f1_errors) / len(f1_errors), 2) if f1_errors else None,
+               'pair_precision': None, 'pair_recall': None, 'pair_f1': None}
+    if f1_errors and has_pairs:
+        precision = true_positive / predicted if predicted else 0
+        recall = true_positive / expected if expected else 0
+        metrics.update(pair_precision=round(precision * 100, 2), pair_recall=round(recall * 100, 2),
+                       pair_f1=round(_f1(precision, recall) * 100, 2))
+    return metrics
+
+
+def find_regressions(results: dict, baseline: dict) -> list:
+    """
+    与基线对比
+    :param results: {匹配器: run_matcher 的结果}
+    :param baseline: 同结构的基线
+    :return: 超出容差的变化说明列表
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        for metric in ('pair_precision', 'pair_recall', 'pair_f1'):
+            if previous.get(metric) is not None and current[metric] is not None \
+                    and current[metric] < previous[metric] - ACCURACY_TOLERANCE:
+                regressions.append(f"{name}: {metric} {previous[metric]} -> {current[metric]}")
+        if previous.get('f1_error') is not None and current['f1_error'] is not None \
+                and current['f1_error'] > previous['f1_error'] + ACCURACY_TOLERANCE:
+            regressions.append(f"{name}: f1_error {previous['f1_error']} -> {current['f1_error']}")
+        if current['seconds'] > previous['seconds'] * (1 + TIME_TOLERANCE) \
+                and current['seconds'] - previous['seconds'] > TIME_NOISE_SECONDS:
+            regressions.append(f"{name}: seconds {previous['seconds']} -> {current['seconds']}")
+        if current['peak_kb'] > previous['peak_kb'] * (1 + MEMORY_TOLERANCE) \
+                and current['peak_kb'] - previous['peak_kb'] > MEMORY_NOISE_KB:
+            regressions.append(f"{name}: peak_kb {previous['peak_kb']} -> {current['peak_kb']}")
+    return regressions
+
+
+def scaffold(name: str, response_path: str, reference_path: str, corpus_dir: Path = CORPUS_DIR) -> Path:
+    """
+    由保存的算法响应和参考检查点生成未标注的用例
+    :param reference_path: 参考检查点列表的JSON文件,或评估脚本的对比结果(取 zhipuai_checkpoints)
+    :return: 用例文件路径
+    """
+    with open(response_path, 'r', encoding='utf-8') as f:
+        response = json.load(f)
+    with open(reference_path, 'r', encoding='utf-8') as f:
+        reference = json.load(f)
+    if isinstance(reference, dict):
+        reference = reference['zhipuai_checkpoints']
+    # 参考检查点需要稳定的 id 供标注引用
+    reference = [dict(cp, id=str(cp.get('id') or f"R{j + 1}")) for j, cp in enumerate(reference)]
+
+    path = corpus_dir / f"{name}.json"
+    if path.exists():
+        raise FileExistsError(f"用例已存在: {path}")
+    corpus_dir.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'name': name,
+            'document': Path(response_path).name,
+            'algorithm_response': response,
+            'reference_checkpoints': reference,
+            'labels': {'labeled_by': None, 'pairs': []}
+        }, f, ensure_ascii=False, indent=2)
+    return path
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="检查点匹配基准(黄金语料)")
+    subparsers = parser.add_subparsers(dest='command')
+    scaffold_parser = subparsers.add_parser('scaffold', help="生成未标注的用例")
+    scaffold_parser.add_argument('name')
+    scaffold_parser.add_argument('--response', required=True, help="算法接口响应JSON")
+    scaffold_parser.add_argument('--reference', required=True, help="参考检查点JSON或对比结果JSON")
+    parser.add_argument('--update-baseline', action='store_true', help="保存本次结果为新基线")
+    args = parser.parse_args(argv)
+
+    if args.command == 'scaffold':
+        path = scaffold(args.name, args.response, args.reference)
+        print(f"已生成用例: {path}\n请人工填写 labels.pairs 和 labels.labeled_by")
+        return 0
+
+    cases = load_corpus()
+    if not cases:
+        print(f"语料为空: {CORPUS_DIR}")
+        return 1
+    unlabeled = [case['name'] for case in cases if case['labels'] is None]
+    print(f"用例: {len(cases)} 个" + (f"(未标注 {len(unlabeled)} 个,只统计耗时和内存)" if unlabeled else ""))
+    if len(unlabeled) == len(cases):
+        print("SKIPPED 准确度对比: 语料中没有人工标注的用例,只对比耗时和内存")
+
+    results = {name: run_matcher(matcher, cases) for name, matcher in MATCHERS.items()}
+    columns = ('pair_precision', 'pair_recall', 'pair_f1', 'f1_error', 'seconds', 'peak_kb')
+    print(f"\n{'匹配器':<30}" + ''.join(f"{column:>16}" for column in columns))
+    print("-" * (30 + 16 * len(columns)))
+    for name, metrics in results.items():
+        print(f"{name:<30}" + ''.join(f"{'-' if metrics[c] is None else metrics[c]:>16}" for c in columns))
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已更新: {BASELINE_PATH}")
+        return 0
+
+    if not BASELINE_PATH.exists():
+        print(f"\nSKIPPED 基线对比: 没有基线 {BASELINE_PATH},使用 --update-baseline 保存")
+        return EXIT_SKIPPED
+    with open(BASELINE_PATH, 'r', encoding='utf-8') as f:
+        regressions = find_regressions(results, json.load(f))
+    if regressions:
+        print("\n超出容差的退化:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print("\n与基线相比没有超出容差的退化")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
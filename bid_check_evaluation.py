@@ -8,6 +8,7 @@ import yaml
 from datetime import datetime
 from typing import Dict, List, Any
 from api_clients.claude_client import ClaudeClient
+from api_clients.json_stream import extract_json
 
 
 class BidCheckEvaluator:
@@ -237,43 +238,28 @@ class BidCheckEvaluator:
 
     def _parse_claude_check_points(self, response: str) -> List[Dict]:
         """解析Claude返回的检查点"""
-        try:
-            # 提取JSON部分
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                json_str = response.split("```")[1].split("```")[0].strip()
-            else:
-                json_str = response
-
-            data = json.loads(json_str)
-            check_points = data.get('check_points', [])
-
-            print(f"✓ Claude生成了 {len(check_points)} 个检查点")
-            return check_points
-
-        except Exception as e:
-            print(f"⚠ 解析Claude检查点失败: {e}")
+        extraction = extract_json(response, 'check_points')
+        if extraction.data is None:
+            print(f"⚠ 解析Claude检查点失败: {extraction.error}")
             return []
+        if not extraction.complete:
+            print(f"⚠ Claude检查点{extraction.describe()}")
+
+        check_points = extraction.data.get('check_points', [])
+        print(f"✓ Claude生成了 {len(check_points)} 个检查点")
+        return check_points
 
     def _parse_claude_bid_info(self, response: str) -> Dict:
         """解析Claude返回的投标信息"""
-        try:
-            # 提取JSON部分
-            if "```json" in response:
-                json_str = response.split("```json")[1].split("```")[0].strip()
-            elif "```" in response:
-                json_str = response.split("```")[1].split("```")[0].strip()
-            else:
-                json_str = response
-
-            bid_info = json.loads(json_str)
-            print(f"✓ Claude生成了投标信息")
-            return bid_info
-
-        except Exception as e:
-            print(f"⚠ 解析Claude投标信息失败: {e}")
+        extraction = extract_json(response)
+        if not isinstance(extraction.data, dict):
+            print(f"⚠ 解析Claude投标信息失败: {extraction.error or '不是JSON对象'}")
             return {}
+        if not extraction.complete:
+            print(f"⚠ Claude投标信息{extraction.describe()}")
+
+        print(f"✓ Claude生成了投标信息")
+        return extraction.data
 
     def _compare_check_points(
         self,
@@ -4,13 +4,24 @@
 """
 import json
 import os
+import threading
 from pathlib import Path
 from typing import Dict, List, Optional
 
-from api_clients.claude_client import ClaudeClient
+from api_clients.claude_client import DOCUMENT_PREFIX_CHARS, ClaudeClient
 from api_clients.algorithm_client import AlgorithmClient
+from api_clients.async_llm_client import AsyncLLMClient
+from api_clients.rate_limiter import RateLimiter
+from api_clients.usage_tracker import BudgetExceededError, UsageTracker, usage_context
 from evaluators.claude_evaluator import ClaudeEvaluator
+from evaluators.report_writer import EvaluationReportWriter
 from processors.document_processor import DocumentProcessor
+from processors.fingerprint import NearDuplicateIndex
+from utils.prompt_registry import get_prompt_registry
+from utils.run_journal import RunJournal
+
+# 单次生成参考答案时发送的文本长度(与 ClaudeClient.build_reference_payload 的截断长度一致)
+REFERENCE_SINGLE_PASS_CHARS = DOCUMENT_PREFIX_CHARS
 
 
 class BidParserEvaluationPipeline:
@@ -23,120 +34,345 @@ class BidParserEvaluationPipeline:
             - claude_api_key: Claude API密钥
             - algorithm_env: 算法API环境
             - output_dir: 输出目录
+            - llm_requests_per_minute: 大模型每分钟请求数上限(默认不限制)
+            - llm_tokens_per_minute: 大模型每分钟Token数上限(默认不限制)
+            - llm_stream: 是否流式调用Claude(默认False)
+            - llm_prompt_caching: 是否缓存招标文件前缀,参考答案和评估请求共用(默认True)
+            - llm_token_budget: 单次运行的Token预算,预计超出时中止(默认不限制)
+            - llm_prices: 模型单价 {model: {input, output, cache_read, cache_write}}(每百万Token),用于估算费用
+            - llm_hedge_percentile: 请求耗时超过该分位数(如95)时发出对冲请求(默认读取环境变量 LLM_HEDGE_PERCENTILE)
+            - enable_dedup: 是否启用近似重复检测(默认True)
+            - dedup_threshold: 近似重复的相似度阈值(默认0.9)
+            - dedup_index_path: 指纹索引文件路径(默认 output_dir/fingerprints.json)
+            - batch_dir: 离线批量评估的批处理文件目录(默认 output_dir/batches)
+            - max_concurrent: 批量评估时同时处理的文档数(默认1)
+            - local_match_threshold: 本地统计判定检查点匹配的相似度阈值(默认0.5)
+            - evaluation_mode: 'full' 两份完整列表一次评估(默认) / 'pairs' 本地BM25检索候选对后分批由大模型判断
+            - pair_judging: pairs 模式的选项
+                - top_k: 每个算法检查点的参考检查点候选数(默认3)
+                - batch_size: 每次请求判断的算法检查点数(默认30)
+            - enable_journal: 是否记录运行日志(默认True)
+            - journal_path: 运行日志路径(默认 output_dir/run_journal.jsonl)
+            - resume: 是否从运行日志继续上次中断的运行,跳过已完成的阶段(默认False,清空旧日志)
+            - reference_generation: 参考答案生成选项
+                - map_reduce: 长文档分块生成后合并(默认True)
+                - chunk_tokens / overlap_tokens: 分块Token上限和重叠(默认3000/200)
+                - max_concurrent: 分块并发数(默认4)
+                - consolidation_model: 合并后用于整理的模型(默认不整理)
         """
         self.config = config or {}
 
         # 初始化组件
         claude_api_key = self.config.get('claude_api_key') or os.getenv('CLAUDE_API_KEY', '')
-        self.claude_client = ClaudeClient(claude_api_key)
+        self.rate_limiter = RateLimiter(
+            requests_per_minute=self.config.get('llm_requests_per_minute'),
+            tokens_per_minute=self.config.get('llm_tokens_per_minute')
+        )
+        # 每个流水线单独统计用量,预算和单价不影响同一进程中的其他流水线
+        self.usage_tracker = UsageTracker(
+            token_budget=self.config.get('llm_token_budget'),
+            prices=self.config.get('llm_prices')
+        )
+        self.claude_client = ClaudeClient(
+            claude_api_key,
+            rate_limiter=self.rate_limiter,
+            stream=self.config.get('llm_stream', False),
+            hedge_percentile=self.config.get('llm_hedge_percentile'),
+            prompt_caching=self.config.get('llm_prompt_caching', True),
+            usage_tracker=self.usage_tracker
+        )
         self.algorithm_client = AlgorithmClient(
             self.config.get('algorithm_env', 'Test_Env')
         )
         self.document_processor = DocumentProcessor()
-        self.evaluator = ClaudeEvaluator(self.claude_client)
+        pair_options = self.config.get('pair_judging') or {}
+        self.evaluator = ClaudeEvaluator(
+            self.claude_client,
+            match_threshold=self.config.get('local_match_threshold', 0.5),
+            evaluation_mode=self.config.get('evaluation_mode', 'full'),
+            pair_top_k=pair_options.get('top_k', 3),
+            pair_batch_size=pair_options.get('batch_size', 30)
+        )
 
         # 输出目录
         self.output_dir = Path(self.config.get('output_dir', './test_data/evaluation/output'))
         self.output_dir.mkdir(parents=True, exist_ok=True)
 
+        # 近似重复检测: 修订版本复用已有的参考答案和评估结果
+        self.dedup_index = None
+        if self.config.get('enable_dedup', True):
+            self.dedup_index = NearDuplicateIndex(
+                self.config.get('dedup_index_path', str(self.output_dir / 'fingerprints.json')),
+                threshold=self.config.get('dedup_threshold', 0.9)
+            )
+
+        # 运行日志: 记录每份文档已完成的阶段,中断后可继续
+        self.journal = None
+        if self.config.get('enable_journal', True):
+            self.journal = RunJournal(
+                self.config.get('journal_path', str(self.output_dir / 'run_journal.jsonl')),
+                resume=self.config.get('resume', False)
+            )
+
     def evaluate_single_document(self, document_path: str,
-                                document_id: Optional[str] = None) -> Dict:
+                                document_id: Optional[str] = None,
+                                fingerprint: Optional[List[int]] = None) -> Dict:
         """
         评估单份招标文件
         :param document_path: 文档文件路径
         :param document_id: 文档ID(如果已有上传后的ID)
+        :param fingerprint: 文档指纹(load_batch已计算时传入,避免重复计算)
         :return: 评估结果
         """
         try:
-            print(f"\n{'='*60}")
-            print(f"开始评估文档: {document_path}")
-            print(f"{'='*60}")
-
-            # 1. 读取并预处理招标文件
-            print(f"\n[1/4] 读取文档内容...")
-            document_text = self.document_processor.load_and_preprocess(document_path)
-            print(f"文档读取成功,内容长度: {len(document_text)} 字符")
-
-            # 2. 调用算法模型解析
-            print(f"\n[2/4] 调用算法模型解析...")
-            if document_id:
-                # 使用文档ID调用算法API
-                algorithm_checkpoints = self.algorithm_client.parse_bid_document(document_id)
-            else:
-                # 如果没有文档ID,需要先上传文档获取ID
-                # 这里需要根据实际API实现
-                raise NotImplementedError("需要先上传文档获取ID,或提供document_id参数")
-
-            print(f"算法解析成功,提取了 {len(algorithm_checkpoints)} 个检查点")
-
-            # 3. 使用Claude生成参考答案
-            print(f"\n[3/4] 生成参考答案...")
-            reference_checkpoints = self.claude_client.generate_reference_checkpoints(document_text)
-            print(f"参考答案生成成功,包含 {len(reference_checkpoints)} 个检查点")
+            with usage_context(document=document_path):
+                return self._evaluate_document(document_path, document_id, fingerprint)
+        except BudgetExceededError:
+            raise
+        except Exception as e:
+            print(f"\n❌ 评估失败 {document_path}: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return {'error': str(e)}
 
-            # 4. 使用Claude评估算法输出
-            print(f"\n[4/4] 评估算法输出...")
+    def _evaluate_document(self, document_path: str, document_id: Optional[str],
+                           fingerprint: Optional[List[int]]) -> Dict:
+        """评估单份招标文件的各个步骤,异常由 evaluate_single_document 处理"""
+        print(f"\n{'='*60}")
+        print(f"开始评估文档: {document_path}")
+        print(f"{'='*60}")
+
+        completed = self._completed_stages(document_path, document_id)
+        if 'evaluated' in completed:
+            print(f"运行日志中已完成评估,跳过")
+            return completed['evaluated']['evaluation_result']
+
+        # 1. 读取并预处理招标文件
+        print(f"\n[1/4] 读取文档内容...")
+        prepared = self._prepare_document(document_path, document_id, fingerprint, completed)
+        document_text = prepared['document_text']
+        previous = prepared['previous']
+        algorithm_checkpoints = prepared['algorithm_checkpoints']
+
+        # 3. 使用Claude生成参考答案
+        print(f"\n[3/4] 生成参考答案...")
+        # 只有本次单次生成参考答案时招标文件前缀才写入了提示词缓存,评估请求可以读取
+        prefix_written = False
+        if 'reference' in completed:
+            print(f"从运行日志恢复参考答案")
+            reference_checkpoints = completed['reference']['reference_checkpoints']
+        else:
+            reference_checkpoints = self._reusable_reference(previous)
+            if reference_checkpoints is None:
+                reference_checkpoints = self._generate_reference(document_text)
+                prefix_written = self.claude_client.prompt_caching and self._single_pass_reference(document_text)
+            # 调用失败时客户端返回空列表,不记录,继续运行时重新生成
+            if reference_checkpoints:
+                self._journal_record(document_path, 'reference', {'reference_checkpoints': reference_checkpoints})
+        print(f"参考答案生成成功,包含 {len(reference_checkpoints)} 个检查点")
+
+        # 4. 使用Claude评估算法输出
+        print(f"\n[4/4] 评估算法输出...")
+        evaluation_result = self._reusable_evaluation(previous, algorithm_checkpoints)
+        if evaluation_result is None:
             evaluation_result = self.evaluator.evaluate(
                 document_text,
                 algorithm_checkpoints,
-                reference_checkpoints
+                reference_checkpoints,
+                cache_prefix=prefix_written
             )
 
-            # 添加元数据
-            evaluation_result['metadata'] = {
-                'document_path': document_path,
-                'document_id': document_id,
-                'algorithm_checkpoints_count': len(algorithm_checkpoints),
-                'reference_checkpoints_count': len(reference_checkpoints)
-            }
-
-            # 5. 保存结果
-            self._save_results(document_path, {
-                'algorithm_output': algorithm_checkpoints,
-                'reference_checkpoints': reference_checkpoints,
-                'evaluation_result': evaluation_result
-            })
-
-            print(f"\n{'='*60}")
-            print(f"评估完成!")
-            print(f"总体评分: {evaluation_result.get('overall_score', 0)}")
-            print(f"F1分数: {evaluation_result.get('f1_score', 0)}")
-            print(f"{'='*60}\n")
+        # 5. 保存结果
+        self._finalize_document(prepared, reference_checkpoints, evaluation_result)
 
-            return evaluation_result
+        print(f"\n{'='*60}")
+        print(f"评估完成!")
+        print(f"总体评分: {evaluation_result.get('overall_score', 0)}")
+        print(f"F1分数: {evaluation_result.get('f1_score', 0)}")
+        print(f"{'='*60}\n")
 
-        except Exception as e:
-            print(f"\n❌ 评估失败 {document_path}: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return {'error': str(e)}
+        return evaluation_result
 
     def evaluate_batch(self, documents: List[Dict[str, str]],
-                      max_concurrent: int = 1) -> List[Dict]:
+                      max_concurrent: Optional[int] = None) -> List[Dict]:
         """
         批量评估招标文件
         :param documents: 文档列表,每个元素包含:
             - path: 文档路径
             - document_id: 文档ID(可选)
-        :param max_concurrent: 最大并发数(暂不支持并发,保留参数)
-        :return: 评估结果列表
+        :param max_concurrent: 同时评估的文档数,默认取配置 max_concurrent(默认1,逐个评估);
+            大于1时各文档的算法解析和大模型调用相互重叠,大模型请求仍统一经过限流器
+        :return: 评估结果列表,与 documents 的前缀逐项对应(超出Token预算中止时只包含中止前连续完成的文档)
         """
+        if max_concurrent is None:
+            max_concurrent = self.config.get('max_concurrent', 1)
         print(f"\n开始批量评估 {len(documents)} 个文档...")
+        self.usage_tracker.reset()
+        # 每完成一个文档就写入报告,运行中途可查看已完成部分
+        report_writer = EvaluationReportWriter(str(self.output_dir))
+
+        if max_concurrent > 1:
+            results = self._evaluate_batch_concurrent(documents, max_concurrent, report_writer)
+            self._generate_batch_report(report_writer)
+            return results
 
         results = []
-        for i, doc_info in enumerate(documents, 1):
-            print(f"\n处理第 {i}/{len(documents)} 个文档")
-            result = self.evaluate_single_document(
-                document_path=doc_info['path'],
-                document_id=doc_info.get('document_id')
-            )
-            results.append(result)
+        try:
+            for i, doc_info in enumerate(documents, 1):
+                print(f"\n处理第 {i}/{len(documents)} 个文档")
+                result = self.evaluate_single_document(
+                    document_path=doc_info['path'],
+                    document_id=doc_info.get('document_id'),
+                    fingerprint=doc_info.get('fingerprint')
+                )
+                results.append(result)
+                report_writer.add(result, i, doc_info['path'])
+                self.usage_tracker.check_projection(i, len(documents))
+        except BudgetExceededError as e:
+            print(f"\n❌ 中止批量评估: {str(e)}")
 
         # 生成批量评估报告
-        self._generate_batch_report(results)
+        self._generate_batch_report(report_writer)
 
         return results
 
+    def _evaluate_batch_concurrent(self, documents: List[Dict[str, str]], max_concurrent: int,
+                                   report_writer: EvaluationReportWriter) -> List[Dict]:
+        """
+        并发评估多个文档,单个文档失败只记录在该文档的结果中;超出Token预算后不再开始新的文档
+        :param documents: 文档列表,格式同 evaluate_batch
+        :param max_concurrent: 同时评估的文档数
+        :param report_writer: 报告,按完成顺序写入(带文档序号)
+        :return: 评估结果列表,与 documents 的前缀逐项对应: 超出Token预算中止时截止到第一个未评估的文档
+                 (其后已完成的文档仍写入报告和运行日志,继续运行时直接恢复)
+        """
+        print(f"并发评估 {len(documents)} 个文档 (并发数: {max_concurrent})")
+        results = [None] * len(documents)
+        completed = []
+        lock = threading.Lock()
+        budget_exceeded = threading.Event()
+
+        def evaluate(index: int, doc_info: Dict):
+            if budget_exceeded.is_set():
+                return
+            try:
+                results[index] = self.evaluate_single_document(
+                    document_path=doc_info['path'],
+                    document_id=doc_info.get('document_id'),
+                    fingerprint=doc_info.get('fingerprint')
+                )
+                report_writer.add(results[index], index + 1, doc_info['path'])
+                with lock:
+                    completed.append(index)
+                    self.usage_tracker.check_projection(len(completed), len(documents))
+            except BudgetExceededError as e:
+                with lock:
+                    if not budget_exceeded.is_set():
+                        budget_exceeded.set()
+                        print(f"\n❌ 中止批量评估: {str(e)}")
+
+        llm_client = AsyncLLMClient(max_concurrent=max_concurrent, rate_limiter=self.rate_limiter)
+        llm_client.run(lambda: [
+            llm_client.run_task(evaluate, i, doc_info) for i, doc_info in enumerate(documents)
+        ])
+        if None in results:
+            return results[:results.index(None)]
+        return results
+
+    def evaluate_batch_offline(self, documents: List[Dict[str, str]],
+                               poll_interval: float = 60) -> List[Dict]:
+        """
+        通过Message Batches接口离线批量评估(适用于夜间大批量评估,费用和限流压力都低于逐个同步调用)
+        参考答案和评估请求分两个批次提交,批次ID保存在 output_dir/batches 下,中断后再次运行会继续等待原批次
+        :param documents: 文档列表,格式同 evaluate_batch
+        :param poll_interval: 批次状态轮询间隔(秒)
+        :return: 评估结果列表(与输入顺序一致)
+        """
+        print(f"\n开始离线批量评估 {len(documents)} 个文档...")
+        self.usage_tracker.reset()
+        batch_dir = self.config.get('batch_dir', str(self.output_dir / 'batches'))
+
+        # 1. 读取文档并调用算法模型解析
+        results = [None] * len(documents)
+        prepared_docs = {}
+        references = {}
+        for i, doc_info in enumerate(documents):
+            print(f"\n[1/3] 准备第 {i + 1}/{len(documents)} 个文档: {doc_info['path']}")
+            completed = self._completed_stages(doc_info['path'], doc_info.get('document_id'))
+            if 'evaluated' in completed:
+                print(f"运行日志中已完成评估,跳过")
+                results[i] = completed['evaluated']['evaluation_result']
+                continue
+            if 'reference' in completed:
+                references[i] = completed['reference']['reference_checkpoints']
+            try:
+                with usage_context(document=doc_info['path']):
+                    prepared_docs[i] = self._prepare_document(
+                        doc_info['path'], doc_info.get('document_id'), doc_info.get('fingerprint'), completed
+                    )
+            except Exception as e:
+                print(f"❌ 准备文档失败 {doc_info['path']}: {str(e)}")
+                results[i] = {'error': str(e)}
+
+        # 2. 批量生成参考答案(近似重复文档直接复用)
+        print(f"\n[2/3] 批量生成参考答案...")
+        pending = {}
+        for i, prepared in prepared_docs.items():
+            if i in references:
+                continue
+            reused = self._reusable_reference(prepared['previous'])
+            if reused is not None:
+                references[i] = reused
+                self._journal_record(prepared['document_path'], 'reference', {'reference_checkpoints': reused})
+            else:
+                pending[f"ref-{i}"] = prepared['document_text']
+        if pending:
+            generated = self.claude_client.generate_reference_checkpoints_batch(
+                pending, batch_dir, poll_interval=poll_interval
+            )
+            for custom_id, checkpoints in generated.items():
+                i = int(custom_id.split('-')[1])
+                if isinstance(checkpoints, dict):
+                    # 失败或过期的请求不记录运行日志,该文档不再评估,继续运行时重新生成
+                    print(f"❌ 生成参考答案失败 {prepared_docs[i]['document_path']}: {checkpoints['error']}")
+                    results[i] = {'error': f"生成参考答案失败: {checkpoints['error']}"}
+                    del prepared_docs[i]
+                    continue
+                references[i] = checkpoints
+                self._journal_record(prepared_docs[i]['document_path'], 'reference',
+                                     {'reference_checkpoints': checkpoints})
+
+        # 3. 批量评估算法输出
+        print(f"\n[3/3] 批量评估算法输出...")
+        evaluations = {}
+        to_evaluate = []
+        for i, prepared in prepared_docs.items():
+            reused = self._reusable_evaluation(prepared['previous'], prepared['algorithm_checkpoints'])
+            if reused is not None:
+                evaluations[i] = reused
+            else:
+                to_evaluate.append(i)
+        if to_evaluate:
+            batch_results = self.evaluator.evaluate_offline_batch([
+                {
+                    'document_text': prepared_docs[i]['document_text'],
+                    'algorithm_checkpoints': prepared_docs[i]['algorithm_checkpoints'],
+                    'reference_checkpoints': references[i]
+                }
+                for i in to_evaluate
+            ], batch_dir, poll_interval=poll_interval)
+            evaluations.update(zip(to_evaluate, batch_results))
+
+        for i, prepared in prepared_docs.items():
+            self._finalize_document(prepared, references[i], evaluations[i])
+            results[i] = evaluations[i]
+
+        report_writer = EvaluationReportWriter(str(self.output_dir))
+        for i, (doc_info, result) in enumerate(zip(documents, results), 1):
+            report_writer.add(result, i, doc_info['path'])
+        self._generate_batch_report(report_writer)
+        return results
+
     def evaluate_directory(self, directory: str, pattern: str = "*.txt",
                           document_ids: Optional[Dict[str, str]] = None) -> List[Dict]:
         """
@@ -147,7 +383,7 @@ class BidParserEvaluationPipeline:
         :return: 评估结果列表
         """
         # 加载目录下的文档
-        documents_data = self.document_processor.load_batch(directory, pattern)
+        documents_data = self.document_processor.load_batch(directory, pattern, self.dedup_index)
 
         # 添加document_id
         for doc in documents_data:
@@ -158,11 +394,238 @@ class BidParserEvaluationPipeline:
         # 批量评估
         return self.evaluate_batch(documents_data)
 
-    def _save_results(self, document_path: str, results: Dict):
+    def _prepare_document(self, document_path: str, document_id: Optional[str],
+                          fingerprint: Optional[List[int]], completed: Optional[Dict] = None) -> Dict:
+        """
+        读取文档、查找近似重复文档并调用算法模型解析
+        :param completed: 运行日志中已完成的阶段(见 _completed_stages),已完成的步骤直接使用记录的结果
+        :return: {'document_path', 'document_id', 'document_text', 'fingerprint', 'previous', 'algorithm_checkpoints'}
+        """
+        completed = completed or {}
+        # 文本提取在本地完成且不收费,运行日志只记录文件签名和指纹,继续运行时重新提取,避免日志随文档全文增长
+        document_text = self.document_processor.load_and_preprocess(document_path)
+        print(f"文档读取成功,内容长度: {len(document_text)} 字符")
+        if 'extracted' in completed:
+            fingerprint = fingerprint or completed['extracted'].get('fingerprint')
+        else:
+            if self.dedup_index is not None and fingerprint is None:
+                fingerprint = self.dedup_index.fingerprint(document_text)
+            self._journal_record(document_path, 'extracted', {
+                'file': self._file_signature(document_path),
+                'fingerprint': fingerprint
+            })
+
+        previous = None
+        if self.dedup_index is not None:
+            if fingerprint is None:
+                fingerprint = self.dedup_index.fingerprint(document_text)
+            previous = self._load_duplicate_results(fingerprint, document_path)
+
+        # 2. 调用算法模型解析
+        print(f"\n[2/4] 调用算法模型解析...")
+        if 'parsed' in completed:
+            algorithm_checkpoints = completed['parsed']['algorithm_checkpoints']
+            print(f"从运行日志恢复算法解析结果")
+        elif document_id:
+            # 使用文档ID调用算法API
+            algorithm_checkpoints = self.algorithm_client.parse_bid_document(document_id)
+        else:
+            # 如果没有文档ID,需要先上传文档获取ID
+            # 这里需要根据实际API实现
+            raise NotImplementedError("需要先上传文档获取ID,或提供document_id参数")
+        if 'parsed' not in completed:
+            self._journal_record(document_path, 'parsed', {
+                'document_id': document_id,
+                'algorithm_checkpoints': algorithm_checkpoints
+            })
+
+        print(f"算法解析成功,提取了 {len(algorithm_checkpoints)} 个检查点")
+
+        return {
+            'document_path': document_path,
+            'document_id': document_id,
+            'document_text': document_text,
+            'fingerprint': fingerprint,
+            'previous': previous,
+            'algorithm_checkpoints': algorithm_checkpoints
+        }
+
+    def _generate_reference(self, document_text: str) -> List[Dict]:
+        """
+        生成参考答案: 超过单次请求长度的文档分块生成后合并,否则单次生成
+        :param document_text: 招标文件全文
+        :return: 参考检查点列表
+        """
+        if not self._single_pass_reference(document_text):
+            options = self.config.get('reference_generation') or {}
+            return self.claude_client.generate_reference_checkpoints_map_reduce(
+                document_text,
+                chunk_tokens=options.get('chunk_tokens', 3000),
+                overlap_tokens=options.get('overlap_tokens', 200),
+                max_concurrent=options.get('max_concurrent', 4),
+                consolidation_model=options.get('consolidation_model')
+            )
+        return self.claude_client.generate_reference_checkpoints(document_text)
+
+    def _single_pass_reference(self, document_text: str) -> bool:
+        """参考答案是否单次生成(与评估请求共用招标文件前缀),否则分块生成"""
+        options = self.config.get('reference_generation') or {}
+        return not options.get('map_reduce', True) or len(document_text) <= REFERENCE_SINGLE_PASS_CHARS
+
+    @staticmethod
+    def _reusable_reference(previous: Optional[Dict]) -> Optional[List[Dict]]:
+        """近似重复文档的参考答案,没有可复用的返回None"""
+        if previous and previous['results'].get('reference_checkpoints'):
+            print(f"复用近似重复文档的参考答案: {previous['path']}")
+            return previous['results']['reference_checkpoints']
+        return None
+
+    def _reusable_evaluation(self, previous: Optional[Dict], algorithm_checkpoints: List[Dict]) -> Optional[Dict]:
+        """
+        复用近似重复文档的评估结果: 算法输出、提示词版本和评估配置都未变化时复用,否则返回None
+        """
+        previous_evaluation = previous['results'].get('evaluation_result') if previous else None
+        if not previous_evaluation or 'error' in previous_evaluation:
+            return None
+        if previous['results'].get('algorithm_output') != algorithm_checkpoints:
+            return None
+        metadata = previous_evaluation.get('metadata') or {}
+        settings = self._evaluation_settings()
+        if (metadata.get('prompt_versions') != settings['prompt_versions']
+                or metadata.get('evaluator') != settings['evaluator']):
+            print(f"提示词版本或评估配置已变化,不复用近似重复文档的评估结果")
+            return None
+        print(f"算法输出与近似重复文档一致,复用评估结果")
+        return dict(previous_evaluation)
+
+    def _evaluation_settings(self) -> Dict:
+        """影响评估结果的提示词版本和评估配置,记录在结果元数据中,复用评估结果时需一致"""
+        evaluator = self.evaluator
+        settings = {'evaluation_mode': evaluator.evaluation_mode, 'match_threshold': evaluator.match_threshold}
+        if evaluator.evaluation_mode == 'pairs':
+            settings.update(pair_top_k=evaluator.pair_top_k, pair_batch_size=evaluator.pair_batch_size)
+        return {
+            'prompt_versions': {
+                name: get_prompt_registry().version(name) for name in (
+                    'reference_generation', 'pair_judging' if evaluator.evaluation_mode == 'pairs' else 'evaluation'
+                )
+            },
+            'evaluator': settings
+        }
+
+    def _finalize_document(self, prepared: Dict, reference_checkpoints: List[Dict],
+                           evaluation_result: Dict):
+        """
+        添加元数据、保存结果并登记到指纹索引
+        :param prepared: _prepare_document 的返回值
+        :param reference_checkpoints: 参考答案
+        :param evaluation_result: 评估结果(原地添加 metadata)
+        """
+        previous = prepared['previous']
+        algorithm_checkpoints = prepared['algorithm_checkpoints']
+        document_path = prepared['document_path']
+
+        # 添加元数据
+        evaluation_result['metadata'] = {
+            'document_path': document_path,
+            'document_id': prepared['document_id'],
+            'algorithm_checkpoints_count': len(algorithm_checkpoints),
+            'reference_checkpoints_count': len(reference_checkpoints),
+            **self._evaluation_settings(),
+            'duplicate_of': {
+                'path': previous['path'],
+                'similarity': previous['similarity']
+            } if previous else None
+        }
+
+        output_path = self._save_results(document_path, {
+            'algorithm_output': algorithm_checkpoints,
+            'reference_checkpoints': reference_checkpoints,
+            'evaluation_result': evaluation_result
+        })
+
+        if self.dedup_index is not None:
+            self.dedup_index.add(str(Path(document_path).resolve()), prepared['fingerprint'], {
+                'path': document_path,
+                'result_path': str(output_path)
+            })
+            self.dedup_index.save()
+
+        # 评估失败(客户端捕获API错误后返回 error)时不记录,继续运行时重新评估
+        if 'error' not in evaluation_result:
+            self._journal_record(document_path, 'evaluated', {
+                'evaluation_result': evaluation_result,
+                'result_path': str(output_path)
+            })
+
+    def _completed_stages(self, document_path: str, document_id: Optional[str]) -> Dict[str, Dict]:
+        """
+        继续运行(resume)时,运行日志中该文档已完成且仍然有效的阶段
+        文件在上次运行后被修改时全部作废;文档ID变化时算法解析和评估结果作废
+        :return: {阶段: 结果},不继续运行或没有记录时为空
+        """
+        if self.journal is None or not self.config.get('resume', False):
+            return {}
+        completed = self.journal.stages(str(Path(document_path).resolve()))
+        extracted = completed.get('extracted')
+        if not extracted or extracted.get('file') != self._file_signature(document_path):
+            return {}
+        if 'parsed' in completed and completed['parsed'].get('document_id') != document_id:
+            completed.pop('parsed')
+            completed.pop('evaluated', None)
+        return completed
+
+    def _journal_record(self, document_path: str, stage: str, data: Dict):
+        """在运行日志中记录文档完成的阶段"""
+        if self.journal is not None:
+            self.journal.record(str(Path(document_path).resolve()), stage, data)
+
+    @staticmethod
+    def _file_signature(document_path: str) -> Optional[Dict]:
+        """文件大小和修改时间,用于判断运行日志中的记录是否仍对应当前文件(文件不存在时为None)"""
+        try:
+            stat = Path(document_path).stat()
+        except OSError:
+            return None
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def _load_duplicate_results(self, fingerprint: List[int], document_path: str) -> Optional[Dict]:
+        """
+        查找近似重复文档(不含文档自身)并加载其已保存的结果
+        :param fingerprint: 当前文档指纹
+        :param document_path: 当前文档路径,重新评估同一文档时不把上次的结果当作重复
+        :return: {'path', 'similarity', 'results'},没有可复用结果时返回None
+        """
+        duplicate = self.dedup_index.find_duplicate(fingerprint, exclude_key=str(Path(document_path).resolve()),
+                                                    required_metadata='result_path')
+        if not duplicate:
+            return None
+
+        result_path = duplicate['metadata']['result_path']
+        if not Path(result_path).exists():
+            return None
+
+        try:
+            with open(result_path, 'r', encoding='utf-8') as f:
+                results = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"读取近似重复文档结果失败 {result_path}: {str(e)}")
+            return None
+
+        print(f"检测到近似重复文档: {duplicate['metadata'].get('path', duplicate['key'])} "
+              f"(相似度 {duplicate['similarity']:.2f})")
+        return {
+            'path': duplicate['metadata'].get('path', duplicate['key']),
+            'similarity': duplicate['similarity'],
+            'results': results
+        }
+
+    def _save_results(self, document_path: str, results: Dict) -> Path:
         """
         保存评估结果
         :param document_path: 文档路径
         :param results: 评估结果
+        :return: 结果文件路径
         """
         filename = Path(document_path).stem
         output_path = self.output_dir / f"{filename}_result.json"
@@ -171,21 +634,31 @@ class BidParserEvaluationPipeline:
             json.dump(results, f, ensure_ascii=False, indent=2)
 
         print(f"✅ 结果已保存到: {output_path}")
+        return output_path
 
-    def _generate_batch_report(self, results: List[Dict]):
+    def _generate_batch_report(self, report_writer: EvaluationReportWriter):
         """
-        生成批量评估报告
-        :param results: 评估结果列表
+        生成批量评估报告: 关闭流式报告并写入汇总
+        :param report_writer: 已写入各文档结果的报告
         """
-        report = self.evaluator.generate_evaluation_report(results)
-
-        # 保存报告
-        report_path = self.output_dir / "evaluation_report.txt"
-        with open(report_path, 'w', encoding='utf-8') as f:
-            f.write(report)
-
-        print(f"\n{report}")
-        print(f"\n✅ 批量评估报告已保存到: {report_path}")
+        summary = report_writer.close()
+
+        print(f"\n{summary}")
+        print(f"✅ 批量评估报告已保存到: {report_writer.text_path} "
+              f"(明细: {report_writer.csv_path.name}, {report_writer.jsonl_path.name})")
+
+        cache_stats = self.claude_client.cache.stats()
+        print(f"大模型响应缓存: 命中 {cache_stats['hits']} 次, 未命中 {cache_stats['misses']} 次, "
+              f"命中率 {cache_stats['hit_rate']}%")
+
+        usage_path = self.usage_tracker.save(str(self.output_dir / "llm_usage.json"))
+        self.usage_tracker.attach_to_allure()
+        total = self.usage_tracker.summary()['total']
+        print(f"大模型调用: {total['calls']} 次, 输入 {total['prompt_tokens']} tokens, "
+              f"提示词缓存读取 {total['cache_read_tokens']} / 写入 {total['cache_write_tokens']} tokens, "
+              f"输出 {total['completion_tokens']} tokens, 重试 {total['retries']} 次"
+              + (f", 估算费用 {total['cost']}" if total['cost'] is not None else ""))
+        print(f"✅ 大模型用量统计已保存到: {usage_path}")
 
 
 def load_config(config_path: str) -> Dict:
@@ -1,43 +1,35 @@
 """
 对比优化前后的效果
 """
-import json
-import os
-from pathlib import Path
+from utils.results_store import get_results_store
 
-def load_latest_results():
-    """加载最新的两次评估结果"""
-    results_dir = Path('./test_data/evaluation/results')
+# 旧版按时间戳保存的评估结果文件目录,首次运行时导入结果库
+LEGACY_RESULTS_DIR = './test_data/evaluation/results'
 
-    # 获取所有评估文件
-    files = list(results_dir.glob('claude_comparison_*.json'))
-    files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
 
-    if len(files) < 1:
-        print("[ERROR] 未找到评估结果文件")
+def load_latest_results(store=None):
+    """加载最新的两次评估结果(最新一次及另一评估器版本的最新一次)"""
+    store = store or get_results_store()
+    store.import_json_files(LEGACY_RESULTS_DIR, 'claude_comparison_v2_*.json', 'comparison', evaluator_version='v2')
+    store.import_json_files(LEGACY_RESULTS_DIR, 'claude_comparison_[0-9]*.json', 'comparison', evaluator_version='v1')
+
+    latest = store.latest('comparison')
+    if not latest:
+        print("[ERROR] 未找到评估结果")
         return None, None
 
-    # 加载最新的结果（可能是V1或V2）
-    latest_file = files[0]
-    with open(latest_file, 'r', encoding='utf-8') as f:
-        latest = json.load(f)
+    # 另一个版本的最新结果
+    other_version = 'v1' if latest['evaluator_version'] == 'v2' else 'v2'
+    second = store.latest('comparison', evaluator_version=other_version)
 
-    # 尝试找到另一个版本的文件
-    second_file = None
-    for f in files[1:]:
-        if 'v2' in f.name and 'v2' not in latest_file.name:
-            second_file = f
-            break
-        elif 'v2' not in f.name and 'v2' in latest_file.name:
-            second_file = f
-            break
+    return _with_version(latest), _with_version(second)
 
-    if second_file:
-        with open(second_file, 'r', encoding='utf-8') as f:
-            second = json.load(f)
-        return latest, second
 
-    return latest, None
+def _with_version(record):
+    """结果库记录 -> 评估结果(附带评估器版本)"""
+    if not record:
+        return None
+    return dict(record['payload'], evaluator_version=record['evaluator_version'])
 
 
 def display_comparison(result1, result2):
@@ -48,10 +40,10 @@ def display_comparison(result1, result2):
     print("=" * 80)
 
     # 确定版本
-    if result1 and 'v2' in str(result1.get('timestamp', '')):
+    if result1 and result1.get('evaluator_version') == 'v2':
         v2_result = result1
         v1_result = result2
-    elif result2 and 'v2' in str(result2.get('timestamp', '')):
+    elif result2 and result2.get('evaluator_version') == 'v2':
         v2_result = result2
         v1_result = result1
     else:
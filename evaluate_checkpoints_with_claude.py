@@ -4,7 +4,6 @@
 """
 import json
 import os
-import time
 from datetime import datetime
 
 # 尝试导入PyPDF2读取PDF
@@ -49,62 +48,10 @@ def extract_pdf_text(pdf_path: str, max_chars: int = 10000) -> str:
 
 
 def call_zhipuai_api_with_retry(api_key: str, prompt: str, model: str = "glm-4.7", max_retries: int = 3) -> dict:
-    """调用智谱AI API（带重试机制）"""
-    from zhipuai import ZhipuAI
-
-    print("\n正在调用智谱AI API...")
-    print(f"使用模型: {model}")
-
-    # 初始化客户端
-    client = ZhipuAI(api_key=api_key)
-
-    for retry in range(max_retries):
-        try:
-            print(f"尝试连接... (第{retry + 1}次)")
-
-            # 调用API
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.1,
-                max_tokens=8000
-            )
-
-            print("[OK] 智谱AI API调用成功")
-
-            # 返回标准化的响应格式（兼容原有代码）
-            return {
-                "content": [
-                    {
-                        "text": response.choices[0].message.content
-                    }
-                ],
-                "model": response.model,
-                "usage": {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens
-                }
-            }
-
-        except Exception as e:
-            error_str = str(e)
-            print(f"[WARNING] API调用错误: {error_str[:100]}")
-
-            if retry < max_retries - 1:
-                wait_time = (retry + 1) * 3
-                print(f"  等待{wait_time}秒后重试...")
-                time.sleep(wait_time)
-            else:
-                print(f"[ERROR] 智谱AI API调用失败，已重试{max_retries}次")
-            continue
-
-    return None
+    """调用智谱AI API（带重试机制,缓存、退避和熔断见 api_clients.llm_provider）"""
+    from api_clients.llm_provider import call_zhipuai
+
+    return call_zhipuai(api_key, prompt, model=model, max_retries=max_retries)
 
 
 # 保留旧函数名以保持向后兼容
@@ -115,25 +62,19 @@ def call_claude_api_with_retry(api_key: str, prompt: str, model: str = "glm-4.7"
 
 def parse_zhipuai_checkpoints(response: dict) -> list:
     """解析智谱AI返回的检查点"""
-    try:
-        content = response.get("content", [{}])[0].get("text", "")
-
-        # 尝试提取JSON部分
-        json_start = content.find('{')
-        json_end = content.rfind('}') + 1
-
-        if json_start >= 0 and json_end > json_start:
-            json_str = content[json_start:json_end]
-            data = json.loads(json_str)
-            return data.get("checkpoints", [])
-        else:
-            print("[WARNING] 未找到JSON格式的检查点")
-            print("\n智谱AI响应预览:")
-            print(content[:500] + "...")
-            return []
-    except Exception as e:
-        print(f"[ERROR] 解析智谱AI响应失败: {e}")
+    from api_clients.json_stream import extract_json
+
+    content = response.get("content", [{}])[0].get("text", "")
+    extraction = extract_json(content, 'checkpoints')
+
+    if extraction.data is None:
+        print(f"[WARNING] 未找到JSON格式的检查点: {extraction.error}")
+        print("\n智谱AI响应预览:")
+        print(content[:500] + "...")
         return []
+    if not extraction.complete:
+        print(f"[WARNING] 解析智谱AI响应不完整: {extraction.describe()}")
+    return extraction.data.get("checkpoints", [])
 
 
 # 保留旧函数名以保持向后兼容
@@ -142,10 +83,13 @@ def parse_claude_checkpoints(response: dict) -> list:
     return parse_zhipuai_checkpoints(response)
 
 
-def extract_algorithm_checkpoints(response_file: str) -> list:
-    """从算法响应中提取检查点"""
-    with open(response_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+def extract_algorithm_checkpoints(response) -> list:
+    """从算法响应中提取检查点(response 为响应数据或响应文件路径)"""
+    if isinstance(response, dict):
+        data = response
+    else:
+        with open(response, 'r', encoding='utf-8') as f:
+            data = json.load(f)
 
     checkpoints = []
 
@@ -208,20 +152,19 @@ def compare_checkpoints_simple(algorithm_checkpoints: list, zhipuai_checkpoints:
 
     # 简单匹配分析
     print(f"\n[SEARCH] 匹配分析:")
+    from processors.tokenizer import get_tokenizer
+    tokenizer = get_tokenizer()
+
+    # 每个检查点只分词一次(中文按字符n-gram)
+    zhipuai_words_list = [tokenizer.tokens(cp.get('content', cp.get('label', ''))) for cp in zhipuai_checkpoints]
     matched = 0
     for algo_cp in algorithm_checkpoints:
-        algo_label = algo_cp.get('label', '').lower()
+        algo_words = tokenizer.tokens(algo_cp.get('label', ''))
 
-        for zhipuai_cp in zhipuai_checkpoints:
-            zhipuai_content = zhipuai_cp.get('content', zhipuai_cp.get('label', '')).lower()
-
-            # 提取关键词进行匹配
-            algo_words = set(algo_label.split())
-            zhipuai_words = set(zhipuai_content.split())
-
-            # 如果有2个以上共同词，认为匹配
+        for zhipuai_words in zhipuai_words_list:
+            # 共同词占较短一方的一半以上(且至少2个)，认为匹配
             common_words = algo_words & zhipuai_words
-            if len(common_words) >= 2:
+            if len(common_words) >= max(2, min(len(algo_words), len(zhipuai_words)) / 2):
                 matched += 1
                 break
 
@@ -331,28 +274,22 @@ def main():
     print(f"\n[OK] 智谱AI提取了 {len(zhipuai_checkpoints)} 个检查点")
 
     # 4. 加载算法结果
-    responses_dir = './test_data/evaluation/responses'
-    files = [f for f in os.listdir(responses_dir) if f.startswith('check_point_response_')]
+    from utils.results_store import find_latest_response, get_results_store, new_run_id
+
+    response = find_latest_response('check_point', document=pdf_path)
 
-    if not files:
-        print("\n[WARNING] 未找到算法响应文件，跳过对比")
+    if not response:
+        print("\n[WARNING] 未找到算法响应，跳过对比")
         print("[TIP] 请先运行: pytest test_cases/workflows/test_bid_check_workflow.py::TestBidCheckWorkflow::test_05_check_check_point -v -s")
         return
 
-    files.sort(reverse=True)
-    latest_file = os.path.join(responses_dir, files[0])
-
-    print(f"\n[OK] 加载算法响应: {files[0]}")
-    algorithm_checkpoints = extract_algorithm_checkpoints(latest_file)
+    algorithm_checkpoints = extract_algorithm_checkpoints(response)
 
     # 5. 对比分析
     result = compare_checkpoints_simple(algorithm_checkpoints, zhipuai_checkpoints)
 
-    # 6. 保存结果
+    # 6. 保存结果(追加到结果库,不覆盖历史记录)
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    result_file = f'./test_data/evaluation/results/claude_comparison_{timestamp}.json'
-
-    os.makedirs(os.path.dirname(result_file), exist_ok=True)
 
     output = {
         'timestamp': timestamp,
@@ -361,10 +298,11 @@ def main():
         'comparison': result
     }
 
-    with open(result_file, 'w', encoding='utf-8') as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
+    store = get_results_store()
+    record = store.append('comparison', pdf_path, output, run_id=new_run_id(), evaluator_version='v1')
+    result_file = f"{store.db_path} (运行 {record['run_id']})"
 
-    print(f"\n[OK] 评估结果已保存: {result_file}")
+    print(f"\n[OK] 评估结果已保存到结果库: {result_file}")
 
     # 7. 总结
     print("\n" + "=" * 80)
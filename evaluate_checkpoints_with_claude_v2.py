@@ -4,7 +4,6 @@
 """
 import json
 import os
-import time
 from datetime import datetime
 
 try:
@@ -47,86 +46,34 @@ def extract_pdf_text(pdf_path: str, max_chars: int = 15000) -> str:
 
 
 def call_zhipuai_api_with_retry(api_key: str, prompt: str, model: str = "glm-4.7", max_retries: int = 3) -> dict:
-    """调用智谱AI API（带重试机制）"""
-    from zhipuai import ZhipuAI
-
-    print("\n正在调用智谱AI API...")
-    print(f"使用模型: {model}")
-
-    client = ZhipuAI(api_key=api_key)
-
-    for retry in range(max_retries):
-        try:
-            print(f"尝试连接... (第{retry + 1}次)")
-
-            response = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=0.1,
-                max_tokens=8000
-            )
-
-            print("[OK] 智谱AI API调用成功")
-
-            return {
-                "content": [
-                    {
-                        "text": response.choices[0].message.content
-                    }
-                ],
-                "model": response.model,
-                "usage": {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens
-                }
-            }
-
-        except Exception as e:
-            error_str = str(e)
-            print(f"[WARNING] API调用错误: {error_str[:100]}")
-
-            if retry < max_retries - 1:
-                wait_time = (retry + 1) * 3
-                print(f"  等待{wait_time}秒后重试...")
-                time.sleep(wait_time)
-            else:
-                print(f"[ERROR] 智谱AI API调用失败")
-            continue
-
-    return None
+    """调用智谱AI API（带重试机制,缓存、退避和熔断见 api_clients.llm_provider）"""
+    from api_clients.llm_provider import call_zhipuai
+
+    return call_zhipuai(api_key, prompt, model=model, max_retries=max_retries)
 
 
 def parse_zhipuai_checkpoints(response: dict) -> list:
     """解析智谱AI返回的检查点"""
-    try:
-        content = response.get("content", [{}])[0].get("text", "")
-
-        # 尝试提取JSON部分
-        json_start = content.find('{')
-        json_end = content.rfind('}') + 1
-
-        if json_start >= 0 and json_end > json_start:
-            json_str = content[json_start:json_end]
-            data = json.loads(json_str)
-            return data.get("checkpoints", [])
-        else:
-            print("[WARNING] 未找到JSON格式的检查点")
-            return []
-    except Exception as e:
-        print(f"[ERROR] 解析响应失败: {e}")
+    from api_clients.json_stream import extract_json
+
+    content = response.get("content", [{}])[0].get("text", "")
+    extraction = extract_json(content, 'checkpoints')
+
+    if extraction.data is None:
+        print(f"[WARNING] 未找到JSON格式的检查点: {extraction.error}")
         return []
+    if not extraction.complete:
+        print(f"[WARNING] 解析响应不完整: {extraction.describe()}")
+    return extraction.data.get("checkpoints", [])
 
 
-def extract_algorithm_checkpoints(response_file: str) -> list:
-    """从算法响应中提取检查点"""
-    with open(response_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+def extract_algorithm_checkpoints(response) -> list:
+    """从算法响应中提取检查点(response 为响应数据或响应文件路径)"""
+    if isinstance(response, dict):
+        data = response
+    else:
+        with open(response, 'r', encoding='utf-8') as f:
+            data = json.load(f)
 
     checkpoints = []
 
@@ -152,26 +99,44 @@ def extract_algorithm_checkpoints(response_file: str) -> list:
     return checkpoints
 
 
-def calculate_text_similarity(text1: str, text2: str) -> float:
-    """计算文本相似度（基于余弦相似度）"""
-    from collections import Counter
+def verify_checkpoint_grounding(algorithm_checkpoints: list, pdf_path: str, min_ratio: float = 0.8) -> dict:
+    """核验算法检查点的取值是否出现在招标文件原文中（本地倒排索引，无需调用大模型）"""
+    from processors.document_processor import DocumentProcessor
+    from processors.text_index import TextIndex
 
-    # 简单的词频向量
-    words1 = set(text1.lower().split())
-    words2 = set(text2.lower().split())
+    text, page_offsets = DocumentProcessor().load_paged_text(pdf_path)
+    index = TextIndex(text, page_offsets=page_offsets)
+    details = index.verify_checkpoints(algorithm_checkpoints, min_ratio=min_ratio)
 
-    if not words1 or not words2:
-        return 0.0
+    grounded = sum(1 for d in details if d['grounded'])
+    total = len(details)
+    grounded_rate = (grounded / total * 100) if total > 0 else 0
 
-    # Jaccard相似度
-    intersection = words1 & words2
-    union = words1 | words2
+    print(f"\n[GROUNDING] 原文核验:")
+    print(f"  有原文依据: {grounded}/{total} ({grounded_rate:.1f}%)")
+    for d in [d for d in details if not d['grounded']][:5]:
+        print(f"  疑似无依据: {d['value'][:50]} (匹配度={d['match_ratio']:.2f})")
+
+    return {
+        'grounded': grounded,
+        'total': total,
+        'grounded_rate': grounded_rate,
+        'details': details
+    }
+
+
+def calculate_text_similarity(text1: str, text2: str) -> float:
+    """计算文本相似度（中文字符n-gram的Jaccard相似度）"""
+    from processors.tokenizer import get_tokenizer
 
-    return len(intersection) / len(union) if union else 0.0
+    return get_tokenizer().similarity(text1, text2)
 
 
 def compare_checkpoints_improved(algorithm_checkpoints: list, zhipuai_checkpoints: list) -> dict:
-    """改进的检查点对比算法"""
+    """
+    改进的检查点对比算法
+    coverage 为智谱AI检查点被匹配的比例(即以智谱AI为参考的召回率),recall 为算法检查点被匹配的比例(即精确率)
+    """
     print("\n" + "=" * 60)
     print("检查点对比分析（改进版）")
     print("=" * 60)
@@ -206,38 +171,37 @@ def compare_checkpoints_improved(algorithm_checkpoints: list, zhipuai_checkpoint
 
     matched_pairs = []
     threshold = 0.3  # 相似度阈值
-
-    for algo_cp in algorithm_checkpoints:
-        algo_label = algo_cp.get('label', '')
-        algo_value = algo_cp.get('value', '')
-        algo_text = f"{algo_label} {algo_value}".lower()
-
-        best_match = None
-        best_similarity = 0.0
-
-        for zhipuai_cp in zhipuai_checkpoints:
-            zhipuai_content = zhipuai_cp.get('content', '').lower()
-            zhipuai_category = zhipuai_cp.get('category', '').lower()
-
-            # 计算相似度
-            similarity = calculate_text_similarity(algo_text, zhipuai_content)
-
-            # 类别匹配加分
-            algo_category = algo_cp.get('category', '').lower()
+    category_bonus = 0.1  # 类别匹配加分
+
+    algo_texts = [f"{cp.get('label', '')} {cp.get('value', '')}".lower() for cp in algorithm_checkpoints]
+    zhipuai_contents = [cp.get('content', '').lower() for cp in zhipuai_checkpoints]
+    zhipuai_categories = [cp.get('category', '').lower() for cp in zhipuai_checkpoints]
+
+    # 两侧各分词一次,一次算出全部文本相似度;加分后仍达不到阈值的文本对不会成为匹配,不必返回
+    from processors.similarity_matrix import SimilarityMatrix
+    candidates = SimilarityMatrix(algo_texts, zhipuai_contents).candidates(threshold - category_bonus)
+
+    scored = []
+    for algo_cp, algo_text, row in zip(algorithm_checkpoints, algo_texts, candidates):
+        algo_category = algo_cp.get('category', '').lower()
+        scored_row = []
+        for j, similarity in row:
+            zhipuai_category = zhipuai_categories[j]
             if algo_category and zhipuai_category:
-                if algo_category in zhipuai_content or zhipuai_category in algo_text:
-                    similarity += 0.1
-
-            if similarity > best_similarity:
-                best_similarity = similarity
-                best_match = zhipuai_cp
-
-        if best_similarity >= threshold and best_match:
-            matched_pairs.append({
-                'algorithm': algo_cp,
-                'zhipuai': best_match,
-                'similarity': best_similarity
-            })
+                if algo_category in zhipuai_contents[j] or zhipuai_category in algo_text:
+                    similarity += category_bonus
+            scored_row.append((j, similarity))
+        scored.append(scored_row)
+
+    # 一一对齐: 每个智谱AI检查点最多被一个算法检查点匹配,避免匹配数虚高
+    from processors.checkpoint_alignment import align_checkpoints
+    alignment = align_checkpoints(scored, zhipuai_count, threshold)
+    for i, j, similarity in alignment['pairs']:
+        matched_pairs.append({
+            'algorithm': algorithm_checkpoints[i],
+            'zhipuai': zhipuai_checkpoints[j],
+            'similarity': similarity
+        })
 
     # 详细显示匹配结果
     if matched_pairs:
@@ -259,6 +223,9 @@ def compare_checkpoints_improved(algorithm_checkpoints: list, zhipuai_checkpoint
     print(f"\n  总匹配对: {matched}")
     print(f"  覆盖率: {coverage:.1f}%")
     print(f"  召回率: {recall:.1f}%")
+    print(f"  以智谱AI为参考: 精确率 {alignment['precision']}%, 召回率 {alignment['recall']}%, "
+          f"F1 {alignment['f1_score']}%")
+    print(f"  未匹配: 算法 {len(alignment['unmatched_left'])} 个, 智谱AI {len(alignment['unmatched_right'])} 个")
 
     return {
         'algorithm_count': algo_count,
@@ -266,7 +233,11 @@ def compare_checkpoints_improved(algorithm_checkpoints: list, zhipuai_checkpoint
         'matched': matched,
         'coverage': coverage,
         'recall': recall,
-        'matched_pairs': matched_pairs
+        'precision': alignment['precision'],
+        'f1_score': alignment['f1_score'],
+        'matched_pairs': matched_pairs,
+        'unmatched_algorithm': [algorithm_checkpoints[i] for i in alignment['unmatched_left']],
+        'unmatched_zhipuai': [zhipuai_checkpoints[j] for j in alignment['unmatched_right']]
     }
 
 
@@ -348,7 +319,10 @@ def main():
 
 请开始提取："""
 
-    zhipuai_response = call_zhipuai_api_with_retry(api_key, prompt)
+    from api_clients.usage_tracker import get_usage_tracker, usage_context
+
+    with usage_context(stage='checkpoint_extraction', document=pdf_path):
+        zhipuai_response = call_zhipuai_api_with_retry(api_key, prompt)
 
     if not zhipuai_response:
         print("\n[TIP] API调用失败")
@@ -363,41 +337,41 @@ def main():
     print(f"\n[OK] 智谱AI提取了 {len(zhipuai_checkpoints)} 个检查点")
 
     # 4. 加载算法结果
-    responses_dir = './test_data/evaluation/responses'
-    files = [f for f in os.listdir(responses_dir) if f.startswith('check_point_response_')]
+    from utils.results_store import find_latest_response, get_results_store, new_run_id
 
-    if not files:
-        print("\n[WARNING] 未找到算法响应文件")
-        return
+    response = find_latest_response('check_point', document=pdf_path)
 
-    files.sort(reverse=True)
-    latest_file = os.path.join(responses_dir, files[0])
+    if not response:
+        print("\n[WARNING] 未找到算法响应")
+        return
 
-    print(f"\n[OK] 加载算法响应: {files[0]}")
-    algorithm_checkpoints = extract_algorithm_checkpoints(latest_file)
+    algorithm_checkpoints = extract_algorithm_checkpoints(response)
 
     # 5. 改进的对比分析
     result = compare_checkpoints_improved(algorithm_checkpoints, zhipuai_checkpoints)
 
-    # 6. 保存结果
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    result_file = f'./test_data/evaluation/results/claude_comparison_v2_{timestamp}.json'
+    # 6. 原文核验
+    grounding = verify_checkpoint_grounding(algorithm_checkpoints, pdf_path)
 
-    os.makedirs(os.path.dirname(result_file), exist_ok=True)
+    # 7. 保存结果(追加到结果库,不覆盖历史记录)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
 
     output = {
         'timestamp': timestamp,
         'algorithm_checkpoints': algorithm_checkpoints,
         'zhipuai_checkpoints': zhipuai_checkpoints,
-        'comparison': result
+        'comparison': result,
+        'grounding': grounding,
+        'llm_usage': get_usage_tracker().summary()
     }
 
-    with open(result_file, 'w', encoding='utf-8') as f:
-        json.dump(output, f, ensure_ascii=False, indent=2)
+    store = get_results_store()
+    record = store.append('comparison', pdf_path, output, run_id=new_run_id(), evaluator_version='v2')
+    result_file = f"{store.db_path} (运行 {record['run_id']})"
 
-    print(f"\n[OK] 评估结果已保存: {result_file}")
+    print(f"\n[OK] 评估结果已保存到结果库: {result_file}")
 
-    # 7. 总结
+    # 8. 总结
     print("\n" + "=" * 80)
     print("评估总结".center(80))
     print("=" * 80)
@@ -408,6 +382,7 @@ def main():
   - 匹配检查点: {result['matched']} 个
   - 覆盖率: {result['coverage']:.1f}%
   - 召回率: {result['recall']:.1f}%
+  - 原文核验通过: {grounding['grounded']}/{grounding['total']} ({grounding['grounded_rate']:.1f}%)
 
 [FILE] 详细结果: {result_file}
     """)
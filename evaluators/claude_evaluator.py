@@ -3,38 +3,68 @@ Claude评估器
 用于评估算法模型输出的准确性
 """
 import json
-from typing import Dict, List
+from typing import Dict, List, Optional
+from api_clients.async_llm_client import AsyncLLMClient
 from api_clients.claude_client import ClaudeClient
+from evaluators.report_writer import render_report
+from processors.checkpoint_alignment import align_checkpoints
+from processors.similarity_matrix import SimilarityMatrix
+from processors.tokenizer import compact_text
 
 
 class ClaudeEvaluator:
     """使用Claude进行评估的评估器"""
 
-    def __init__(self, claude_client: ClaudeClient):
+    def __init__(self, claude_client: ClaudeClient, match_threshold: float = 0.5,
+                 evaluation_mode: str = 'full', pair_top_k: int = 3, pair_batch_size: int = 30):
         """
         初始化评估器
         :param claude_client: Claude API客户端实例
+        :param match_threshold: 本地统计中判定检查点匹配的内容相似度阈值(分词后的Jaccard相似度)
+        :param evaluation_mode: 'full' 两份完整列表一次评估 / 'pairs' 本地BM25检索候选对后分批判断
+                                (检查点较多时提示词更短、判断更准)
+        :param pair_top_k: pairs 模式下每个算法检查点的候选数
+        :param pair_batch_size: pairs 模式下每次请求判断的算法检查点数
         """
+        if evaluation_mode not in ('full', 'pairs'):
+            raise ValueError(f"不支持的评估方式: {evaluation_mode}")
         self.claude_client = claude_client
+        self.match_threshold = match_threshold
+        self.evaluation_mode = evaluation_mode
+        self.pair_top_k = pair_top_k
+        self.pair_batch_size = pair_batch_size
 
     def evaluate(self, document_text: str,
                 algorithm_checkpoints: List[Dict],
-                reference_checkpoints: List[Dict]) -> Dict:
+                reference_checkpoints: List[Dict],
+                cache_prefix: Optional[bool] = None) -> Dict:
         """
         评估算法输出
         :param document_text: 招标文件文本
         :param algorithm_checkpoints: 算法模型输出的检查点
         :param reference_checkpoints: 参考检查点
+        :param cache_prefix: 是否缓存招标文件前缀(参考答案请求已写入时为True),None时按客户端设置
         :return: 评估结果
         """
         print(f"开始评估: 算法输出{len(algorithm_checkpoints)}个检查点, 参考{len(reference_checkpoints)}个检查点")
 
         # 调用Claude进行评估
-        evaluation_result = self.claude_client.evaluate_checkpoints(
-            document_text=document_text,
-            algorithm_output=algorithm_checkpoints,
-            reference_checkpoints=reference_checkpoints
-        )
+        if self.evaluation_mode == 'pairs':
+            evaluation_result = self.claude_client.judge_checkpoint_pairs(
+                document_text=document_text,
+                algorithm_output=algorithm_checkpoints,
+                reference_checkpoints=reference_checkpoints,
+                top_k=self.pair_top_k,
+                batch_size=self.pair_batch_size,
+                cache_prefix=cache_prefix
+            )
+        else:
+            evaluation_result = self.claude_client.evaluate_checkpoints(
+                document_text=document_text,
+                algorithm_output=algorithm_checkpoints,
+                reference_checkpoints=reference_checkpoints,
+                cache_prefix=cache_prefix
+            )
 
         # 添加额外的统计分析
         evaluation_result.update(self._calculate_statistics(
@@ -44,108 +74,119 @@ class ClaudeEvaluator:
 
         return evaluation_result
 
-    def evaluate_batch(self, documents_data: List[Dict]) -> List[Dict]:
+    def evaluate_batch(self, documents_data: List[Dict], max_concurrent: int = 1) -> List[Dict]:
         """
         批量评估多个文档
         :param documents_data: 文档数据列表,每个元素包含:
             - document_text: 文档文本
             - algorithm_checkpoints: 算法输出
             - reference_checkpoints: 参考答案
-        :return: 评估结果列表
+        :param max_concurrent: 最大并发数,大于1时并发评估(限流由Claude客户端的rate_limiter控制)
+        :return: 评估结果列表(与输入顺序一致)
         """
-        results = []
-        for i, doc_data in enumerate(documents_data):
-            print(f"正在评估第{i+1}/{len(documents_data)}个文档")
-            result = self.evaluate(
+        if max_concurrent <= 1:
+            results = []
+            for i, doc_data in enumerate(documents_data):
+                print(f"正在评估第{i+1}/{len(documents_data)}个文档")
+                result = self.evaluate(
+                    document_text=doc_data['document_text'],
+                    algorithm_checkpoints=doc_data['algorithm_checkpoints'],
+                    reference_checkpoints=doc_data['reference_checkpoints']
+                )
+                results.append(result)
+            return results
+
+        print(f"并发评估{len(documents_data)}个文档 (并发数: {max_concurrent})")
+        llm_client = AsyncLLMClient(max_concurrent=max_concurrent)
+        results = llm_client.run(lambda: [
+            llm_client.run_task(
+                self.evaluate,
                 document_text=doc_data['document_text'],
                 algorithm_checkpoints=doc_data['algorithm_checkpoints'],
                 reference_checkpoints=doc_data['reference_checkpoints']
             )
-            results.append(result)
+            for doc_data in documents_data
+        ])
+        return [
+            {'error': str(result)} if isinstance(result, Exception) else result
+            for result in results
+        ]
+
+    def evaluate_offline_batch(self, documents_data: List[Dict], batch_dir: str,
+                               poll_interval: float = 60) -> List[Dict]:
+        """
+        通过Message Batches接口离线批量评估(请求一次性提交,按 custom_id 对应回文档;
+        每份文档一个请求,始终按 full 方式评估)
+        :param documents_data: 文档数据列表,格式同 evaluate_batch
+        :param batch_dir: 批处理文件和断点状态的保存目录
+        :param poll_interval: 轮询间隔(秒)
+        :return: 评估结果列表(与输入顺序一致)
+        """
+        items = {
+            f"eval-{i}": {
+                'document_text': doc_data['document_text'],
+                'algorithm_output': doc_data['algorithm_checkpoints'],
+                'reference_checkpoints': doc_data['reference_checkpoints']
+            }
+            for i, doc_data in enumerate(documents_data)
+        }
+        evaluations = self.claude_client.evaluate_checkpoints_batch(
+            items, batch_dir, poll_interval=poll_interval
+        )
+
+        results = []
+        for i, doc_data in enumerate(documents_data):
+            evaluation_result = evaluations[f"eval-{i}"]
+            evaluation_result.update(self._calculate_statistics(
+                doc_data['algorithm_checkpoints'],
+                doc_data['reference_checkpoints']
+            ))
+            results.append(evaluation_result)
         return results
 
     def _calculate_statistics(self, algorithm_checkpoints: List[Dict],
                             reference_checkpoints: List[Dict]) -> Dict:
         """
-        计算统计指标
+        计算统计指标(本地模糊匹配,不调用大模型,可用于筛选值得做大模型评估的文档)
+        参考检查点按分词建倒排索引,每个算法检查点只与共享词的参考检查点计算相似度,
+        达到 match_threshold 的候选再做一一对齐,每个参考检查点最多匹配一次
         :param algorithm_checkpoints: 算法检查点
         :param reference_checkpoints: 参考检查点
         :return: 统计数据
         """
-        # 基于内容的简单匹配统计
-        algorithm_contents = set()
-        for cp in algorithm_checkpoints:
-            content = cp.get('content', '')
-            if content:
-                algorithm_contents.add(content.lower().strip())
+        # 内容去重(忽略标点、空白和全半角差异)
+        algorithm_contents = self._unique_contents(algorithm_checkpoints)
+        reference_contents = self._unique_contents(reference_checkpoints)
 
-        reference_contents = set()
-        for cp in reference_checkpoints:
-            content = cp.get('content', '')
-            if content:
-                reference_contents.add(content.lower().strip())
-
-        # 计算匹配的检查点
-        matched = algorithm_contents & reference_contents
-
-        # 计算指标
-        total_reference = len(reference_contents)
-        total_algorithm = len(algorithm_contents)
-        total_matched = len(matched)
-
-        precision = total_matched / total_algorithm if total_algorithm > 0 else 0
-        recall = total_matched / total_reference if total_reference > 0 else 0
-        f1_score = 2 * precision * recall / (precision + recall) if (precision + recall) > 0 else 0
+        # 单份文档的检查点数不多,倒排索引比构建稀疏矩阵更快
+        candidates = SimilarityMatrix(algorithm_contents, reference_contents,
+                                      backend='python').candidates(self.match_threshold)
+        alignment = align_checkpoints(candidates, len(reference_contents), self.match_threshold)
 
         return {
-            'total_reference_checkpoints': total_reference,
-            'total_algorithm_checkpoints': total_algorithm,
-            'matched_checkpoints': total_matched,
-            'precision': round(precision * 100, 2),
-            'recall': round(recall * 100, 2),
-            'f1_score': round(f1_score * 100, 2)
+            'total_reference_checkpoints': len(reference_contents),
+            'total_algorithm_checkpoints': len(algorithm_contents),
+            'matched_checkpoints': alignment['matched'],
+            'precision': alignment['precision'],
+            'recall': alignment['recall'],
+            'f1_score': alignment['f1_score']
         }
 
+    @staticmethod
+    def _unique_contents(checkpoints: List[Dict]) -> List[str]:
+        """去重后的检查点内容(保持原顺序)"""
+        contents = {}
+        for cp in checkpoints:
+            content = cp.get('content', '')
+            key = compact_text(content)
+            if key and key not in contents:
+                contents[key] = content
+        return list(contents.values())
+
     def generate_evaluation_report(self, evaluation_results: List[Dict]) -> str:
         """
-        生成评估报告
+        生成评估报告(批量评估时由 EvaluationReportWriter 边评估边写入)
         :param evaluation_results: 评估结果列表
         :return: 报告文本
         """
-        total_docs = len(evaluation_results)
-
-        # 计算平均分数
-        avg_overall = sum(r.get('overall_score', 0) for r in evaluation_results) / total_docs
-        avg_completeness = sum(r.get('completeness_score', 0) for r in evaluation_results) / total_docs
-        avg_accuracy = sum(r.get('accuracy_score', 0) for r in evaluation_results) / total_docs
-        avg_consistency = sum(r.get('consistency_score', 0) for r in evaluation_results) / total_docs
-        avg_f1 = sum(r.get('f1_score', 0) for r in evaluation_results) / total_docs
-
-        report = f"""
-=== 招标文件解析准确度评估报告 ===
-
-评估文档数量: {total_docs}
-
-=== 平均分数 ===
-总体评分: {avg_overall:.2f}
-完整性: {avg_completeness:.2f}
-准确性: {avg_accuracy:.2f}
-一致性: {avg_consistency:.2f}
-F1分数: {avg_f1:.2f}
-
-=== 详细结果 ===
-"""
-        for i, result in enumerate(evaluation_results, 1):
-            report += f"\n文档 {i}:\n"
-            report += f"  总体评分: {result.get('overall_score', 0)}\n"
-            report += f"  完整性: {result.get('completeness_score', 0)}\n"
-            report += f"  准确性: {result.get('accuracy_score', 0)}\n"
-            report += f"  一致性: {result.get('consistency_score', 0)}\n"
-            report += f"  F1分数: {result.get('f1_score', 0)}\n"
-
-            if result.get('missing_checkpoints'):
-                report += f"  缺失检查点: {len(result['missing_checkpoints'])}\n"
-            if result.get('incorrect_checkpoints'):
-                report += f"  错误检查点: {len(result['incorrect_checkpoints'])}\n"
-
-        return report
+        return render_report(evaluation_results)
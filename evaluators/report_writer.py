@@ -0,0 +1,160 @@
+"""
+评估报告流式写入
+每完成一个文档就把该文档的结果追加到CSV、JSONL和文本明细并刷新到磁盘,汇总指标增量累加,
+关闭时再生成带汇总的文本报告;内存占用与文档数量无关,运行中途即可查看已完成部分的报告
+"""
+import csv
+import json
+import shutil
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+# 报告中的评分字段
+SCORE_FIELDS = (
+    ('overall_score', '总体评分'),
+    ('completeness_score', '完整性'),
+    ('accuracy_score', '准确性'),
+    ('consistency_score', '一致性'),
+    ('f1_score', 'F1分数'),
+)
+CSV_COLUMNS = ('index', 'document_path', *(field for field, _ in SCORE_FIELDS),
+               'missing_checkpoints', 'incorrect_checkpoints', 'error')
+
+
+class ReportAggregates:
+    """增量累加的汇总指标"""
+
+    def __init__(self):
+        self.total_docs = 0
+        self.failed_docs = 0
+        self.sums = {field: 0.0 for field, _ in SCORE_FIELDS}
+
+    def add(self, result: Dict):
+        """累加一个文档的结果"""
+        self.total_docs += 1
+        if 'error' in result:
+            self.failed_docs += 1
+        for field, _ in SCORE_FIELDS:
+            self.sums[field] += result.get(field, 0) or 0
+
+    def average(self, field: str) -> float:
+        """平均分,没有文档时为0"""
+        return self.sums[field] / self.total_docs if self.total_docs else 0.0
+
+
+def render_summary(aggregates: ReportAggregates) -> str:
+    """报告头部: 文档数量和平均分数(评估失败的文档按0分计入平均)"""
+    averages = '\n'.join(f"{label}: {aggregates.average(field):.2f}" for field, label in SCORE_FIELDS)
+    failed = f"\n评估失败: {aggregates.failed_docs}" if aggregates.failed_docs else ""
+    return f"""
+=== 招标文件解析准确度评估报告 ===
+
+评估文档数量: {aggregates.total_docs}{failed}
+
+=== 平均分数 ===
+{averages}
+
+=== 详细结果 ===
+"""
+
+
+def render_document(index: int, result: Dict) -> str:
+    """单个文档的明细"""
+    lines = [f"\n文档 {index}:\n"]
+    lines.extend(f"  {label}: {result.get(field, 0)}\n" for field, label in SCORE_FIELDS)
+    if result.get('missing_checkpoints'):
+        lines.append(f"  缺失检查点: {len(result['missing_checkpoints'])}\n")
+    if result.get('incorrect_checkpoints'):
+        lines.append(f"  错误检查点: {len(result['incorrect_checkpoints'])}\n")
+    return ''.join(lines)
+
+
+def render_report(results: Iterable[Dict]) -> str:
+    """一次性生成完整的文本报告(结果较少时使用,大批量请使用 EvaluationReportWriter)"""
+    results = list(results)
+    aggregates = ReportAggregates()
+    for result in results:
+        aggregates.add(result)
+    return render_summary(aggregates) + ''.join(
+        render_document(i, result) for i, result in enumerate(results, 1)
+    )
+
+
+class EvaluationReportWriter:
+    """流式评估报告"""
+
+    def __init__(self, output_dir: str, name: str = 'evaluation_report'):
+        """
+        打开报告文件
+        :param output_dir: 输出目录
+        :param name: 文件名(不含扩展名),生成 name.csv、name.jsonl 和 name.txt
+        """
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.csv_path = self.output_dir / f"{name}.csv"
+        self.jsonl_path = self.output_dir / f"{name}.jsonl"
+        self.text_path = self.output_dir / f"{name}.txt"
+        # 运行中的文本明细,关闭时与汇总合并为 name.txt
+        self.details_path = self.output_dir / f"{name}.partial.txt"
+        self.aggregates = ReportAggregates()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._csv_file = open(self.csv_path, 'w', encoding='utf-8-sig', newline='')
+        self._csv = csv.DictWriter(self._csv_file, fieldnames=CSV_COLUMNS)
+        self._csv.writeheader()
+        self._jsonl_file = open(self.jsonl_path, 'w', encoding='utf-8')
+        self._details_file = open(self.details_path, 'w', encoding='utf-8')
+
+    def add(self, result: Dict, index: Optional[int] = None, document_path: Optional[str] = None):
+        """
+        写入一个文档的结果(并发评估时按完成顺序写入,index 为文档在输入中的序号)
+        :param result: 评估结果
+        :param index: 文档序号(从1开始),默认按写入顺序编号
+        :param document_path: 文档路径,默认取结果 metadata 中的路径(评估失败的结果没有 metadata)
+        """
+        with self._lock:
+            if self._closed:
+                raise ValueError("报告已关闭")
+            self.aggregates.add(result)
+            index = index or self.aggregates.total_docs
+            row = {field: result.get(field) for field, _ in SCORE_FIELDS}
+            row.update(
+                index=index,
+                document_path=document_path or (result.get('metadata') or {}).get('document_path'),
+                missing_checkpoints=len(result.get('missing_checkpoints') or []),
+                incorrect_checkpoints=len(result.get('incorrect_checkpoints') or []),
+                error=result.get('error')
+            )
+            self._csv.writerow(row)
+            self._jsonl_file.write(json.dumps(dict(result, index=index), ensure_ascii=False) + '\n')
+            self._details_file.write(render_document(index, result))
+            for f in (self._csv_file, self._jsonl_file, self._details_file):
+                f.flush()
+
+    def close(self) -> str:
+        """
+        关闭报告,生成带汇总的文本报告
+        :return: 汇总部分的文本(不含明细)
+        """
+        with self._lock:
+            summary = render_summary(self.aggregates)
+            if self._closed:
+                return summary
+            self._closed = True
+            for f in (self._csv_file, self._jsonl_file, self._details_file):
+                f.close()
+
+            with open(self.text_path, 'w', encoding='utf-8') as report, \
+                    open(self.details_path, 'r', encoding='utf-8') as details:
+                report.write(summary)
+                shutil.copyfileobj(details, report)
+            self.details_path.unlink()
+            return summary
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -2,64 +2,16 @@
 需求大纲生成器
 使用Claude大模型从HAR文件中生成结构化需求
 """
-import json
 import os
 from typing import Dict, List, Optional
-from pathlib import Path
 
 from api_clients.claude_client import ClaudeClient
+from api_clients.json_stream import extract_json
+from api_clients.usage_tracker import usage_context
+from utils.prompt_registry import get_prompt_registry
 
 
-class RequirementGenerator:
-    """需求大纲生成器"""
-
-    def __init__(self, claude_client: ClaudeClient = None, api_key: str = None):
-        """
-        初始化需求生成器
-        :param claude_client: Claude客户端实例
-        :param api_key: Claude API密钥
-        """
-        if claude_client:
-            self.claude_client = claude_client
-        elif api_key:
-            self.claude_client = ClaudeClient(api_key)
-        else:
-            # 尝试从环境变量获取
-            self.claude_client = ClaudeClient(os.getenv('CLAUDE_API_KEY', ''))
-
-    def generate_requirements(self, narrative: str,
-                            model: str = "claude-3-5-sonnet-20241022") -> Dict:
-        """
-        生成需求大纲
-        :param narrative: 自然语言叙述的业务流程
-        :param model: Claude模型名称
-        :return: 结构化需求字典
-        """
-        # 读取提示词模板
-        prompt = self._load_requirement_prompt()
-
-        # 格式化提示词
-        formatted_prompt = prompt.format(narrative=narrative[:8000])  # 限制长度
-
-        # 调用Claude生成需求
-        print("正在调用Claude生成需求大纲...")
-        try:
-            response_text = self._call_claude(formatted_prompt, model)
-            requirements = self._parse_requirements_response(response_text)
-            return requirements
-        except Exception as e:
-            print(f"生成需求失败: {str(e)}")
-            return {"error": str(e), "raw_response": response_text if 'response_text' in locals() else ""}
-
-    def _load_requirement_prompt(self) -> str:
-        """加载需求生成提示词模板"""
-        prompt_file = Path(__file__).parents[1] / 'config' / 'har_prompts' / 'requirement_generation.txt'
-        try:
-            with open(prompt_file, 'r', encoding='utf-8') as f:
-                return f.read()
-        except FileNotFoundError:
-            # 默认提示词
-            return """你是一个资深的业务分析师和需求工程师。请分析以下用户操作流程，生成结构化的软件需求大纲。
+_DEFAULT_REQUIREMENT_PROMPT = """你是一个资深的业务分析师和需求工程师。请分析以下用户操作流程，生成结构化的软件需求大纲。
 
 # 业务流程记录
 {narrative}
@@ -157,6 +109,56 @@ class RequirementGenerator:
 4. 优先级使用High/Medium/Low
 """
 
+# 模板文件不存在时使用默认提示词
+get_prompt_registry().register('requirement_generation', 'har_prompts/requirement_generation.txt',
+                               default=_DEFAULT_REQUIREMENT_PROMPT, required_fields=['narrative'])
+
+
+class RequirementGenerator:
+    """需求大纲生成器"""
+
+    def __init__(self, claude_client: ClaudeClient = None, api_key: str = None):
+        """
+        初始化需求生成器
+        :param claude_client: Claude客户端实例
+        :param api_key: Claude API密钥
+        """
+        if claude_client:
+            self.claude_client = claude_client
+        elif api_key:
+            self.claude_client = ClaudeClient(api_key)
+        else:
+            # 尝试从环境变量获取
+            self.claude_client = ClaudeClient(os.getenv('CLAUDE_API_KEY', ''))
+
+    def generate_requirements(self, narrative: str,
+                            model: str = "claude-3-5-sonnet-20241022") -> Dict:
+        """
+        生成需求大纲
+        :param narrative: 自然语言叙述的业务流程
+        :param model: Claude模型名称
+        :return: 结构化需求字典
+        """
+        # 格式化提示词
+        formatted_prompt = get_prompt_registry().render(
+            'requirement_generation',
+            narrative=narrative[:8000]  # 限制长度
+        )
+
+        # 调用Claude生成需求
+        print("正在调用Claude生成需求大纲...")
+        try:
+            response_text = self._call_claude(formatted_prompt, model)
+            requirements = self._parse_requirements_response(response_text)
+            return requirements
+        except Exception as e:
+            print(f"生成需求失败: {str(e)}")
+            return {"error": str(e), "raw_response": response_text if 'response_text' in locals() else ""}
+
+    def _load_requirement_prompt(self) -> str:
+        """加载需求生成提示词模板(由注册表缓存,文件修改后自动重新读取)"""
+        return get_prompt_registry().get('requirement_generation').text
+
     def _call_claude(self, prompt: str, model: str) -> str:
         """调用Claude API"""
         payload = {
@@ -166,33 +168,21 @@ class RequirementGenerator:
             "temperature": 0.3
         }
 
-        response = self.claude_client.session.post(
-            f"{self.claude_client.base_url}/v1/messages",
-            json=payload,
-            timeout=120
-        )
-        response.raise_for_status()
-        result = response.json()
+        with usage_context(stage='requirement_generation'):
+            result = self.claude_client.create_message(payload, timeout=120)
         return result.get("content", [{}])[0].get("text", "")
 
     def _parse_requirements_response(self, response_text: str) -> Dict:
         """解析Claude的响应"""
-        import re
-
-        try:
-            # 尝试提取JSON部分
-            json_start = response_text.find('{')
-            json_end = response_text.rfind('}') + 1
-
-            if json_start >= 0 and json_end > json_start:
-                json_str = response_text[json_start:json_end]
-                return json.loads(json_str)
-            else:
-                # 如果找不到JSON,返回原始文本
-                return {"raw_text": response_text}
-        except json.JSONDecodeError as e:
-            print(f"JSON解析失败: {e}")
-            return {"raw_text": response_text, "parse_error": str(e)}
+        extraction = extract_json(response_text)
+        if not isinstance(extraction.data, dict):
+            # 找不到JSON时返回原始文本
+            print(f"JSON解析失败: {extraction.error}")
+            return {"raw_text": response_text, "parse_error": extraction.error or "不是JSON对象"}
+        if not extraction.complete:
+            print(f"需求文档{extraction.describe()}")
+            extraction.data['parse_warning'] = extraction.describe()
+        return extraction.data
 
     def extract_user_stories(self, requirements: Dict) -> List[Dict]:
         """从需求中提取用户故事"""
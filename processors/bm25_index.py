@@ -0,0 +1,98 @@
+"""
+检查点BM25检索
+在进程内为参考检查点建倒排索引,每个算法检查点检索得分最高的前k个参考检查点作为候选对,
+大模型只需判断候选对是否匹配,不必在两份完整列表之间自行对照;
+分词使用共享的检查点分词器(词集合),检查点文本较短,词频按1计
+"""
+import math
+from collections import defaultdict
+from typing import AbstractSet, Callable, Dict, List, Optional, Sequence, Tuple
+
+from processors.tokenizer import get_tokenizer
+
+# 参与检索的字段: 参考检查点按内容、标签和分类建索引,算法检查点用标签和取值检索(兼容只有 content 的输出)
+REFERENCE_FIELDS = ('content', 'label', 'category')
+QUERY_FIELDS = ('label', 'value', 'content')
+
+
+def checkpoint_text(checkpoint: Dict, fields: Sequence[str]) -> str:
+    """
+    拼接检查点的指定字段(跳过空字段和重复值)
+    :param checkpoint: 检查点
+    :param fields: 字段名
+    :return: 文本
+    """
+    parts = []
+    for field in fields:
+        value = str(checkpoint.get(field) or '').strip()
+        if value and value not in parts:
+            parts.append(value)
+    return ' '.join(parts)
+
+
+class BM25Index:
+    """BM25倒排索引"""
+
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75,
+                 tokenizer: Optional[Callable[[str], AbstractSet[str]]] = None):
+        """
+        构建索引
+        :param texts: 被检索的文本(如参考检查点)
+        :param k1: 词频饱和参数
+        :param b: 长度归一化参数
+        :param tokenizer: 分词函数,返回词集合,默认使用共享的检查点分词器
+        """
+        self.k1 = k1
+        self.b = b
+        self.tokenizer = tokenizer or get_tokenizer().tokens
+        self.lengths = []
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+        for i, text in enumerate(texts):
+            tokens = self.tokenizer(text)
+            self.lengths.append(len(tokens))
+            for token in tokens:
+                self.postings[token].append(i)
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+        count = len(self.lengths)
+        self.idf = {
+            token: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for token, docs in self.postings.items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def search(self, query: str, k: int = 3, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        检索
+        :param query: 查询文本
+        :param k: 最多返回的结果数
+        :param min_score: 只返回得分高于该值的文本(没有共同词的文本得分为0,不返回)
+        :return: [(文本序号, 得分)],按得分从高到低(同分按序号)
+        """
+        scores: Dict[int, float] = defaultdict(float)
+        for token in self.tokenizer(query):
+            idf = self.idf.get(token)
+            if idf is None:
+                continue
+            for i in self.postings[token]:
+                norm = 1 - self.b + self.b * self.lengths[i] / self.average_length
+                scores[i] += idf * (self.k1 + 1) / (1 + self.k1 * norm)
+        ranked = sorted(((i, score) for i, score in scores.items() if score > min_score),
+                        key=lambda item: (-item[1], item[0]))
+        return [(i, round(score, 4)) for i, score in ranked[:k]]
+
+
+def candidate_pairs(algorithm_checkpoints: Sequence[Dict], reference_checkpoints: Sequence[Dict],
+                    top_k: int = 3, index: Optional[BM25Index] = None) -> List[List[Tuple[int, float]]]:
+    """
+    为每个算法检查点检索参考检查点候选
+    :param algorithm_checkpoints: 算法检查点
+    :param reference_checkpoints: 参考检查点
+    :param top_k: 每个算法检查点的候选数
+    :param index: 已建好的参考检查点索引(同一份参考答案多次检索时复用)
+    :return: 按算法检查点顺序,每项为 [(参考检查点序号, 得分)]
+    """
+    if index is None:
+        index = BM25Index([checkpoint_text(cp, REFERENCE_FIELDS) for cp in reference_checkpoints])
+    return [index.search(checkpoint_text(cp, QUERY_FIELDS), top_k) for cp in algorithm_checkpoints]
@@ -0,0 +1,163 @@
+"""
+检查点一一对齐
+在相似度候选之上做指派: 每个算法检查点最多对应一个参考检查点,反之亦然,
+避免多个算法检查点重复匹配同一个参考检查点而虚高匹配数;
+候选图按连通分量拆分,分量内用匈牙利算法求总相似度最大的匹配(安装 scipy 时使用 linear_sum_assignment),
+超大分量退回按相似度从高到低贪心选取(排除已匹配项)
+"""
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+try:
+    import numpy as np
+    from scipy.optimize import linear_sum_assignment
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+# 分量内左右两侧检查点数都不超过该值时使用匈牙利算法(纯Python实现为O(n³),上限更低)
+HUNGARIAN_MAX_SIZE = 2000 if HAS_SCIPY else 100
+
+
+def align_checkpoints(candidates: Sequence[Sequence[Tuple[int, float]]], right_count: int,
+                      threshold: float = 0.0, method: str = 'auto') -> Dict:
+    """
+    一一对齐
+    :param candidates: 每个左侧检查点的候选 [(右侧序号, 相似度)],如 SimilarityMatrix.candidates 的结果
+    :param right_count: 右侧检查点数
+    :param threshold: 相似度阈值,低于阈值的候选不参与匹配
+    :param method: 'hungarian' 总相似度最大 / 'greedy' 贪心排除 / 'auto' 按分量大小选择
+    :return: {
+        'pairs': [(左侧序号, 右侧序号, 相似度)] 按左侧序号排序,
+        'unmatched_left': [左侧序号], 'unmatched_right': [右侧序号],
+        'matched', 'precision', 'recall', 'f1_score'(百分比,左侧为预测、右侧为参考)
+    }
+    """
+    if method not in ('auto', 'hungarian', 'greedy'):
+        raise ValueError(f"不支持的对齐方式: {method}")
+
+    edges = [(i, j, score) for i, row in enumerate(candidates) for j, score in row if score >= threshold]
+    pairs = []
+    for component in _components(edges, len(candidates)):
+        left_size = len({i for i, _, _ in component})
+        right_size = len({j for _, j, _ in component})
+        if method == 'greedy' or (method == 'auto' and max(left_size, right_size) > HUNGARIAN_MAX_SIZE):
+            pairs.extend(_greedy(component))
+        else:
+            pairs.extend(_hungarian(component))
+    pairs.sort()
+
+    matched_left = {i for i, _, _ in pairs}
+    matched_right = {j for _, j, _ in pairs}
+    precision = len(pairs) / len(candidates) if candidates else 0
+    recall = len(pairs) / right_count if right_count else 0
+    f1_score = 2 * precision * recall / (precision + recall) if (precision + recall) > 0 else 0
+    return {
+        'pairs': pairs,
+        'unmatched_left': [i for i in range(len(candidates)) if i not in matched_left],
+        'unmatched_right': [j for j in range(right_count) if j not in matched_right],
+        'matched': len(pairs),
+        'precision': round(precision * 100, 2),
+        'recall': round(recall * 100, 2),
+        'f1_score': round(f1_score * 100, 2)
+    }
+
+
+def _components(edges: List[Tuple[int, int, float]], left_count: int) -> List[List[Tuple[int, int, float]]]:
+    """按连通分量拆分候选边(右侧节点编号偏移 left_count)"""
+    parent = {}
+
+    def find(node):
+        root = node
+        while parent.setdefault(root, root) != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    for i, j, _ in edges:
+        a, b = find(i), find(left_count + j)
+        if a != b:
+            parent[a] = b
+
+    groups = defaultdict(list)
+    for edge in edges:
+        groups[find(edge[0])].append(edge)
+    return list(groups.values())
+
+
+def _greedy(edges: List[Tuple[int, int, float]]) -> List[Tuple[int, int, float]]:
+    """按相似度从高到低选取,已匹配的两侧检查点不再参与"""
+    used_left, used_right, pairs = set(), set(), []
+    for i, j, score in sorted(edges, key=lambda edge: (-edge[2], edge[0], edge[1])):
+        if i not in used_left and j not in used_right:
+            used_left.add(i)
+            used_right.add(j)
+            pairs.append((i, j, score))
+    return pairs
+
+
+def _hungarian(edges: List[Tuple[int, int, float]]) -> List[Tuple[int, int, float]]:
+    """分量内求总相似度最大的一一匹配(没有候选边的组合相似度记为0,不计入结果)"""
+    rows = sorted({i for i, _, _ in edges})
+    columns = sorted({j for _, j, _ in edges})
+    row_index = {i: r for r, i in enumerate(rows)}
+    column_index = {j: c for c, j in enumerate(columns)}
+    scores = [[0.0] * len(columns) for _ in rows]
+    for i, j, score in edges:
+        scores[row_index[i]][column_index[j]] = score
+
+    if HAS_SCIPY:
+        assigned = zip(*linear_sum_assignment(np.array(scores), maximize=True))
+    else:
+        assigned = _max_weight_assignment(scores)
+
+    return [(rows[r], columns[c], scores[r][c]) for r, c in assigned if scores[r][c] > 0]
+
+
+def _max_weight_assignment(scores: List[List[float]]) -> List[Tuple[int, int]]:
+    """
+    纯Python匈牙利算法(带势函数的最短增广路,O(n²m)),求总权重最大的指派
+    :param scores: n×m 权重矩阵
+    :return: [(行, 列)]
+    """
+    transposed = len(scores) > len(scores[0])
+    if transposed:
+        scores = [list(column) for column in zip(*scores)]
+    n, m = len(scores), len(scores[0])
+    inf = float('inf')
+    # 1-based: u/v 为行/列势,match[列] = 行,way 记录增广路
+    u, v = [0.0] * (n + 1), [0.0] * (m + 1)
+    match, way = [0] * (m + 1), [0] * (m + 1)
+    for row in range(1, n + 1):
+        match[0] = row
+        column = 0
+        min_slack = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[column] = True
+            current_row, delta, next_column = match[column], inf, 0
+            cost_row = scores[current_row - 1]
+            for c in range(1, m + 1):
+                if not used[c]:
+                    slack = -cost_row[c - 1] - u[current_row] - v[c]
+                    if slack < min_slack[c]:
+                        min_slack[c], way[c] = slack, column
+                    if min_slack[c] < delta:
+                        delta, next_column = min_slack[c], c
+            for c in range(m + 1):
+                if used[c]:
+                    u[match[c]] += delta
+                    v[c] -= delta
+                else:
+                    min_slack[c] -= delta
+            column = next_column
+            if match[column] == 0:
+                break
+        while column:
+            previous = way[column]
+            match[column] = match[previous]
+            column = previous
+
+    assigned = [(match[c] - 1, c - 1) for c in range(1, m + 1) if match[c]]
+    return [(c, r) for r, c in assigned] if transposed else assigned
@@ -0,0 +1,125 @@
+"""
+检查点合并去重
+分块提取的检查点在重叠区和跨章节处会重复出现,用字符二元组倒排索引找候选、按相似度合并
+"""
+import re
+from collections import defaultdict
+from typing import Dict, List, Set
+
+from processors.text_index import normalize_char_text
+
+_IMPORTANCE_RANK = {'高': 3, 'high': 3, '中': 2, 'medium': 2, '低': 1, 'low': 1}
+_IGNORED_CHARS = re.compile(r'[\s\W_]+')
+
+
+def _bigrams(text: str) -> Set[str]:
+    """规范化后的字符二元组集合(忽略空白和标点)"""
+    text = _IGNORED_CHARS.sub('', normalize_char_text(text))
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def _dice(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+class CheckpointMerger:
+    """增量合并检查点,相似度达到阈值的视为同一检查点"""
+
+    def __init__(self, threshold: float = 0.8):
+        """
+        :param threshold: 内容相似度阈值(字符二元组Dice系数)
+        """
+        self.threshold = threshold
+        self.checkpoints: List[Dict] = []
+        self._grams: List[Set[str]] = []
+        self._postings: Dict[str, List[int]] = defaultdict(list)
+
+    def add(self, checkpoint: Dict) -> bool:
+        """
+        添加一个检查点
+        :param checkpoint: 检查点(需包含 content,可选 category/importance/source_chunks)
+        :return: True表示新增,False表示与已有检查点合并
+        """
+        grams = _bigrams(checkpoint.get('content', ''))
+        match = self._find_similar(checkpoint, grams)
+        if match is None:
+            self._postings_add(len(self.checkpoints), grams)
+            self.checkpoints.append(dict(checkpoint))
+            self._grams.append(grams)
+            return True
+
+        self._merge_into(match, checkpoint, grams)
+        return False
+
+    def result(self) -> List[Dict]:
+        """合并后的检查点列表,按首次出现顺序重新编号"""
+        merged = []
+        for i, checkpoint in enumerate(self.checkpoints, 1):
+            item = dict(checkpoint)
+            item['id'] = str(i)
+            merged.append(item)
+        return merged
+
+    def _find_similar(self, checkpoint: Dict, grams: Set[str]):
+        """通过倒排索引找共享二元组最多的候选,再计算相似度"""
+        if not grams:
+            return None
+        overlap = defaultdict(int)
+        for gram in grams:
+            for index in self._postings.get(gram, ()):
+                overlap[index] += 1
+
+        category = checkpoint.get('category', '')
+        best, best_score = None, self.threshold
+        for index, shared in overlap.items():
+            # Dice系数上界: 2*shared/(|a|+|b|),低于当前最优时跳过
+            if 2 * shared / (len(grams) + len(self._grams[index])) < best_score:
+                continue
+            other_category = self.checkpoints[index].get('category', '')
+            if category and other_category and category != other_category:
+                continue
+            score = _dice(grams, self._grams[index])
+            if score >= best_score:
+                best, best_score = index, score
+        return best
+
+    def _merge_into(self, index: int, checkpoint: Dict, grams: Set[str]):
+        """合并: 保留更完整的内容、更高的重要程度,并记录来源分块"""
+        target = self.checkpoints[index]
+        if len(checkpoint.get('content', '')) > len(target.get('content', '')):
+            target['content'] = checkpoint['content']
+            # 旧二元组的倒排项保留,候选仍会按新内容重新计算相似度
+            self._postings_add(index, grams - self._grams[index])
+            self._grams[index] = grams
+        if not target.get('category') and checkpoint.get('category'):
+            target['category'] = checkpoint['category']
+
+        rank = _IMPORTANCE_RANK.get(str(checkpoint.get('importance', '')).lower(), 0)
+        if rank > _IMPORTANCE_RANK.get(str(target.get('importance', '')).lower(), 0):
+            target['importance'] = checkpoint['importance']
+
+        sources = target.setdefault('source_chunks', [])
+        for chunk in checkpoint.get('source_chunks', []):
+            if chunk not in sources:
+                sources.append(chunk)
+
+    def _postings_add(self, index: int, grams: Set[str]):
+        for gram in grams:
+            self._postings[gram].append(index)
+
+
+def merge_checkpoints(checkpoints: List[Dict], threshold: float = 0.8) -> List[Dict]:
+    """
+    合并去重检查点
+    :param checkpoints: 检查点列表(按文档顺序)
+    :param threshold: 内容相似度阈值
+    :return: 去重后的检查点列表(重新编号)
+    """
+    merger = CheckpointMerger(threshold)
+    for checkpoint in checkpoints:
+        merger.add(checkpoint)
+    return merger.result()
@@ -2,9 +2,30 @@
 文档处理器
 用于加载和预处理招标文件
 """
+import codecs
+import mmap
 import os
+import zipfile
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from processors.docx_stream import iter_docx_blocks
+from processors.fingerprint import NearDuplicateIndex
+from processors.text_chunker import TextChunker
+
+
+# 编码探测采样的字节数
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+# 流式解码/清理时每次处理的块大小
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# 字节序标记与对应编码
+_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
 
 
 class DocumentProcessor:
@@ -41,21 +62,98 @@ class DocumentProcessor:
         else:
             raise ValueError(f"未实现的文件格式处理: {suffix}")
 
+    def load_pages(self, file_path: str) -> List[str]:
+        """
+        按页加载并预处理文档(仅PDF有真实分页,其他格式视为单页)
+        :param file_path: 文档文件路径
+        :return: 每页的文本列表
+        """
+        file_path = Path(file_path)
+        if file_path.suffix.lower() != '.pdf':
+            return [self.load_and_preprocess(str(file_path))]
+
+        if not file_path.exists():
+            raise FileNotFoundError(f"文件不存在: {file_path}")
+
+        try:
+            import PyPDF2
+            with open(file_path, 'rb') as f:
+                reader = PyPDF2.PdfReader(f)
+                return [self._clean_text(page.extract_text() or "") for page in reader.pages]
+        except ImportError:
+            print("警告: 未安装PyPDF2,无法处理PDF文件")
+            print("请运行: pip install PyPDF2")
+            return []
+        except Exception as e:
+            print(f"加载PDF文件失败: {str(e)}")
+            return []
+
+    def load_paged_text(self, file_path: str) -> Tuple[str, List[int]]:
+        """
+        按页加载文档并以空格拼接
+        :param file_path: 文档文件路径
+        :return: (全文, 每页起始字符偏移)
+        """
+        pages = self.load_pages(file_path)
+        page_offsets = []
+        offset = 0
+        for page in pages:
+            page_offsets.append(offset)
+            offset += len(page) + 1
+        return ' '.join(pages), page_offsets
+
     def _load_txt(self, file_path: Path) -> str:
         """
         加载文本文件
+        根据文件前缀探测编码,再通过内存映射增量解码,边解码边清理,
+        避免整文件读入和多次完整拷贝
         :param file_path: 文件路径
         :return: 文本内容
         """
+        encoding = self._detect_encoding(file_path)
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            return self._clean_text(content)
+            return self._clean_chunks(self._iter_decoded(file_path, encoding))
         except UnicodeDecodeError:
-            # 尝试其他编码
-            with open(file_path, 'r', encoding='gbk') as f:
-                content = f.read()
-            return self._clean_text(content)
+            # 采样部分可解码但后文出错,按GBK兼容编码重新解码
+            return self._clean_chunks(self._iter_decoded(file_path, 'gb18030', errors='replace'))
+
+    def _detect_encoding(self, file_path: Path) -> str:
+        """
+        根据文件前缀采样探测编码
+        :param file_path: 文件路径
+        :return: 编码名称
+        """
+        with open(file_path, 'rb') as f:
+            sample = f.read(ENCODING_SAMPLE_SIZE)
+
+        for bom, encoding in _BOMS:
+            if sample.startswith(bom):
+                return encoding
+
+        try:
+            # final=False: 允许采样末尾截断的多字节字符
+            codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+            return 'utf-8'
+        except UnicodeDecodeError:
+            return 'gb18030'
+
+    def _iter_decoded(self, file_path: Path, encoding: str,
+                      errors: str = 'strict') -> Iterator[str]:
+        """
+        通过内存映射按块增量解码文件
+        :param file_path: 文件路径
+        :param encoding: 编码
+        :param errors: 解码错误处理方式
+        :return: 解码后的文本块迭代器
+        """
+        decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+        with open(file_path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for pos in range(0, len(mm), STREAM_CHUNK_SIZE):
+                    yield decoder.decode(mm[pos:pos + STREAM_CHUNK_SIZE])
+        yield decoder.decode(b'', final=True)
 
     def _load_pdf(self, file_path: Path) -> str:
         """
@@ -82,19 +180,16 @@ class DocumentProcessor:
     def _load_docx(self, file_path: Path) -> str:
         """
         加载Word文档
+        流式解析document.xml,按文档顺序包含段落和表格内容
         :param file_path: 文件路径
         :return: 文本内容
         """
         try:
-            from docx import Document
-            doc = Document(file_path)
-            text = ""
-            for paragraph in doc.paragraphs:
-                text += paragraph.text + "\n"
-            return self._clean_text(text)
-        except ImportError:
-            print("警告: 未安装python-docx,无法处理Word文档")
-            print("请运行: pip install python-docx")
+            return self._clean_chunks(
+                block['text'] + "\n" for block in iter_docx_blocks(file_path)
+            )
+        except (zipfile.BadZipFile, KeyError):
+            print(f"加载Word文档失败: {file_path.name} 不是有效的docx文件")
             return ""
         except Exception as e:
             print(f"加载Word文档失败: {str(e)}")
@@ -106,20 +201,47 @@ class DocumentProcessor:
         :param text: 原始文本
         :return: 清理后的文本
         """
-        # 去除多余的空白字符
-        text = ' '.join(text.split())
+        # 分块清理,避免 split() 为整篇文本生成完整的单词列表
+        return self._clean_chunks(
+            text[pos:pos + STREAM_CHUNK_SIZE] for pos in range(0, len(text), STREAM_CHUNK_SIZE)
+        )
+
+    def _clean_chunks(self, chunks: Iterable[str]) -> str:
+        """
+        流式清理文本块: 合并连续空白为单个空格并去除首尾空白,
+        结果与 ' '.join(text.split()) 一致
+        :param chunks: 文本块迭代器
+        :return: 清理后的文本
+        """
+        parts = []
+        pending_space = False
+        for chunk in chunks:
+            if not chunk:
+                continue
+            words = chunk.split()
+            if not words:
+                pending_space = True
+                continue
+            # 跨块的空白只保留一个空格;块间无空白则直接拼接
+            if parts and (pending_space or chunk[0].isspace()):
+                parts.append(' ')
+            parts.append(' '.join(words))
+            pending_space = chunk[-1].isspace()
 
         # 去除特殊字符(根据需要调整)
         # text = text.replace('\x0c', '')  # PDF分页符
 
-        return text.strip()
+        return ''.join(parts)
 
-    def load_batch(self, directory: str, pattern: str = "*") -> List[Dict[str, str]]:
+    def load_batch(self, directory: str, pattern: str = "*",
+                   dedup_index: Optional[NearDuplicateIndex] = None) -> List[Dict]:
         """
         批量加载目录下的文档
         :param directory: 目录路径
         :param pattern: 文件匹配模式(如 "*.txt")
-        :return: 文档列表,每个元素包含 {'path': str, 'content': str}
+        :param dedup_index: 近似重复索引,提供时为每个文档计算指纹并标记近似重复
+        :return: 文档列表,每个元素包含 {'path': str, 'filename': str, 'content': str};
+            启用去重时额外包含 'fingerprint' 和 'duplicate_of'(近似重复的已有文档,无则为None)
         """
         dir_path = Path(directory)
         if not dir_path.exists():
@@ -130,16 +252,37 @@ class DocumentProcessor:
             if file_path.suffix.lower() in self.supported_formats:
                 try:
                     content = self.load_and_preprocess(str(file_path))
-                    documents.append({
+                    document = {
                         'path': str(file_path),
                         'filename': file_path.name,
                         'content': content
-                    })
+                    }
+                    if dedup_index is not None:
+                        self._mark_duplicate(document, dedup_index)
+                    documents.append(document)
                 except Exception as e:
                     print(f"加载文件失败 {file_path}: {str(e)}")
 
         return documents
 
+    def _mark_duplicate(self, document: Dict, dedup_index: NearDuplicateIndex):
+        """
+        计算文档指纹,标记近似重复并登记到索引
+        :param document: load_batch 中的文档字典
+        :param dedup_index: 近似重复索引
+        """
+        key = str(Path(document['path']).resolve())
+        fingerprint = dedup_index.fingerprint(document['content'])
+        duplicate = dedup_index.find_duplicate(fingerprint, exclude_key=key)
+        if duplicate:
+            print(f"检测到近似重复: {document['filename']} ≈ {duplicate['key']} "
+                  f"(相似度 {duplicate['similarity']:.2f})")
+
+        document['fingerprint'] = fingerprint
+        document['duplicate_of'] = duplicate
+        # 同一批次中后面的修订版本也能匹配到当前文档
+        dedup_index.add(key, fingerprint, {'path': document['path']})
+
     def extract_text_sections(self, text: str, sections: List[str]) -> Dict[str, str]:
         """
         提取文档的特定章节
@@ -172,6 +315,30 @@ class DocumentProcessor:
 
         return sections_dict
 
+    def chunk_text(self, text: str, max_tokens: int = 1500, overlap_tokens: int = 150,
+                   page_offsets: Optional[List[int]] = None) -> List[Dict]:
+        """
+        按Token预算将文本切分为带重叠的块(在句子和章节边界处断开)
+        :param text: 文档文本
+        :param max_tokens: 每个块的Token预算
+        :param overlap_tokens: 相邻块重叠的Token数
+        :param page_offsets: 每页起始字符偏移,用于标注块的页码
+        :return: 块列表,参见 TextChunker.chunk
+        """
+        return TextChunker(max_tokens, overlap_tokens).chunk(text, page_offsets)
+
+    def chunk_document(self, file_path: str, max_tokens: int = 1500,
+                       overlap_tokens: int = 150) -> List[Dict]:
+        """
+        加载文档并按页拼接后分块,块中带页码和章节信息
+        :param file_path: 文档文件路径
+        :param max_tokens: 每个块的Token预算
+        :param overlap_tokens: 相邻块重叠的Token数
+        :return: 块列表
+        """
+        text, page_offsets = self.load_paged_text(file_path)
+        return self.chunk_text(text, max_tokens, overlap_tokens, page_offsets)
+
     def truncate_text(self, text: str, max_length: int = 6000,
                      strategy: str = 'middle') -> str:
         """
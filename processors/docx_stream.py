@@ -0,0 +1,157 @@
+"""
+Word文档流式解析
+直接从zip包中增量解析 word/document.xml,按文档顺序输出段落和表格行,
+内存占用只与当前解析路径有关,不随文档大小增长
+"""
+import re
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+from xml.etree import ElementTree
+
+W_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+_P = W_NS + 'p'
+_T = W_NS + 't'
+_TAB = W_NS + 'tab'
+_BR = W_NS + 'br'
+_CR = W_NS + 'cr'
+_TBL = W_NS + 'tbl'
+_TR = W_NS + 'tr'
+_TC = W_NS + 'tc'
+_P_STYLE = W_NS + 'pStyle'
+_OUTLINE_LVL = W_NS + 'outlineLvl'
+_VAL = W_NS + 'val'
+
+# 样式名中的标题级别,如 "heading 1"、"标题 2"
+_HEADING_NAME_PATTERN = re.compile(r'^(?:heading|标题)\s*(\d)$', re.IGNORECASE)
+
+
+def load_heading_levels(docx_zip: zipfile.ZipFile) -> Dict[str, int]:
+    """
+    从 word/styles.xml 读取段落样式对应的标题级别
+    :param docx_zip: 已打开的docx压缩包
+    :return: {styleId: 标题级别(从1开始)}
+    """
+    try:
+        with docx_zip.open('word/styles.xml') as f:
+            root = ElementTree.parse(f).getroot()
+    except KeyError:
+        return {}
+
+    levels = {}
+    based_on = {}
+    for style in root.iter(W_NS + 'style'):
+        style_id = style.get(W_NS + 'styleId')
+        if not style_id:
+            continue
+
+        name = style.find(W_NS + 'name')
+        match = _HEADING_NAME_PATTERN.match(name.get(_VAL, '').strip()) if name is not None else None
+        outline = style.find(f'{W_NS}pPr/{_OUTLINE_LVL}')
+        if outline is not None and outline.get(_VAL, '').isdigit() and int(outline.get(_VAL)) < 9:
+            levels[style_id] = int(outline.get(_VAL)) + 1
+        elif match:
+            levels[style_id] = int(match.group(1))
+
+        parent = style.find(W_NS + 'basedOn')
+        if parent is not None:
+            based_on[style_id] = parent.get(_VAL)
+
+    # 继承父样式的标题级别
+    for style_id, parent_id in based_on.items():
+        if style_id not in levels and parent_id in levels:
+            levels[style_id] = levels[parent_id]
+
+    return levels
+
+
+def iter_docx_blocks(file_path: Union[str, Path]) -> Iterator[Dict]:
+    """
+    按文档顺序流式输出Word文档的段落和表格行
+    :param file_path: docx文件路径
+    :return: 块迭代器,每个元素包含:
+        - type: 'paragraph' 或 'table_row'
+        - text: 段落文本;表格行为各单元格文本以 ' | ' 连接
+        - level: 标题级别(非标题为None)
+        - cells: 单元格文本列表(仅表格行)
+    """
+    with zipfile.ZipFile(file_path) as docx_zip:
+        heading_levels = load_heading_levels(docx_zip)
+        with docx_zip.open('word/document.xml') as f:
+            yield from _iter_blocks(f, heading_levels)
+
+
+def _iter_blocks(stream, heading_levels: Dict[str, int]) -> Iterator[Dict]:
+    """增量解析document.xml"""
+    path = []           # 当前打开的元素路径,用于移除已处理的元素
+    paragraphs = []     # 段落状态栈(文本框中可能嵌套段落)
+    table_depth = 0
+    row_cells: List[str] = []
+    cell_texts: List[str] = []
+
+    for event, elem in ElementTree.iterparse(stream, events=('start', 'end')):
+        tag = elem.tag
+
+        if event == 'start':
+            path.append(elem)
+            if tag == _P:
+                paragraphs.append({'pieces': [], 'style': None, 'outline': None})
+            elif tag == _TBL:
+                table_depth += 1
+            elif tag == _TR and table_depth == 1:
+                row_cells = []
+            elif tag == _TC and table_depth == 1:
+                cell_texts = []
+            continue
+
+        # end 事件
+        if tag == _T and paragraphs:
+            paragraphs[-1]['pieces'].append(elem.text or '')
+        elif tag == _TAB and paragraphs:
+            paragraphs[-1]['pieces'].append('\t')
+        elif tag in (_BR, _CR) and paragraphs:
+            paragraphs[-1]['pieces'].append('\n')
+        elif tag == _P_STYLE and paragraphs:
+            paragraphs[-1]['style'] = elem.get(_VAL)
+        elif tag == _OUTLINE_LVL and paragraphs:
+            paragraphs[-1]['outline'] = elem.get(_VAL)
+        elif tag == _P and paragraphs:
+            state = paragraphs.pop()
+            text = ''.join(state['pieces'])
+            if paragraphs:
+                # 文本框内的段落并入外层段落
+                paragraphs[-1]['pieces'].append(text)
+            elif table_depth:
+                cell_texts.append(text)
+            else:
+                yield {
+                    'type': 'paragraph',
+                    'text': text,
+                    'level': _paragraph_level(state, heading_levels)
+                }
+        elif tag == _TC and table_depth == 1:
+            row_cells.append(' '.join(t for t in cell_texts if t))
+        elif tag == _TR and table_depth == 1:
+            yield {
+                'type': 'table_row',
+                'text': ' | '.join(row_cells),
+                'level': None,
+                'cells': row_cells
+            }
+        elif tag == _TBL:
+            table_depth -= 1
+
+        # 移除已处理的元素,树中只保留当前解析路径
+        path.pop()
+        if path:
+            path[-1].remove(elem)
+
+
+def _paragraph_level(state: Dict, heading_levels: Dict[str, int]) -> Optional[int]:
+    """计算段落的标题级别"""
+    outline = state['outline']
+    if outline is not None and outline.isdigit():
+        level = int(outline)
+        return level + 1 if level < 9 else None
+    return heading_levels.get(state['style'])
@@ -0,0 +1,131 @@
+"""
+文档指纹与近似重复检测
+基于字符shingle的MinHash(bottom-k)签名,配合磁盘索引识别同一招标文件的修订版本
+"""
+import hashlib
+import heapq
+import json
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class NearDuplicateIndex:
+    """近似重复文档索引"""
+
+    def __init__(self, index_path: str, threshold: float = 0.9,
+                 shingle_size: int = 5, sketch_size: int = 128):
+        """
+        初始化索引
+        :param index_path: 索引文件路径(JSON)
+        :param threshold: 判定为近似重复的Jaccard相似度阈值
+        :param shingle_size: shingle的字符长度
+        :param sketch_size: MinHash签名保留的最小哈希值个数
+        """
+        self.index_path = Path(index_path)
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.sketch_size = sketch_size
+        self.entries: Dict[str, Dict] = {}
+        # 并发评估时多个线程同时查找、登记和保存
+        self._lock = threading.RLock()
+        self._load()
+
+    def _load(self):
+        """从磁盘加载索引,参数不一致的旧索引将被忽略"""
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"加载指纹索引失败 {self.index_path}: {str(e)}")
+            return
+
+        if (data.get('shingle_size') == self.shingle_size
+                and data.get('sketch_size') == self.sketch_size):
+            self.entries = data.get('entries', {})
+        else:
+            print(f"指纹索引参数不一致,已忽略旧索引: {self.index_path}")
+
+    def save(self):
+        """保存索引到磁盘(先写临时文件再替换,避免写入中断损坏索引)"""
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix(self.index_path.suffix + '.tmp')
+        with self._lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'shingle_size': self.shingle_size,
+                    'sketch_size': self.sketch_size,
+                    'entries': self.entries
+                }, f, ensure_ascii=False)
+            tmp_path.replace(self.index_path)
+
+    def fingerprint(self, text: str) -> List[int]:
+        """
+        计算文本的MinHash签名
+        :param text: 文档文本
+        :return: 升序排列的最小哈希值列表
+        """
+        # 忽略空白差异,修订版本常见的只是换行和空格变化
+        text = ''.join(text.split())
+        if not text:
+            return []
+        size = min(self.shingle_size, len(text))
+        shingles = {text[i:i + size] for i in range(len(text) - size + 1)}
+        hashes = (
+            int.from_bytes(hashlib.blake2b(s.encode('utf-8'), digest_size=8).digest(), 'little')
+            for s in shingles
+        )
+        return heapq.nsmallest(self.sketch_size, hashes)
+
+    def similarity(self, sketch_a: List[int], sketch_b: List[int]) -> float:
+        """
+        用两个bottom-k签名估算Jaccard相似度
+        :return: 0~1之间的相似度
+        """
+        if not sketch_a or not sketch_b:
+            return 0.0
+        set_a = set(sketch_a)
+        set_b = set(sketch_b)
+        union_k = heapq.nsmallest(self.sketch_size, set_a | set_b)
+        shared = sum(1 for h in union_k if h in set_a and h in set_b)
+        return shared / len(union_k)
+
+    def find_duplicate(self, sketch: List[int], exclude_key: Optional[str] = None,
+                       required_metadata: Optional[str] = None) -> Optional[Dict]:
+        """
+        查找最相似且超过阈值的已索引文档
+        :param sketch: 待查文档的签名
+        :param exclude_key: 排除的文档键(通常是文档自身)
+        :param required_metadata: 只在附加信息包含该字段的条目中查找(如 'result_path')
+        :return: {'key', 'similarity', 'metadata'},没有近似重复时返回None
+        """
+        best = None
+        with self._lock:
+            entries = list(self.entries.items())
+        for key, entry in entries:
+            if key == exclude_key:
+                continue
+            if required_metadata and not entry.get('metadata', {}).get(required_metadata):
+                continue
+            score = self.similarity(sketch, entry['sketch'])
+            if score >= self.threshold and (best is None or score > best['similarity']):
+                best = {'key': key, 'similarity': round(score, 4), 'metadata': entry.get('metadata', {})}
+        return best
+
+    def add(self, key: str, sketch: List[int], metadata: Optional[Dict] = None):
+        """
+        添加或更新文档签名(需调用save持久化)
+        :param key: 文档键
+        :param sketch: 文档签名
+        :param metadata: 附加信息,如结果文件路径
+        """
+        with self._lock:
+            entry = self.entries.setdefault(key, {'sketch': sketch, 'metadata': {}})
+            entry['sketch'] = sketch
+            entry['metadata'].update(metadata or {})
+
+    def get_metadata(self, key: str) -> Dict:
+        """获取文档的附加信息"""
+        return self.entries.get(key, {}).get('metadata', {})
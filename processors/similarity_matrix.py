@@ -0,0 +1,106 @@
+"""
+检查点相似度矩阵
+两侧检查点各分词一次,一次性计算全部两两之间的Jaccard相似度,只返回达到下限的候选;
+安装 scipy 时用稀疏矩阵乘法按行分块计算交集大小,否则退回到倒排索引
+"""
+from collections import defaultdict
+from typing import AbstractSet, Callable, Dict, List, Optional, Sequence, Tuple
+
+from processors.tokenizer import get_tokenizer
+
+try:
+    import numpy as np
+    from scipy import sparse
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+# 稀疏矩阵按行分块,避免一次性生成过大的交集矩阵
+BLOCK_ROWS = 512
+
+
+class SimilarityMatrix:
+    """两组文本之间的Jaccard相似度"""
+
+    def __init__(self, left_texts: Sequence[str], right_texts: Sequence[str],
+                 tokenizer: Optional[Callable[[str], AbstractSet[str]]] = None, backend: Optional[str] = None):
+        """
+        :param left_texts: 左侧文本(如算法检查点)
+        :param right_texts: 右侧文本(如参考检查点)
+        :param tokenizer: 分词函数,返回词集合,默认使用共享的检查点分词器
+        :param backend: 'scipy' 或 'python',默认有 scipy 时使用 scipy
+        """
+        tokenizer = tokenizer or get_tokenizer().tokens
+        self.left = [tokenizer(text) for text in left_texts]
+        self.right = [tokenizer(text) for text in right_texts]
+        self.backend = backend or ('scipy' if HAS_SCIPY else 'python')
+        if self.backend == 'scipy' and not HAS_SCIPY:
+            raise ImportError("请先安装 numpy 和 scipy")
+
+    def candidates(self, min_score: float = 0.0) -> List[List[Tuple[int, float]]]:
+        """
+        每个左侧文本的候选
+        :param min_score: 相似度下限,低于下限(以及没有共同词)的不返回
+        :return: 按左侧顺序,每项为 [(右侧序号, 相似度)],右侧序号递增
+        """
+        if not self.left or not self.right:
+            return [[] for _ in self.left]
+        if self.backend == 'scipy':
+            return self._candidates_sparse(min_score)
+        return self._candidates_python(min_score)
+
+    def _candidates_python(self, min_score: float) -> List[List[Tuple[int, float]]]:
+        """倒排索引: 只统计共享词的文本对"""
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for j, tokens in enumerate(self.right):
+            for token in tokens:
+                postings[token].append(j)
+
+        results = []
+        for tokens in self.left:
+            shared: Dict[int, int] = defaultdict(int)
+            for token in tokens:
+                for j in postings.get(token, ()):
+                    shared[j] += 1
+            row = []
+            for j in sorted(shared):
+                intersection = shared[j]
+                score = intersection / (len(tokens) + len(self.right[j]) - intersection)
+                if score >= min_score:
+                    row.append((j, score))
+            results.append(row)
+        return results
+
+    def _candidates_sparse(self, min_score: float) -> List[List[Tuple[int, float]]]:
+        """稀疏矩阵: 交集大小 = A·Bᵀ,并集大小 = |a| + |b| - 交集"""
+        vocabulary: Dict[str, int] = {}
+        for tokens in self.left + self.right:
+            for token in tokens:
+                vocabulary.setdefault(token, len(vocabulary))
+        left = self._binary_matrix(self.left, vocabulary)
+        right_t = self._binary_matrix(self.right, vocabulary).T.tocsr()
+        left_sizes = np.array([len(tokens) for tokens in self.left], dtype=np.int64)
+        right_sizes = np.array([len(tokens) for tokens in self.right], dtype=np.int64)
+
+        results = []
+        for begin in range(0, len(self.left), BLOCK_ROWS):
+            block = (left[begin:begin + BLOCK_ROWS] @ right_t).tocsr()
+            block.sort_indices()
+            for offset in range(block.shape[0]):
+                start, end = block.indptr[offset], block.indptr[offset + 1]
+                columns = block.indices[start:end]
+                intersections = block.data[start:end]
+                scores = intersections / (left_sizes[begin + offset] + right_sizes[columns] - intersections)
+                keep = scores >= min_score
+                results.append(list(zip(columns[keep].tolist(), scores[keep].tolist())))
+        return results
+
+    @staticmethod
+    def _binary_matrix(token_sets: List[AbstractSet[str]], vocabulary: Dict[str, int]):
+        """词集合 -> 0/1稀疏矩阵,列号取自两侧共享的词表"""
+        indptr, indices = [0], []
+        for tokens in token_sets:
+            indices.extend(vocabulary[token] for token in tokens)
+            indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=np.int64)
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(token_sets), max(len(vocabulary), 1)))
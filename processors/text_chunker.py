@@ -0,0 +1,195 @@
+"""
+文本分块器
+按Token预算将长文本切分为带重叠的块,并附带页码和章节信息
+"""
+import bisect
+import math
+import re
+from typing import Dict, List, Optional
+
+# 中日韩文字及全角符号(每个字符约计1个Token)
+_CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+
+# 其他字符平均每个Token对应的字符数
+_CHARS_PER_TOKEN = 4
+
+# 句子结束符
+_SENTENCE_END_PATTERN = re.compile(r'[。！？；!?;]+|\n+')
+
+# 章节标题: 第X章/节/条、一、(一)、1.1 等,要求位于文本开头、空白或句末之后
+_HEADING_PATTERN = re.compile(
+    r'(?<![^\s。！？；：:])'
+    r'(?:第[一二三四五六七八九十百零〇\d]+[章节篇部分条]'
+    r'|[一二三四五六七八九十]+、'
+    r'|[（(][一二三四五六七八九十]+[）)]'
+    r'|\d+(?:\.\d+)+(?=\s|[\u4e00-\u9fff]))'
+    r'[^\s。！？；]{0,30}'
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    本地快速估算Token数量(无需加载分词器)
+    中文字符按1个Token计,其余非空白字符按4个字符1个Token计
+    :param text: 文本
+    :return: 估算的Token数
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    whitespace_count = len(text) - len(''.join(text.split()))
+    other_count = max(len(text) - cjk_count - whitespace_count, 0)
+    return cjk_count + math.ceil(other_count / _CHARS_PER_TOKEN)
+
+
+class TextChunker:
+    """按结构边界切分文本的分块器"""
+
+    def __init__(self, max_tokens: int = 1500, overlap_tokens: int = 150):
+        """
+        初始化分块器
+        :param max_tokens: 每个块的Token预算
+        :param overlap_tokens: 相邻块之间的重叠Token数
+        """
+        if max_tokens <= 0:
+            raise ValueError(f"max_tokens必须大于0: {max_tokens}")
+        if overlap_tokens < 0 or overlap_tokens >= max_tokens:
+            raise ValueError(f"overlap_tokens必须在[0, max_tokens)范围内: {overlap_tokens}")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def chunk(self, text: str, page_offsets: Optional[List[int]] = None) -> List[Dict]:
+        """
+        切分文本
+        :param text: 文档文本
+        :param page_offsets: 每页在文本中的起始字符偏移(升序),用于标注页码
+        :return: 块列表,每个元素包含 index/text/start/end/tokens/page_start/page_end/section
+        """
+        if not text:
+            return []
+
+        headings = [(m.start(), m.group().strip()) for m in _HEADING_PATTERN.finditer(text)]
+        heading_starts = {pos for pos, _ in headings}
+        segments = self._split_segments(text, heading_starts)
+
+        chunks = []
+        current = []  # [(start, end, tokens)]
+        current_tokens = 0
+
+        for seg in segments:
+            seg_start, seg_end, seg_tokens = seg
+            over_budget = current_tokens + seg_tokens > self.max_tokens
+            # 遇到章节标题且当前块已过半时提前断开,尽量让块与章节对齐
+            at_heading = seg_start in heading_starts and current_tokens >= self.max_tokens // 2
+
+            if current and (over_budget or at_heading):
+                chunks.append(self._build_chunk(text, current, current_tokens, len(chunks),
+                                                headings, page_offsets))
+                current = self._overlap_tail(current)
+                current_tokens = sum(s[2] for s in current)
+                # 重叠部分加上新片段超出预算时,从头部丢弃重叠片段
+                while current and current_tokens + seg_tokens > self.max_tokens:
+                    current_tokens -= current.pop(0)[2]
+
+            current.append(seg)
+            current_tokens += seg_tokens
+
+        if current:
+            chunks.append(self._build_chunk(text, current, current_tokens, len(chunks),
+                                            headings, page_offsets))
+
+        return chunks
+
+    def _split_segments(self, text: str, heading_starts: set) -> List[tuple]:
+        """
+        按句末符号和章节标题切分出最小片段
+        :return: 片段列表 [(start, end, tokens)]
+        """
+        boundaries = {0, len(text)}
+        boundaries.update(m.end() for m in _SENTENCE_END_PATTERN.finditer(text))
+        boundaries.update(heading_starts)
+        points = sorted(boundaries)
+
+        segments = []
+        for start, end in zip(points, points[1:]):
+            if start >= end:
+                continue
+            tokens = estimate_tokens(text[start:end])
+            if tokens <= self.max_tokens:
+                segments.append((start, end, tokens))
+            else:
+                segments.extend(self._hard_split(text, start, end, tokens))
+        return segments
+
+    def _hard_split(self, text: str, start: int, end: int, tokens: int) -> List[tuple]:
+        """
+        对超出预算的单个片段按字符窗口硬切分
+        :return: 片段列表 [(start, end, tokens)]
+        """
+        window = max(1, (end - start) * self.max_tokens // tokens)
+        pieces = []
+        pos = start
+        while pos < end:
+            piece_end = min(pos + window, end)
+            piece_tokens = estimate_tokens(text[pos:piece_end])
+            # 估算误差可能导致仍超预算,逐步收缩窗口
+            while piece_tokens > self.max_tokens and piece_end - pos > 1:
+                piece_end = pos + (piece_end - pos) * 9 // 10
+                piece_tokens = estimate_tokens(text[pos:piece_end])
+            pieces.append((pos, piece_end, piece_tokens))
+            pos = piece_end
+        return pieces
+
+    def _overlap_tail(self, segments: List[tuple]) -> List[tuple]:
+        """
+        取上一个块末尾不超过overlap_tokens的片段作为下一块的开头
+        """
+        tail = []
+        tokens = 0
+        for seg in reversed(segments):
+            if tokens + seg[2] > self.overlap_tokens:
+                break
+            tail.insert(0, seg)
+            tokens += seg[2]
+        # 不能把整个上一块都作为重叠,否则无法前进
+        if len(tail) == len(segments):
+            tail = tail[1:]
+        return tail
+
+    def _build_chunk(self, text: str, segments: List[tuple], tokens: int, index: int,
+                     headings: List[tuple], page_offsets: Optional[List[int]]) -> Dict:
+        """构造块字典"""
+        start = segments[0][0]
+        end = segments[-1][1]
+        return {
+            'index': index,
+            'text': text[start:end],
+            'start': start,
+            'end': end,
+            'tokens': tokens,
+            'page_start': self._page_at(start, page_offsets),
+            'page_end': self._page_at(max(end - 1, start), page_offsets),
+            'section': self._section_at(start, end, headings)
+        }
+
+    @staticmethod
+    def _page_at(offset: int, page_offsets: Optional[List[int]]) -> Optional[int]:
+        """根据字符偏移计算页码(从1开始)"""
+        if not page_offsets:
+            return None
+        return max(bisect.bisect_right(page_offsets, offset), 1)
+
+    @staticmethod
+    def _section_at(start: int, end: int, headings: List[tuple]) -> Optional[str]:
+        """
+        块所属章节: 块起点之前最近的标题;若块之前没有标题,取块内第一个标题
+        """
+        section = None
+        for pos, title in headings:
+            if pos <= start:
+                section = title
+            elif pos < end and section is None:
+                return title
+            else:
+                break
+        return section
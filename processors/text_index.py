@@ -0,0 +1,168 @@
+"""
+招标文件文本倒排索引
+以字符n-gram为键记录在文本中的位置,用于本地快速核验算法检查点的取值是否真实出现在原文中
+"""
+import bisect
+from array import array
+from collections import Counter
+from typing import Dict, List, Optional
+
+# 全角字符(！到～)与半角字符的偏移量
+_FULLWIDTH_OFFSET = 0xFEE0
+_FULLWIDTH_TABLE = {code: code - _FULLWIDTH_OFFSET for code in range(0xFF01, 0xFF5F)}
+_FULLWIDTH_TABLE[0x3000] = 0x20
+
+
+def normalize_char_text(text: str) -> str:
+    """
+    字符级规范化: 全角转半角、转小写,不改变字符数
+    :param text: 原始文本
+    :return: 规范化后的文本
+    """
+    return text.translate(_FULLWIDTH_TABLE).lower()
+
+
+class TextIndex:
+    """字符n-gram倒排索引"""
+
+    def __init__(self, text: str, n: int = 2, page_offsets: Optional[List[int]] = None):
+        """
+        构建索引(每份文档构建一次)
+        :param text: 文档文本
+        :param n: n-gram长度
+        :param page_offsets: 每页在文本中的起始字符偏移,用于定位页码
+        """
+        self.text = text
+        self.n = n
+        self.page_offsets = page_offsets
+
+        # 去除空白后的规范化文本,以及到原文偏移的映射
+        normalized = normalize_char_text(text)
+        self._offsets = array('i', (i for i, ch in enumerate(normalized) if not ch.isspace()))
+        self._normalized = ''.join(normalized[i] for i in self._offsets)
+
+        self._postings: Dict[str, array] = {}
+        for pos in range(len(self._normalized) - n + 1):
+            gram = self._normalized[pos:pos + n]
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array('i')
+            postings.append(pos)
+
+    def locate(self, value: str, max_hits: int = 5) -> List[Dict]:
+        """
+        精确定位取值在原文中的出现位置(忽略空白和全半角差异)
+        :param value: 待查找的文本
+        :param max_hits: 最多返回的位置数
+        :return: 位置列表,每个元素包含 start/end(原文偏移)和 page
+        """
+        query = self._normalize_query(value)
+        if not query:
+            return []
+
+        if len(query) < self.n:
+            starts = []
+            pos = self._normalized.find(query)
+            while pos >= 0 and len(starts) < max_hits:
+                starts.append(pos)
+                pos = self._normalized.find(query, pos + 1)
+        else:
+            # 用最稀有的n-gram生成候选,再逐一校验
+            grams = [query[i:i + self.n] for i in range(len(query) - self.n + 1)]
+            if any(gram not in self._postings for gram in grams):
+                return []
+            k, gram = min(enumerate(grams), key=lambda item: len(self._postings[item[1]]))
+            starts = []
+            for pos in self._postings[gram]:
+                start = pos - k
+                if start >= 0 and self._normalized.startswith(query, start):
+                    starts.append(start)
+                    if len(starts) >= max_hits:
+                        break
+
+        return [self._hit(start, len(query)) for start in starts]
+
+    def match_ratio(self, value: str) -> Dict:
+        """
+        模糊匹配: 计算取值的n-gram在原文同一位置附近出现的最大比例
+        :param value: 待查找的文本
+        :return: {'ratio': 0~1, 'start', 'end', 'page'},无任何匹配时位置为None
+        """
+        query = self._normalize_query(value)
+        grams = [query[i:i + self.n] for i in range(len(query) - self.n + 1)]
+        if not grams:
+            hits = self.locate(value, max_hits=1)
+            return dict(hits[0], ratio=1.0) if hits else {'ratio': 0.0, 'start': None, 'end': None, 'page': None}
+
+        # 每个n-gram为其对应的候选起点投票
+        votes = Counter()
+        for k, gram in enumerate(grams):
+            for pos in self._postings.get(gram, ()):
+                votes[pos - k] += 1
+
+        if not votes:
+            return {'ratio': 0.0, 'start': None, 'end': None, 'page': None}
+
+        # 原文中的插入/删除会让后续n-gram的起点发生少量偏移,按滑动窗口合并邻近起点的票数
+        slack = max(2, len(query) // 5)
+        starts = sorted(votes)
+        best_start, best_count = starts[0], 0
+        window_count = 0
+        left = 0
+        for start in starts:
+            window_count += votes[start]
+            while starts[left] < start - 2 * slack:
+                window_count -= votes[starts[left]]
+                left += 1
+            if window_count > best_count:
+                best_start, best_count = starts[left], window_count
+
+        start = max(best_start, 0)
+        hit = self._hit(start, min(len(query), len(self._normalized) - start))
+        hit['ratio'] = round(min(best_count / len(grams), 1.0), 4)
+        return hit
+
+    def verify_checkpoints(self, checkpoints: List[Dict], min_ratio: float = 0.8) -> List[Dict]:
+        """
+        核验检查点取值是否出现在原文中
+        只核验取值(算法检查点的 value,参考答案格式的检查点为 content),不退回到 label:
+        标签几乎总能在原文中找到,会虚高有依据的比例;取值为空的检查点记为无依据
+        :param checkpoints: 检查点列表
+        :param min_ratio: 模糊匹配判定为有依据的最低比例
+        :return: 核验结果列表,每个元素包含 id/value/grounded/match_ratio/start/page/location
+        """
+        results = []
+        for cp in checkpoints:
+            value = cp.get('value') if 'value' in cp else cp.get('content')
+            value = str(value) if value else ''
+            match = {'ratio': 0.0, 'start': None, 'end': None, 'page': None}
+            if value:
+                hits = self.locate(value, max_hits=1)
+                match = dict(hits[0], ratio=1.0) if hits else self.match_ratio(value)
+
+            results.append({
+                'id': cp.get('id'),
+                'value': value,
+                'grounded': bool(value) and match['ratio'] >= min_ratio,
+                'match_ratio': match['ratio'],
+                'start': match['start'],
+                'page': match['page'],
+                'location': cp.get('location')
+            })
+        return results
+
+    def _normalize_query(self, value: str) -> str:
+        """按与索引相同的规则规范化查询文本"""
+        return ''.join(normalize_char_text(value or '').split())
+
+    def _hit(self, start: int, length: int) -> Dict:
+        """将规范化文本中的位置转换为原文位置"""
+        original_start = self._offsets[start]
+        original_end = self._offsets[start + length - 1] + 1 if length > 0 else original_start
+        return {'start': original_start, 'end': original_end, 'page': self._page_at(original_start)}
+
+    def _page_at(self, offset: int) -> Optional[int]:
+        """根据原文偏移计算页码(从1开始)"""
+        if not self.page_offsets:
+            return None
+        return max(bisect.bisect_right(self.page_offsets, offset), 1)
@@ -0,0 +1,123 @@
+"""
+检查点分词
+中文检查点按空格分词通常整句是一个"词",Jaccard相似度几乎为0;这里先做NFKC规范化(全角转半角)、
+标点替换为空格,中文按字符n-gram切分(可选使用jieba和本地词典分词),英文和数字按连续串切分,
+分词结果按文本缓存,同一检查点在各项指标中只分词一次
+"""
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Optional
+
+try:
+    import jieba
+    HAS_JIEBA = True
+except ImportError:
+    HAS_JIEBA = False
+
+# 数字中的小数点、千分位、时间冒号和百分号保留,其余标点和符号替换为空格
+_PUNCT = re.compile(r'(?:[^\w%.,:·]|(?<!\d)[.,:]|[.,:](?!\d)|_)+')
+# 中日韩统一表意文字(含扩展A和兼容区)
+_CJK_RANGE = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_RUNS = re.compile(f'[{_CJK_RANGE}]+|[^\\s{_CJK_RANGE}]+')
+_CJK = re.compile(f'[{_CJK_RANGE}]')
+
+
+def normalize_text(text: str) -> str:
+    """
+    规范化: NFKC(全角转半角)、转小写、标点替换为空格并合并连续空白
+    :param text: 原始文本
+    :return: 规范化后的文本
+    """
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    return ' '.join(_PUNCT.sub(' ', text).split())
+
+
+def compact_text(text: str) -> str:
+    """规范化并去掉空白,用作精确匹配的键(忽略标点、空白和全半角差异)"""
+    return normalize_text(text).replace(' ', '')
+
+
+class CheckpointTokenizer:
+    """检查点分词器,分词结果按文本缓存"""
+
+    def __init__(self, ngram: int = 2, use_jieba: bool = False, user_dict: Optional[str] = None,
+                 cache_size: int = 50000):
+        """
+        :param ngram: 中文字符n-gram长度(不足n个字的片段整体作为一个词)
+        :param use_jieba: 是否使用jieba分词(未安装时退回字符n-gram)
+        :param user_dict: jieba本地词典路径(行业术语,如"投标保证金")
+        :param cache_size: 缓存的文本数上限
+        """
+        self.ngram = ngram
+        self.use_jieba = use_jieba and HAS_JIEBA
+        if use_jieba and not HAS_JIEBA:
+            print("[WARNING] 未安装jieba,使用字符n-gram分词")
+        if self.use_jieba and user_dict:
+            jieba.load_userdict(user_dict)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, FrozenSet[str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def tokens(self, text: str) -> FrozenSet[str]:
+        """
+        文本的词集合
+        :param text: 原始文本
+        :return: 词集合(不可变,可在多个指标间共享)
+        """
+        text = text or ''
+        with self._lock:
+            cached = self._cache.get(text)
+            if cached is not None:
+                self._cache.move_to_end(text)
+                return cached
+
+        tokens = frozenset(self._tokenize(normalize_text(text)))
+        with self._lock:
+            self._cache[text] = tokens
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def checkpoint_tokens(self, checkpoint: Dict, *fields: str) -> FrozenSet[str]:
+        """
+        检查点的词集合
+        :param checkpoint: 检查点
+        :param fields: 参与分词的字段,默认 content
+        :return: 词集合
+        """
+        return self.tokens(' '.join(str(checkpoint.get(field) or '') for field in fields or ('content',)))
+
+    def similarity(self, text1: str, text2: str) -> float:
+        """两段文本的Jaccard相似度"""
+        tokens1, tokens2 = self.tokens(text1), self.tokens(text2)
+        if not tokens1 or not tokens2:
+            return 0.0
+        intersection = len(tokens1 & tokens2)
+        return intersection / (len(tokens1) + len(tokens2) - intersection)
+
+    def _tokenize(self, text: str):
+        for run in _RUNS.findall(text):
+            if not _CJK.match(run):
+                yield run
+            elif self.use_jieba:
+                yield from (word for word in jieba.lcut(run) if word.strip())
+            elif len(run) <= self.ngram:
+                yield run
+            else:
+                for i in range(len(run) - self.ngram + 1):
+                    yield run[i:i + self.ngram]
+
+
+_default_tokenizer = None
+_default_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer() -> CheckpointTokenizer:
+    """获取进程内共享的分词器(共享缓存)"""
+    global _default_tokenizer
+    with _default_tokenizer_lock:
+        if _default_tokenizer is None:
+            _default_tokenizer = CheckpointTokenizer()
+        return _default_tokenizer
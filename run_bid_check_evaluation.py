@@ -2,7 +2,6 @@
 招标文件检查工作流评估运行脚本
 从测试工作流响应中提取数据并运行评估
 """
-import json
 import os
 import sys
 import yaml
@@ -12,6 +11,7 @@ from datetime import datetime
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from bid_check_evaluation import BidCheckEvaluator
+from utils import results_store
 
 
 def load_test_workflow_config():
@@ -29,7 +29,7 @@ def load_test_workflow_config():
 
 def find_latest_response(response_type: str) -> dict:
     """
-    查找最新的响应文件
+    查找最新的响应(结果库中没有时读取旧版响应文件)
 
     Args:
         response_type: 'check_point' 或 'bid_info'
@@ -37,33 +37,12 @@ def find_latest_response(response_type: str) -> dict:
     Returns:
         响应数据字典
     """
-    responses_dir = './test_data/evaluation/responses'
-
-    if not os.path.exists(responses_dir):
-        print(f"❌ 响应目录不存在: {responses_dir}")
-        print("请先运行测试并保存响应数据")
-        return None
-
-    # 查找匹配的文件
-    files = [
-        f for f in os.listdir(responses_dir)
-        if f.startswith(f'{response_type}_response_') and f.endswith('.json')
-    ]
-
-    if not files:
-        print(f"❌ 未找到 {response_type} 响应文件")
+    response = results_store.find_latest_response(response_type)
+    if response is None:
+        print(f"❌ 未找到 {response_type} 响应")
         test_num = 5 if response_type == "check_point" else 6
         print(f"请运行test_0{test_num}_* 并保存响应")
-        return None
-
-    # 按时间排序，取最新的
-    files.sort(reverse=True)
-    latest_file = os.path.join(responses_dir, files[0])
-
-    print(f"✓ 找到最新响应文件: {files[0]}")
-
-    with open(latest_file, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return response
 
 
 def run_evaluation_demo():
@@ -172,7 +151,7 @@ def run_evaluation_demo():
 提示:
   1. 请先运行测试工作流: pytest test_cases/workflows/test_bid_check_workflow.py -v -s
   2. 确保test_05和test_06已执行并有响应数据
-  3. 响应数据会自动保存到 ./test_data/evaluation/responses/
+  3. 响应数据会自动保存到结果库 ./test_data/evaluation/results.sqlite
   4. 然后重新运行此评估脚本
         """)
 
@@ -182,23 +161,9 @@ def save_response_from_test():
     从测试工作流保存响应的辅助函数
     在test_bid_check_workflow.py中调用
     """
-    def save_response(response_type: str, response_data: dict):
-        """保存响应数据"""
-        import json
-        from datetime import datetime
-
-        output_dir = './test_data/evaluation/responses'
-        os.makedirs(output_dir, exist_ok=True)
-
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{response_type}_response_{timestamp}.json"
-        filepath = os.path.join(output_dir, filename)
-
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(response_data, f, ensure_ascii=False, indent=2)
-
-        print(f"✓ 响应已保存到: {filepath}")
-        return filepath
+    def save_response(response_type: str, response_data: dict, document: str = 'unknown'):
+        """保存响应数据到结果库"""
+        return results_store.save_response(response_type, response_data, document)
 
     return save_response
 
@@ -3,14 +3,17 @@
 """
 import json
 import os
+import time
 import pytest
 from pathlib import Path
 
 from bid_evaluation_pipeline import BidParserEvaluationPipeline, load_config
 from processors.document_processor import DocumentProcessor
 from api_clients.claude_client import ClaudeClient
+from api_clients.usage_tracker import BudgetExceededError
 from api_clients.algorithm_client import AlgorithmClient
 from evaluators.claude_evaluator import ClaudeEvaluator
+from processors.bm25_index import candidate_pairs
 
 
 class TestBidParserEvaluation:
@@ -182,6 +185,226 @@ class TestBidParserEvaluation:
         documents = pipeline.document_processor.load_batch(str(tmp_path), "*.txt")
         assert len(documents) == 3
 
+    def test_near_duplicate_reuses_reference(self, tmp_path, monkeypatch):
+        """测试近似重复的修订版本复用参考答案和评估结果"""
+        pipeline = BidParserEvaluationPipeline({
+            'claude_api_key': '',
+            'output_dir': str(tmp_path / "output"),
+            'dedup_threshold': 0.8
+        })
+        tender = "".join(f"第{i}条 投标人须具备信息系统集成资质,保证金{i}万元。" for i in range(100))
+        (tmp_path / "tender_v1.txt").write_text(tender, encoding='utf-8')
+        (tmp_path / "tender_v2.txt").write_text(tender + "补充:开标时间不变。", encoding='utf-8')
+
+        algorithm_checkpoints = [{"id": "1", "category": "资质", "content": "信息系统集成资质", "importance": "高"}]
+        llm_calls = []
+        monkeypatch.setattr(pipeline.algorithm_client, 'parse_bid_document',
+                            lambda document_id: algorithm_checkpoints)
+        monkeypatch.setattr(pipeline.claude_client, 'generate_reference_checkpoints',
+                            lambda text: llm_calls.append('reference') or list(algorithm_checkpoints))
+        monkeypatch.setattr(pipeline.claude_client, 'evaluate_checkpoints',
+                            lambda **kwargs: llm_calls.append('evaluate') or {'overall_score': 90})
+
+        first = pipeline.evaluate_single_document(str(tmp_path / "tender_v1.txt"), document_id="1")
+        second = pipeline.evaluate_single_document(str(tmp_path / "tender_v2.txt"), document_id="2")
+
+        assert llm_calls == ['reference', 'evaluate']
+        assert second['overall_score'] == first['overall_score']
+        assert second['metadata']['duplicate_of']['path'].endswith("tender_v1.txt")
+
+    def test_near_duplicate_requires_same_evaluator(self, tmp_path, monkeypatch):
+        """测试重新评估同一文档不复用自身结果,评估配置变化后不复用近似重复文档的评估结果"""
+        tender = "".join(f"第{i}条 投标人须具备信息系统集成资质,保证金{i}万元。" for i in range(100))
+        (tmp_path / "tender_v1.txt").write_text(tender, encoding='utf-8')
+        (tmp_path / "tender_v2.txt").write_text(tender + "补充:开标时间不变。", encoding='utf-8')
+        algorithm_checkpoints = [{"id": "1", "category": "资质", "content": "信息系统集成资质", "importance": "高"}]
+        llm_calls = []
+
+        def make_pipeline(match_threshold):
+            pipeline = BidParserEvaluationPipeline({
+                'claude_api_key': '',
+                'output_dir': str(tmp_path / "output"),
+                'dedup_threshold': 0.8,
+                'local_match_threshold': match_threshold
+            })
+            monkeypatch.setattr(pipeline.algorithm_client, 'parse_bid_document',
+                                lambda document_id: algorithm_checkpoints)
+            monkeypatch.setattr(pipeline.claude_client, 'generate_reference_checkpoints',
+                                lambda text: llm_calls.append('reference') or list(algorithm_checkpoints))
+            monkeypatch.setattr(pipeline.claude_client, 'evaluate_checkpoints',
+                                lambda **kwargs: llm_calls.append('evaluate') or {'overall_score': 90})
+            return pipeline
+
+        pipeline = make_pipeline(0.5)
+        pipeline.evaluate_single_document(str(tmp_path / "tender_v1.txt"), document_id="1")
+        again = pipeline.evaluate_single_document(str(tmp_path / "tender_v1.txt"), document_id="1")
+        assert llm_calls == ['reference', 'evaluate', 'reference', 'evaluate']
+        assert again['metadata']['duplicate_of'] is None
+
+        llm_calls.clear()
+        make_pipeline(0.7).evaluate_single_document(str(tmp_path / "tender_v2.txt"), document_id="2")
+        assert llm_calls == ['evaluate']
+
+    def test_concurrent_batch_evaluation(self, tmp_path, monkeypatch):
+        """测试并发批量评估: 结果顺序与输入一致,单个文档失败不影响其他文档"""
+        pipeline = BidParserEvaluationPipeline({
+            'claude_api_key': '',
+            'output_dir': str(tmp_path / "output"),
+            'enable_dedup': False
+        })
+        documents = []
+        for i in range(6):
+            doc_file = tmp_path / f"tender_{i}.txt"
+            doc_file.write_text(f"项目{i} 投标人须具备信息系统集成资质", encoding='utf-8')
+            documents.append({'path': str(doc_file), 'document_id': str(i)})
+
+        def parse_bid_document(document_id):
+            time.sleep(0.2)
+            if document_id == '3':
+                raise RuntimeError("算法接口超时")
+            return [{"id": "1", "category": "资质", "content": f"项目{document_id}资质", "importance": "高"}]
+
+        def evaluate_checkpoints(**kwargs):
+            time.sleep(0.2)
+            return {'overall_score': 80 + int(kwargs['algorithm_output'][0]['content'][2])}
+
+        monkeypatch.setattr(pipeline.algorithm_client, 'parse_bid_document', parse_bid_document)
+        monkeypatch.setattr(pipeline.claude_client, 'generate_reference_checkpoints',
+                            lambda text: [{"id": "1", "category": "资质", "content": "资质", "importance": "高"}])
+        monkeypatch.setattr(pipeline.claude_client, 'evaluate_checkpoints', evaluate_checkpoints)
+
+        start = time.perf_counter()
+        results = pipeline.evaluate_batch(documents, max_concurrent=6)
+        elapsed = time.perf_counter() - start
+
+        assert elapsed < 6 * 0.4
+        assert [r.get('overall_score') for r in results] == [80, 81, 82, None, 84, 85]
+        assert 'error' in results[3]
+        saved = sorted(path.name for path in (tmp_path / "output").glob("tender_*_result.json"))
+        assert saved == [f"tender_{i}_result.json" for i in (0, 1, 2, 4, 5)]
+
+    def test_concurrent_batch_budget_stop_returns_prefix(self, tmp_path, monkeypatch):
+        """测试并发批量评估超出预算中止时,返回结果与输入文档的前缀逐项对应"""
+        pipeline = BidParserEvaluationPipeline({
+            'claude_api_key': '',
+            'output_dir': str(tmp_path / "output"),
+            'enable_dedup': False,
+            'enable_journal': False
+        })
+        documents = [{'path': str(tmp_path / f"tender_{i}.txt")} for i in range(4)]
+
+        def evaluate_single_document(document_path, document_id=None, fingerprint=None):
+            if document_path.endswith("tender_1.txt"):
+                raise BudgetExceededError("超出Token预算")
+            time.sleep(0.1)
+            return {'overall_score': 80, 'path': document_path}
+
+        monkeypatch.setattr(pipeline, 'evaluate_single_document', evaluate_single_document)
+        results = pipeline.evaluate_batch(documents, max_concurrent=2)
+
+        assert [r['path'] for r in results] == [documents[0]['path']]
+
+    def test_local_statistics_fuzzy_match(self):
+        """测试本地统计按内容相似度匹配,表述略有差异的检查点也计为匹配,且不调用大模型"""
+        evaluator = ClaudeEvaluator(claude_client=None, match_threshold=0.5)
+        algorithm_checkpoints = [
+            {"content": "投标人须具备信息系统集成二级资质"},
+            {"content": "投标截止时间：2024年6月30日"},
+            {"content": "投标截止时间: 2024年6月30日"},
+            {"content": "付款方式为验收后一次性支付"}
+        ]
+        reference_checkpoints = [
+            {"content": "投标人应具备信息系统集成二级及以上资质"},
+            {"content": "投标截止时间为2024年6月30日"},
+            {"content": "投标保证金人民币5万元"}
+        ]
+
+        stats = evaluator._calculate_statistics(algorithm_checkpoints, reference_checkpoints)
+
+        assert stats['total_algorithm_checkpoints'] == 3
+        assert stats['total_reference_checkpoints'] == 3
+        assert stats['matched_checkpoints'] == 2
+        assert (stats['precision'], stats['recall'], stats['f1_score']) == (66.67, 66.67, 66.67)
+
+    def test_bm25_candidate_pairs(self):
+        """测试BM25按标签和取值检索参考检查点候选,没有共同词的算法检查点没有候选"""
+        algorithm_checkpoints = [
+            {"label": "投标保证金", "value": "人民币5万元"},
+            {"label": "投标截止时间", "value": "2024年6月30日17:00"},
+            {"label": "联系电话", "value": "13800138000"}
+        ]
+        reference_checkpoints = [
+            {"category": "时间节点", "content": "投标截止时间为2024年6月30日17:00"},
+            {"category": "保证金", "content": "投标保证金人民币5万元"},
+            {"category": "资质要求", "content": "投标人须具备信息系统集成资质"}
+        ]
+
+        candidates = candidate_pairs(algorithm_checkpoints, reference_checkpoints, top_k=2)
+
+        assert candidates[0][0][0] == 1
+        assert candidates[1][0][0] == 0
+        assert all(len(row) <= 2 for row in candidates)
+        assert candidates[2] == []
+
+    def test_pair_judging_compact_batches(self, monkeypatch):
+        """测试候选对评估: 分批发送紧凑的候选对,按判断结果在本地统计评分"""
+        client = ClaudeClient('')
+        algorithm_checkpoints = [{"label": f"条款{i}", "value": f"内容{i}号"} for i in range(5)]
+        algorithm_checkpoints.append({"label": "签章要求", "value": "加盖公章"})
+        reference_checkpoints = [{"category": "条款", "content": f"条款{i} 内容{i}号"} for i in range(6)]
+        prompts = []
+
+        def create_message(payload, timeout=60):
+            prompt = payload['messages'][0]['content']
+            prompts.append(prompt)
+            judgements = []
+            for i in range(5):
+                if f"A{i + 1} " in prompt:
+                    verdict = 'incorrect' if i == 4 else 'correct'
+                    judgements.append({"algorithm": f"A{i + 1}", "reference": f"R{i + 1}", "verdict": verdict,
+                                       "reason": "编号错误" if i == 4 else ""})
+            return {"content": [{"text": json.dumps({"judgements": judgements}, ensure_ascii=False)}]}
+
+        monkeypatch.setattr(client, 'create_message', create_message)
+        result = client.judge_checkpoint_pairs("招标文件", algorithm_checkpoints, reference_checkpoints,
+                                               top_k=2, batch_size=2)
+
+        # 签章要求没有候选,不发送给大模型
+        assert len(prompts) == 3
+        assert all('签章要求' not in prompt and '"content"' not in prompt for prompt in prompts)
+        full_prompt = client.build_evaluation_payload(
+            "招标文件", algorithm_checkpoints, reference_checkpoints)['messages'][0]['content']
+        assert sum(len(prompt) for prompt in prompts) < len(full_prompt)
+
+        assert (result['completeness_score'], result['accuracy_score'], result['consistency_score']) == (83, 80, 67)
+        assert [cp['expected_content'] for cp in result['missing_checkpoints']] == ["条款5 内容5号"]
+        assert result['incorrect_checkpoints'][0]['reason'] == "编号错误"
+        assert result['pair_judgements'][5]['verdict'] == 'unmatched'
+
+
+    def test_pair_judging_keeps_partial_judgements(self, monkeypatch):
+        """测试候选对评估: 单批失败时保留其他批次的判断,同一参考检查点只对应一个算法检查点"""
+        client = ClaudeClient('')
+        algorithm_checkpoints = [{"label": "保证金", "value": "10万元"}, {"label": "保证金", "value": "10万元整"},
+                                 {"label": "工期", "value": "180日历天"}]
+        reference_checkpoints = [{"category": "保证金", "content": "保证金 10万元"},
+                                 {"category": "工期", "content": "工期 180日历天"}]
+
+        def create_message(payload, timeout=60):
+            prompt = payload['messages'][0]['content']
+            if "A3 " in prompt:
+                raise RuntimeError("连接中断")
+            judgements = [{"algorithm": f"A{i}", "reference": "R1", "verdict": "correct"} for i in (1, 2)]
+            return {"content": [{"text": json.dumps({"judgements": judgements})}]}
+
+        monkeypatch.setattr(client, 'create_message', create_message)
+        result = client.judge_checkpoint_pairs("招标文件", algorithm_checkpoints, reference_checkpoints,
+                                               top_k=1, batch_size=2)
+
+        assert result['batch_errors'] == [{'algorithm': [2], 'error': "连接中断"}]
+        assert 'error' in result
+        assert [j['verdict'] for j in result['pair_judgements']] == ['correct', 'unmatched', 'error']
+        assert (result['completeness_score'], result['accuracy_score'], result['consistency_score']) == (50, 100, 33)
 
 class TestBidParserEvaluationIntegration:
     """集成测试:完整的评估流程"""
@@ -0,0 +1,155 @@
+"""
+Claude流式响应与JSON提取测试用例
+"""
+import json
+
+import pytest
+
+from api_clients.claude_client import ClaudeClient
+from api_clients.json_stream import IncrementalJSONArrayParser, extract_json
+from api_clients.llm_cache import LLMResponseCache
+
+
+class FakeStreamResponse:
+    """模拟SSE流式响应"""
+
+    def __init__(self, lines):
+        self._lines = lines
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self, decode_unicode=False):
+        return iter(self._lines)
+
+    def close(self):
+        self.closed = True
+
+
+def sse_lines(text_chunks, output_tokens):
+    """按Claude流式协议构造事件行"""
+    events = [{'type': 'message_start',
+               'message': {'id': 'msg_1', 'model': 'm', 'usage': {'input_tokens': 12, 'output_tokens': 1}}}]
+    events += [{'type': 'content_block_delta', 'index': 0, 'delta': {'type': 'text_delta', 'text': chunk}}
+               for chunk in text_chunks]
+    events += [{'type': 'message_delta', 'delta': {'stop_reason': 'end_turn'},
+                'usage': {'output_tokens': output_tokens}},
+               {'type': 'message_stop'}]
+    lines = []
+    for event in events:
+        lines += [f"event: {event['type']}", f"data: {json.dumps(event, ensure_ascii=False)}", ""]
+    return lines
+
+
+class TestIncrementalJSONArrayParser:
+    """增量JSON解析测试"""
+
+    def test_emits_each_completed_item(self):
+        """测试逐字符输入时每个检查点完整即返回,忽略说明文字和字符串中的括号"""
+        text = ('以下是结果:\n```json\n{"summary": "含{括号", "checkpoints": ['
+                '{"id": "1", "content": "含\\"引号\\"和}括号", "tags": ["a"]}, '
+                '{"id": "2", "content": "保证金"}], "other": [{"id": "x"}]}\n```')
+        parser = IncrementalJSONArrayParser('checkpoints')
+        emitted = []
+        for char in text:
+            emitted += parser.feed(char)
+
+        assert [item['id'] for item in emitted] == ['1', '2']
+        assert emitted[0]['content'] == '含"引号"和}括号'
+
+    def test_top_level_array(self):
+        """测试解析顶层数组"""
+        parser = IncrementalJSONArrayParser(None)
+
+        assert parser.feed('[{"a": 1}, {"b"') == [{'a': 1}]
+        assert parser.feed(': [2]}]') == [{'b': [2]}]
+
+
+class TestExtractJSON:
+    """大模型输出JSON提取测试"""
+
+    def test_fenced_block_with_prose(self):
+        """测试代码块、前后说明文字和说明文字中的括号"""
+        text = ('输出格式{见下}:\n```json\n{"checkpoints": [{"id": "1", "content": "含}括号"}]}\n```\n'
+                '以上共1个检查点。如有疑问{请联系}')
+        result = extract_json(text, 'checkpoints')
+
+        assert result.complete
+        assert result.data == {'checkpoints': [{'id': '1', 'content': '含}括号'}]}
+
+    def test_truncated_output_keeps_complete_items(self):
+        """测试截断的输出只恢复完整的数组元素,并报告丢弃的内容"""
+        text = ('{"checkpoints": [{"id": "1", "content": "保证金"}, {"id": "2", "content": "工期"}, '
+                '{"id": "3", "content": "资质要')
+        result = extract_json(text, 'checkpoints')
+
+        assert not result.complete
+        assert [cp['id'] for cp in result.data['checkpoints']] == ['1', '2']
+        assert result.salvaged_items == 2
+        assert result.dropped_text.startswith('{"id": "3"')
+        assert '恢复了 2 项' in result.describe()
+
+    def test_truncated_object_keeps_complete_fields(self):
+        """测试截断的评估结果保留已完整的字段"""
+        result = extract_json('{"overall_score": 85, "completeness_score": 80, "suggestions": ["a", "b"], "summ')
+
+        assert result.data == {'overall_score': 85, 'completeness_score': 80, 'suggestions': ['a', 'b']}
+
+    def test_unrecoverable(self):
+        """测试没有JSON或没有任何完整条目时返回失败原因"""
+        assert extract_json('无法完成该任务').error == "未找到JSON"
+        assert extract_json('{"checkpoints": [{"id": "1", "con', 'checkpoints').data is None
+        assert extract_json('').data is None
+
+    def test_claude_client_salvages_truncated_reference(self):
+        """测试参考答案因 max_tokens 截断时仍返回已完整的检查点"""
+        client = ClaudeClient(api_key="test", cache=object())
+        response = {"content": [{"text": '```json\n{"checkpoints": [{"id": "1", "content": "保证金"}, {"id": "2", '}],
+                    "stop_reason": "max_tokens"}
+
+        assert client._parse_checkpoints_response(response) == [{'id': '1', 'content': '保证金'}]
+        assert client._parse_evaluation_response({"content": [{"text": "抱歉"}]}) == {"error": "解析失败"}
+
+
+class TestClaudeStream:
+    """流式调用测试"""
+
+    @pytest.fixture()
+    def cache(self, tmp_path):
+        cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite"))
+        yield cache
+        cache.close()
+
+    def test_stream_assembles_response_and_metrics(self, cache, monkeypatch):
+        """测试流式响应组装为完整响应,记录首Token延迟和生成速度,并边生成边回调检查点"""
+        client = ClaudeClient(api_key="test", cache=cache, stream=True)
+        chunks = ['{"checkpoints": [{"id": "1", "con', 'tent": "保证金10万元"}, ',
+                  '{"id": "2", "content": "工期180天"}]}']
+        requests_sent = []
+        monkeypatch.setattr(client.session, 'post', lambda *args, **kwargs: requests_sent.append(kwargs)
+                            or FakeStreamResponse(sse_lines(chunks, 30)))
+        received = []
+
+        checkpoints = client.generate_reference_checkpoints("投标保证金:10万元", on_checkpoint=received.append)
+
+        assert requests_sent[0]['stream'] is True and requests_sent[0]['json']['stream'] is True
+        assert [c['id'] for c in received] == ['1', '2']
+        assert checkpoints == received
+        assert client.last_stream_metrics['output_tokens'] == 30
+        assert client.last_stream_metrics['time_to_first_token'] is not None
+
+    def test_stream_result_cached(self, cache, monkeypatch):
+        """测试流式响应写入缓存,再次调用不请求API"""
+        client = ClaudeClient(api_key="test", cache=cache)
+        calls = []
+        monkeypatch.setattr(client.session, 'post', lambda *args, **kwargs: calls.append(1)
+                            or FakeStreamResponse(sse_lines(['你好'], 2)))
+        payload = {'model': 'm', 'max_tokens': 10, 'messages': [{'role': 'user', 'content': '问候'}]}
+
+        first = client.stream_message(payload)
+        second = client.stream_message(payload)
+
+        assert first['content'][0]['text'] == second['content'][0]['text'] == '你好'
+        assert first['usage'] == {'input_tokens': 12, 'output_tokens': 2}
+        assert len(calls) == 1
@@ -0,0 +1,423 @@
+"""
+文档处理器测试用例
+"""
+import pytest
+
+from processors.document_processor import DocumentProcessor
+from processors import checkpoint_alignment
+from processors.checkpoint_alignment import align_checkpoints
+from processors.checkpoint_merger import merge_checkpoints
+from processors.docx_stream import iter_docx_blocks
+from processors.fingerprint import NearDuplicateIndex
+from processors.similarity_matrix import HAS_SCIPY, SimilarityMatrix
+from processors.text_chunker import TextChunker, estimate_tokens
+from processors.text_index import TextIndex
+from processors.tokenizer import CheckpointTokenizer, compact_text, normalize_text
+
+
+class TestTextChunker:
+    """Token预算分块测试"""
+
+    @pytest.fixture(scope="class")
+    def document_processor(self):
+        """文档处理器"""
+        return DocumentProcessor()
+
+    def test_estimate_tokens(self):
+        """测试中文与英文的Token估算"""
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("招标文件") == 4
+        assert estimate_tokens("abcdefgh") == 2
+        assert estimate_tokens("投标 bond") == 3
+
+    def test_chunks_respect_budget_and_cover_text(self, document_processor):
+        """测试每块不超预算,且所有内容都被覆盖"""
+        sentence = "投标人须具备信息系统集成二级资质。"
+        text = sentence * 200
+
+        chunks = document_processor.chunk_text(text, max_tokens=100, overlap_tokens=20)
+
+        assert len(chunks) > 1
+        assert all(chunk['tokens'] <= 100 for chunk in chunks)
+        assert chunks[0]['start'] == 0
+        assert chunks[-1]['end'] == len(text)
+        for prev, curr in zip(chunks, chunks[1:]):
+            # 相邻块首尾相接或重叠,不会漏掉内容
+            assert curr['start'] <= prev['end']
+            assert curr['start'] > prev['start']
+
+    def test_chunks_split_on_sentence_boundary(self, document_processor):
+        """测试块在句末断开,不会截断句子"""
+        text = "第一章 总则 本项目为智慧校园建设。" + "投标截止时间为2024年6月30日。" * 50
+
+        chunks = document_processor.chunk_text(text, max_tokens=80, overlap_tokens=0)
+
+        for chunk in chunks[:-1]:
+            assert chunk['text'].endswith("。")
+
+    def test_chunk_metadata(self):
+        """测试块附带页码和章节信息"""
+        page1 = "第一章 招标公告 " + "本项目采用公开招标方式。" * 10
+        page2 = "第二章 评标办法 " + "评标采用综合评分法。" * 10
+        text = page1 + " " + page2
+        page_offsets = [0, len(page1) + 1]
+
+        chunks = TextChunker(max_tokens=60, overlap_tokens=0).chunk(text, page_offsets)
+
+        assert chunks[0]['page_start'] == 1
+        assert chunks[0]['section'].startswith("第一章")
+        assert chunks[-1]['page_end'] == 2
+        assert chunks[-1]['section'].startswith("第二章")
+
+    def test_oversized_sentence_is_hard_split(self):
+        """测试没有边界的超长片段被硬切分"""
+        text = "甲" * 1000
+
+        chunks = TextChunker(max_tokens=100, overlap_tokens=10).chunk(text)
+
+        assert all(chunk['tokens'] <= 100 for chunk in chunks)
+        assert chunks[-1]['end'] == len(text)
+
+    def test_invalid_budget(self):
+        """测试非法的预算参数"""
+        with pytest.raises(ValueError):
+            TextChunker(max_tokens=100, overlap_tokens=100)
+
+
+class TestStreamingTextLoading:
+    """大文本流式加载测试"""
+
+    @pytest.fixture(scope="class")
+    def document_processor(self):
+        """文档处理器"""
+        return DocumentProcessor()
+
+    @pytest.mark.parametrize("encoding", ['utf-8', 'gbk', 'utf-8-sig', 'utf-16'])
+    def test_load_txt_detects_encoding(self, document_processor, tmp_path, encoding):
+        """测试按前缀采样探测编码"""
+        test_file = tmp_path / f"bid_{encoding}.txt"
+        test_file.write_text("招标项目：智慧校园建设\n保证金：10万元", encoding=encoding)
+
+        content = document_processor.load_and_preprocess(str(test_file))
+
+        assert content == "招标项目：智慧校园建设 保证金：10万元"
+
+    def test_load_empty_txt(self, document_processor, tmp_path):
+        """测试空文件"""
+        test_file = tmp_path / "empty.txt"
+        test_file.write_bytes(b"")
+
+        assert document_processor.load_and_preprocess(str(test_file)) == ""
+
+    def test_load_txt_across_chunks(self, document_processor, tmp_path, monkeypatch):
+        """测试多字节字符和空白跨越块边界时结果不变"""
+        import processors.document_processor as module
+        monkeypatch.setattr(module, 'STREAM_CHUNK_SIZE', 7)
+
+        text = "  第一章\t总则 \n\n 投标人  须具备　资质。 \n" * 20
+        test_file = tmp_path / "chunked.txt"
+        test_file.write_text(text, encoding='utf-8')
+
+        content = document_processor.load_and_preprocess(str(test_file))
+
+        assert content == ' '.join(text.split())
+
+    def test_clean_text_matches_split_join(self, document_processor, monkeypatch):
+        """测试流式清理与原有清理逻辑结果一致"""
+        import processors.document_processor as module
+        monkeypatch.setattr(module, 'STREAM_CHUNK_SIZE', 3)
+
+        for text in ["", "   ", "a", " a b ", "ab  cd\n\nef", "\tx\x0cy  z\n"]:
+            assert document_processor._clean_text(text) == ' '.join(text.split())
+
+
+class TestDocxStreaming:
+    """Word文档流式解析测试"""
+
+    @pytest.fixture()
+    def bid_docx(self, tmp_path):
+        """生成包含标题、段落和评分表的投标文件"""
+        docx = pytest.importorskip("docx")
+        doc = docx.Document()
+        doc.add_heading("第一章 评分标准", level=1)
+        doc.add_paragraph("评标采用综合评分法。")
+        table = doc.add_table(rows=2, cols=2)
+        table.rows[0].cells[0].text = "评分项"
+        table.rows[0].cells[1].text = "分值"
+        table.rows[1].cells[0].text = "企业业绩"
+        table.rows[1].cells[1].text = "8分"
+        doc.add_heading("1.1 人员要求", level=2)
+        file_path = tmp_path / "bid.docx"
+        doc.save(str(file_path))
+        return file_path
+
+    def test_blocks_in_document_order(self, bid_docx):
+        """测试段落和表格行按文档顺序输出,并带标题级别"""
+        blocks = list(iter_docx_blocks(bid_docx))
+
+        assert [(b['type'], b['text'], b['level']) for b in blocks] == [
+            ('paragraph', "第一章 评分标准", 1),
+            ('paragraph', "评标采用综合评分法。", None),
+            ('table_row', "评分项 | 分值", None),
+            ('table_row', "企业业绩 | 8分", None),
+            ('paragraph', "1.1 人员要求", 2),
+        ]
+        assert blocks[3]['cells'] == ["企业业绩", "8分"]
+
+    def test_load_docx_includes_tables(self, bid_docx):
+        """测试加载Word文档时包含表格内容"""
+        content = DocumentProcessor().load_and_preprocess(str(bid_docx))
+
+        assert "企业业绩 | 8分" in content
+        assert content.index("综合评分法") < content.index("企业业绩") < content.index("人员要求")
+
+    def test_load_invalid_docx(self, tmp_path):
+        """测试无效的docx文件返回空文本"""
+        file_path = tmp_path / "broken.docx"
+        file_path.write_bytes(b"not a zip file")
+
+        assert DocumentProcessor().load_and_preprocess(str(file_path)) == ""
+
+
+class TestNearDuplicateDetection:
+    """近似重复招标文件检测测试"""
+
+    TENDER = "".join(f"第{i}条 投标人须提供近三年类似项目业绩{i}项,合同金额不低于{i * 10}万元。" for i in range(200))
+
+    def test_revision_is_near_duplicate(self, tmp_path):
+        """测试小幅修订的文档被识别为近似重复,无关文档不会"""
+        index = NearDuplicateIndex(str(tmp_path / "fingerprints.json"), threshold=0.8)
+        revision = self.TENDER.replace("第5条 投标人", "第5条 供应商", 1)
+        unrelated = "".join(f"第{i}章 设备清单 服务器{i}台,交换机{i * 2}台。" for i in range(200))
+
+        index.add("original", index.fingerprint(self.TENDER))
+
+        assert index.find_duplicate(index.fingerprint(revision))['key'] == "original"
+        assert index.find_duplicate(index.fingerprint(unrelated)) is None
+
+    def test_index_persists_to_disk(self, tmp_path):
+        """测试索引保存后重新加载"""
+        index_path = str(tmp_path / "fingerprints.json")
+        index = NearDuplicateIndex(index_path)
+        index.add("original", index.fingerprint(self.TENDER), {'result_path': 'original_result.json'})
+        index.save()
+
+        reloaded = NearDuplicateIndex(index_path)
+        duplicate = reloaded.find_duplicate(reloaded.fingerprint(self.TENDER), required_metadata='result_path')
+
+        assert duplicate['similarity'] == 1.0
+        assert duplicate['metadata']['result_path'] == 'original_result.json'
+
+    def test_load_batch_marks_duplicates(self, tmp_path):
+        """测试批量加载时标记近似重复"""
+        docs_dir = tmp_path / "docs"
+        docs_dir.mkdir()
+        (docs_dir / "tender_v1.txt").write_text(self.TENDER, encoding='utf-8')
+        (docs_dir / "tender_v2.txt").write_text(self.TENDER + "补充说明:开标时间不变。", encoding='utf-8')
+        index = NearDuplicateIndex(str(tmp_path / "fingerprints.json"), threshold=0.8)
+
+        documents = DocumentProcessor().load_batch(str(docs_dir), "*.txt", dedup_index=index)
+
+        flagged = [doc for doc in documents if doc['duplicate_of']]
+        assert len(documents) == 2
+        assert len(flagged) == 1
+        assert all(doc['fingerprint'] for doc in documents)
+
+
+class TestTextIndex:
+    """检查点原文核验索引测试"""
+
+    PAGE1 = "第一章 投标须知 投标保证金：人民币 10 万元。"
+    PAGE2 = "第二章 评分标准 （1）近三年类似项目业绩，每项得2分。"
+
+    @pytest.fixture()
+    def index(self):
+        """两页文本的索引"""
+        return TextIndex(self.PAGE1 + " " + self.PAGE2, page_offsets=[0, len(self.PAGE1) + 1])
+
+    def test_locate_ignores_whitespace_and_width(self, index):
+        """测试定位时忽略空白和全半角差异"""
+        hits = index.locate("(1)近三年类似项目业绩")
+
+        assert len(hits) == 1
+        assert hits[0]['page'] == 2
+        assert index.text[hits[0]['start']:hits[0]['end']] == "（1）近三年类似项目业绩"
+
+        assert index.locate("保证金：人民币10万元")[0]['page'] == 1
+        assert index.locate("不存在的内容") == []
+
+    def test_verify_checkpoints(self, index):
+        """测试检查点核验区分有依据和无依据的取值"""
+        checkpoints = [
+            {'id': 1, 'label': '业绩', 'value': '近三年类似项目业绩,每项得2分', 'location': 'null'},
+            {'id': 2, 'label': '保证金', 'value': '投标保证金人民币20万元'},
+            {'id': 3, 'label': '人员', 'value': '项目经理须具备一级建造师证书'},
+            {'id': 4, 'label': '投标保证金', 'value': ''},
+            {'id': 5, 'category': '业绩', 'content': '近三年类似项目业绩'},
+        ]
+
+        results = index.verify_checkpoints(checkpoints)
+
+        assert results[0]['grounded'] and results[0]['page'] == 2
+        assert not results[1]['grounded'] and results[1]['match_ratio'] > 0.5
+        assert not results[2]['grounded']
+        # 标签出现在原文中不代表取值有依据
+        assert not results[3]['grounded'] and results[3]['value'] == ''
+        assert results[4]['grounded']
+
+    def test_load_paged_text_offsets(self, tmp_path):
+        """测试按页拼接的全文和每页起始偏移"""
+        doc_file = tmp_path / "tender.txt"
+        doc_file.write_text(self.PAGE1, encoding='utf-8')
+
+        text, page_offsets = DocumentProcessor().load_paged_text(str(doc_file))
+
+        assert page_offsets == [0]
+        assert text == DocumentProcessor().load_and_preprocess(str(doc_file))
+
+
+class TestCheckpointMerger:
+    """检查点合并去重测试"""
+
+    def test_merge_similar_checkpoints(self):
+        """测试不同分块提取的相同检查点被合并,保留更完整内容和更高重要程度"""
+        checkpoints = [
+            {'id': '1', 'category': '保证金', 'content': '投标保证金为人民币10万元', 'importance': '中',
+             'source_chunks': [0]},
+            {'id': '3', 'category': '工期', 'content': '工期180日历天', 'importance': '高', 'source_chunks': [0]},
+            {'id': '1', 'category': '保证金', 'content': '投标保证金：人民币10万元。', 'importance': '高',
+             'source_chunks': [1]},
+        ]
+
+        merged = merge_checkpoints(checkpoints)
+
+        assert [cp['id'] for cp in merged] == ['1', '2']
+        assert merged[0]['importance'] == '高'
+        assert merged[0]['source_chunks'] == [0, 1]
+
+    def test_different_category_not_merged(self):
+        """测试分类不同的相似内容不合并"""
+        checkpoints = [
+            {'category': '投标截止时间', 'content': '2024年6月30日17:00'},
+            {'category': '开标时间', 'content': '2024年6月30日17:00'},
+        ]
+
+        assert len(merge_checkpoints(checkpoints)) == 2
+
+
+class TestSimilarityMatrix:
+    """检查点相似度矩阵测试"""
+
+    @pytest.mark.parametrize('backend', [
+        'python',
+        pytest.param('scipy', marks=pytest.mark.skipif(not HAS_SCIPY, reason="未安装scipy"))
+    ])
+    def test_matches_pairwise_jaccard(self, backend):
+        """测试结果与逐对计算Jaccard相似度一致,低于下限的不返回"""
+        left = ["投标 保证金 10万元", "工期 180 日历天", "", "联系人 张工"]
+        right = ["保证金 10万元", "工期 180 日历天 以内", "联系人 张工 电话"]
+        matrix = SimilarityMatrix(left, right, tokenizer=lambda text: set(text.split()), backend=backend)
+
+        expected = []
+        for a in left:
+            row = []
+            for j, b in enumerate(right):
+                sa, sb = set(a.split()), set(b.split())
+                score = len(sa & sb) / len(sa | sb) if sa and sb else 0.0
+                if score > 0 and score >= 0.5:
+                    row.append((j, score))
+            expected.append(row)
+
+        assert matrix.candidates(0.5) == expected
+
+    def test_compare_checkpoints_keeps_category_bonus(self):
+        """测试 compare_checkpoints_improved 的匹配结果与类别加分规则"""
+        from evaluate_checkpoints_with_claude_v2 import compare_checkpoints_improved
+
+        algorithm = [
+            {'category': '保证金', 'label': '投标保证金', 'value': '10万元 现金'},
+            {'category': '', 'label': '工期', 'value': '180天'},
+        ]
+        reference = [
+            {'category': '资质', 'content': '投标保证金 20万元'},
+            {'category': '保证金', 'content': '投标保证金 10万元 保函'},
+            {'category': '工期', 'content': '工期 180天'},
+        ]
+
+        result = compare_checkpoints_improved(algorithm, reference)
+
+        first, second = result['matched_pairs']
+        # 字符二元组 Jaccard 6/8=0.75,分类出现在内容中加0.1
+        assert first['zhipuai'] is reference[1] and first['similarity'] == pytest.approx(0.85)
+        assert second['zhipuai'] is reference[2] and second['similarity'] == 1.0
+        assert result['unmatched_zhipuai'] == [reference[0]]
+        assert (result['precision'], result['f1_score']) == (100.0, 80.0)
+
+
+class TestCheckpointAlignment:
+    """检查点一一对齐测试"""
+
+    @pytest.mark.parametrize('use_scipy', [
+        False,
+        pytest.param(True, marks=pytest.mark.skipif(not checkpoint_alignment.HAS_SCIPY, reason="未安装scipy"))
+    ])
+    def test_hungarian_maximizes_total_similarity(self, use_scipy, monkeypatch):
+        """测试同一参考检查点只匹配一次,且总相似度最大(贪心会漏掉B)"""
+        monkeypatch.setattr(checkpoint_alignment, 'HAS_SCIPY', use_scipy)
+        candidates = [[(0, 0.9), (1, 0.8)], [(0, 0.85)], [(0, 0.7)]]
+
+        result = align_checkpoints(candidates, right_count=3, threshold=0.3, method='hungarian')
+
+        assert result['pairs'] == [(0, 1, 0.8), (1, 0, 0.85)]
+        assert result['unmatched_left'] == [2]
+        assert result['unmatched_right'] == [2]
+        assert (result['precision'], result['recall']) == (66.67, 66.67)
+
+    def test_greedy_with_exclusion(self):
+        """测试贪心方式按相似度从高到低选取并排除已匹配项"""
+        candidates = [[(0, 0.9), (1, 0.8)], [(0, 0.85)], [(1, 0.2)]]
+
+        result = align_checkpoints(candidates, right_count=2, threshold=0.3, method='greedy')
+
+        assert result['pairs'] == [(0, 0, 0.9)]
+        assert result['unmatched_left'] == [1, 2]
+
+    def test_scales_to_thousands(self):
+        """测试数千个检查点的对齐在1秒内完成"""
+        import random
+        import time
+
+        rng = random.Random(7)
+        candidates = [[(j, rng.random()) for j in rng.sample(range(5000), 5)] for _ in range(5000)]
+        start = time.perf_counter()
+        result = align_checkpoints(candidates, right_count=5000, threshold=0.3)
+
+        assert time.perf_counter() - start < 1.0
+        assert len({j for _, j, _ in result['pairs']}) == result['matched']
+
+
+class TestCheckpointTokenizer:
+    """检查点分词测试"""
+
+    def test_normalization(self):
+        """测试全角转半角、标点替换,数字中的小数点和时间冒号保留"""
+        assert normalize_text("投标保证金：人民币１０.５万元。") == "投标保证金 人民币10.5万元"
+        assert normalize_text("截止时间 17:00，逾期不予受理") == "截止时间 17:00 逾期不予受理"
+        assert compact_text("投标保证金：10 万元") == compact_text("投标保证金10万元")
+
+    def test_chinese_ngrams(self):
+        """测试中文按字符二元组切分,同义表述的相似度明显高于按空格切分"""
+        tokenizer = CheckpointTokenizer()
+
+        assert tokenizer.tokens("保证金10万元") == {'保证', '证金', '10', '万元'}
+        assert tokenizer.similarity("投标保证金为人民币10万元", "投标保证金：人民币10万元") >= 0.7
+        assert tokenizer.similarity("投标保证金10万元", "工期180日历天") == 0.0
+
+    def test_token_sets_cached(self):
+        """测试同一文本只分词一次"""
+        tokenizer = CheckpointTokenizer()
+        checkpoint = {'id': '1', 'category': '保证金', 'content': '投标保证金10万元'}
+
+        first = tokenizer.checkpoint_tokens(checkpoint)
+        assert tokenizer.checkpoint_tokens(dict(checkpoint)) is first
+        assert '保证' in tokenizer.checkpoint_tokens(checkpoint, 'category', 'content')
@@ -0,0 +1,235 @@
+"""
+大模型响应缓存与提示词模板测试用例
+"""
+import json
+import os
+import time
+
+import pytest
+
+from api_clients.claude_client import DOCUMENT_PREFIX_CHARS, EVALUATION_EXCERPT_CHARS, ClaudeClient
+from bid_evaluation_pipeline import BidParserEvaluationPipeline
+from api_clients.llm_cache import LLMResponseCache
+from utils.prompt_registry import PromptRegistry, PromptTemplate, PromptTemplateError, get_prompt_registry
+
+
+class FakeResponse:
+    """模拟requests响应"""
+
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+class TestLLMResponseCache:
+    """响应缓存测试"""
+
+    @pytest.fixture()
+    def cache(self, tmp_path):
+        """临时缓存"""
+        cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite"))
+        yield cache
+        cache.close()
+
+    def test_hit_and_miss(self, cache):
+        """测试命中与未命中计数"""
+        response = {"content": [{"text": "{}"}]}
+
+        assert cache.get('zhipuai', 'glm-4.7', "提取检查点", 0.1, 8000) is None
+        cache.set('zhipuai', 'glm-4.7', "提取检查点", 0.1, 8000, response)
+
+        assert cache.get('zhipuai', 'glm-4.7', "提取检查点", 0.1, 8000) == response
+        assert cache.stats() == {'hits': 1, 'misses': 1, 'hit_rate': 50.0, 'entries': 1}
+
+    def test_key_includes_parameters(self, cache):
+        """测试模型、温度、最大Token数不同时不共用缓存"""
+        cache.set('zhipuai', 'glm-4.7', "提取检查点", 0.1, 8000, {"content": []})
+
+        assert cache.get('zhipuai', 'glm-4-plus', "提取检查点", 0.1, 8000) is None
+        assert cache.get('zhipuai', 'glm-4.7', "提取检查点", 0.3, 8000) is None
+        assert cache.get('zhipuai', 'glm-4.7', "提取检查点", 0.1, 4000) is None
+        assert cache.get('claude', 'glm-4.7', "提取检查点", 0.1, 8000) is None
+
+    def test_prompt_normalization(self, cache):
+        """测试换行符和行尾空白不影响缓存键"""
+        cache.set('claude', 'm', "第一行  \r\n第二行\n", 0.1, 100, {"content": [{"text": "ok"}]})
+
+        assert cache.get('claude', 'm', "第一行\n第二行", 0.1, 100) is not None
+
+    def test_ttl_expiry(self, tmp_path):
+        """测试过期条目不再命中"""
+        cache = LLMResponseCache(str(tmp_path / "ttl.sqlite"), ttl_seconds=1)
+        cache.set('claude', 'm', "prompt", 0.1, 100, {"content": []})
+        cache._conn.execute("UPDATE responses SET created_at = ?", (time.time() - 10,))
+
+        assert cache.get('claude', 'm', "prompt", 0.1, 100) is None
+        assert cache.stats()['entries'] == 0
+        cache.close()
+
+    def test_size_bounded_eviction(self, tmp_path):
+        """测试超出容量时淘汰最久未使用的条目"""
+        cache = LLMResponseCache(str(tmp_path / "lru.sqlite"), max_entries=2)
+        cache.set('claude', 'm', "a", 0.1, 100, {"id": "a"})
+        cache.set('claude', 'm', "b", 0.1, 100, {"id": "b"})
+        cache._conn.execute("UPDATE responses SET last_access = last_access - 10")
+        cache.get('claude', 'm', "a", 0.1, 100)
+        cache.set('claude', 'm', "c", 0.1, 100, {"id": "c"})
+
+        assert cache.get('claude', 'm', "a", 0.1, 100) == {"id": "a"}
+        assert cache.get('claude', 'm', "b", 0.1, 100) is None
+        assert cache.stats()['entries'] == 2
+        cache.close()
+
+    def test_bypass(self, tmp_path):
+        """测试跳过缓存读取"""
+        cache = LLMResponseCache(str(tmp_path / "bypass.sqlite"), bypass=True)
+        cache.set('claude', 'm', "prompt", 0.1, 100, {"content": []})
+
+        assert cache.get('claude', 'm', "prompt", 0.1, 100) is None
+        assert cache.stats()['entries'] == 1
+        cache.close()
+
+    def test_claude_client_uses_cache(self, cache, monkeypatch):
+        """测试Claude客户端重复请求不再调用API"""
+        client = ClaudeClient(api_key="test", cache=cache)
+        calls = []
+        api_response = {"content": [{"text": '{"checkpoints": [{"id": "1", "content": "保证金10万元"}]}'}]}
+        monkeypatch.setattr(client.session, 'post',
+                            lambda *args, **kwargs: calls.append(kwargs['json']) or FakeResponse(api_response))
+
+        first = client.generate_reference_checkpoints("投标保证金:10万元")
+        second = client.generate_reference_checkpoints("投标保证金:10万元")
+
+        assert first == second == [{"id": "1", "content": "保证金10万元"}]
+        assert len(calls) == 1
+        assert cache.stats()['hits'] == 1
+
+
+    def test_map_reduce_caches_each_chunk(self, cache, monkeypatch):
+        """测试分块生成参考答案: 覆盖全文、合并重复项,未变化的分块不重复请求"""
+        client = ClaudeClient(api_key="test", cache=cache)
+        calls = []
+
+        def fake_post(*args, **kwargs):
+            prompt = kwargs['json']['system'][0]['text']
+            calls.append(prompt)
+            assert 'cache_control' not in kwargs['json']['system'][0]
+            checkpoints = [{'id': '1', 'category': '保证金', 'content': '投标保证金10万元', 'importance': '高'}]
+            if '第三章' in prompt:
+                checkpoints.append({'id': '2', 'category': '工期', 'content': '工期180日历天', 'importance': '高'})
+            return FakeResponse({"content": [{"text": json.dumps({'checkpoints': checkpoints})}]})
+
+        monkeypatch.setattr(client.session, 'post', fake_post)
+        sections = ["第一章 总则\n" + "投标保证金10万元。" * 40,
+                    "第二章 资格\n" + "投标人须具备相应资质。" * 40,
+                    "第三章 工期\n" + "工期180日历天。" * 40]
+        document = "\n".join(sections)
+
+        checkpoints = client.generate_reference_checkpoints_map_reduce(document, chunk_tokens=400, overlap_tokens=0)
+        first_calls = len(calls)
+
+        assert first_calls >= 3
+        assert [cp['content'] for cp in checkpoints] == ['投标保证金10万元', '工期180日历天']
+
+        client.generate_reference_checkpoints_map_reduce(document, chunk_tokens=400, overlap_tokens=0)
+        assert len(calls) == first_calls
+
+    def test_reference_and_evaluation_share_cached_prefix(self, cache, monkeypatch):
+        """测试参考答案和评估请求的招标文件前缀相同并标记为可缓存"""
+        client = ClaudeClient(api_key="test", cache=cache)
+        payloads = []
+
+        def fake_post(*args, **kwargs):
+            payloads.append(kwargs['json'])
+            return FakeResponse({"content": [{"text": '{"checkpoints": [], "overall_score": 80}'}],
+                                 "usage": {"input_tokens": 50, "output_tokens": 10}})
+
+        monkeypatch.setattr(client.session, 'post', fake_post)
+        document = "第一章 总则\n投标保证金10万元。" * 500
+        client.generate_reference_checkpoints(document)
+        client.evaluate_checkpoints(document, [{'content': '保证金10万元'}], [{'content': '投标保证金10万元'}])
+
+        reference, evaluation = payloads
+        assert reference['system'] == evaluation['system']
+        assert reference['system'][0]['cache_control'] == {'type': 'ephemeral'}
+        assert document[:100] in reference['system'][0]['text']
+        assert document[:100] not in evaluation['messages'][0]['content']
+
+        plain = ClaudeClient(api_key="test", cache=cache, prompt_caching=False)
+        assert 'cache_control' not in plain.build_evaluation_payload(document, [], [])['system'][0]
+
+    @pytest.mark.parametrize('evaluation_mode, marked', [('full', False), ('pairs', True)])
+    def test_prefix_marked_only_when_reused(self, tmp_path, monkeypatch, evaluation_mode, marked):
+        """测试分块生成参考答案后,只有多批候选对判断共用前缀时评估请求才标记缓存"""
+        pipeline = BidParserEvaluationPipeline({
+            'claude_api_key': '',
+            'output_dir': str(tmp_path / "output"),
+            'enable_dedup': False,
+            'enable_journal': False,
+            'evaluation_mode': evaluation_mode,
+            'pair_judging': {'batch_size': 1}
+        })
+        payloads = []
+        text = json.dumps({'checkpoints': [{'content': '投标保证金10万元'}], 'overall_score': 80,
+                           'judgements': []}, ensure_ascii=False)
+        monkeypatch.setattr(pipeline.claude_client, 'create_message',
+                            lambda payload, timeout=60: payloads.append(payload) or {'content': [{'text': text}]})
+        monkeypatch.setattr(pipeline.algorithm_client, 'parse_bid_document',
+                            lambda document_id: [{'content': '投标保证金10万元'}, {'content': '保证金10万元'}])
+        document = tmp_path / "long.txt"
+        document.write_text("第一章 总则\n投标保证金10万元。" * 1000, encoding='utf-8')
+
+        pipeline.evaluate_single_document(str(document), document_id="1")
+
+        reference_prompt = get_prompt_registry().render('reference_generation')
+        chunks = [p for p in payloads if p['messages'][0]['content'] == reference_prompt]
+        evaluations = [p for p in payloads if p['messages'][0]['content'] != reference_prompt]
+        assert len(chunks) > 1 and all('cache_control' not in p['system'][0] for p in chunks)
+        assert len(evaluations) == (2 if marked else 1)
+        assert all(('cache_control' in p['system'][0]) == marked for p in evaluations)
+        # 不缓存时只发送开头的摘录
+        excerpt = DOCUMENT_PREFIX_CHARS if marked else EVALUATION_EXCERPT_CHARS
+        assert all(len(p['system'][0]['text']) == len("招标文件内容：\n") + excerpt for p in evaluations)
+
+class TestPromptRegistry:
+    """提示词模板注册表测试"""
+
+    def test_render_matches_format(self):
+        """测试预编译模板的渲染结果与 str.format 一致"""
+        text = "文档:{document_text}\n返回 {{\"checkpoints\": []}} 得分{score:.1f}"
+        template = PromptTemplate('t', text)
+
+        assert template.fields == {'document_text', 'score'}
+        assert template.render(document_text="含{花括号}", score=8) == text.format(document_text="含{花括号}", score=8)
+
+    def test_reload_only_when_changed(self, tmp_path):
+        """测试文件未修改时复用已编译模板,修改后重新加载且版本变化"""
+        (tmp_path / "p.txt").write_text("内容:{document_text}", encoding='utf-8')
+        registry = PromptRegistry(tmp_path)
+        registry.register('p', 'p.txt', required_fields=['document_text'])
+
+        first = registry.get('p')
+        assert registry.get('p') is first
+
+        (tmp_path / "p.txt").write_text("新内容:{document_text}", encoding='utf-8')
+        os.utime(tmp_path / "p.txt", ns=(time.time_ns() + 10 ** 9,) * 2)
+
+        assert registry.render('p', document_text="x") == "新内容:x"
+        assert registry.version('p') != first.version
+
+    def test_validation(self, tmp_path):
+        """测试模板变量与注册的变量不一致时报错,文件不存在时使用默认模板"""
+        (tmp_path / "bad.txt").write_text("内容:{document}", encoding='utf-8')
+        registry = PromptRegistry(tmp_path)
+        registry.register('bad', 'bad.txt', required_fields=['document_text'])
+        registry.register('missing', 'missing.txt', default="默认:{document_text}",
+                          required_fields=['document_text'])
+
+        with pytest.raises(PromptTemplateError):
+            registry.get('bad')
+        assert registry.render('missing', document_text="x") == "默认:x"
@@ -0,0 +1,181 @@
+"""
+大模型统一调用层测试用例
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from api_clients.llm_cache import LLMResponseCache
+from api_clients.llm_provider import (CircuitBreaker, CircuitOpenError, LLMProvider, ZhipuAIProvider,
+                                      get_latency_tracker)
+from api_clients.usage_tracker import UsageTracker
+
+
+class StatusError(Exception):
+    """带HTTP状态码的异常"""
+
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class ScriptedProvider(LLMProvider):
+    """按脚本依次返回结果或抛出异常的服务"""
+
+    name = 'scripted'
+
+    def __init__(self, script, **options):
+        super().__init__(**options)
+        self.script = list(script)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _send(self, payload, timeout):
+        with self._lock:
+            self.calls += 1
+            step = self.script.pop(0)
+        if isinstance(step, tuple):
+            delay, step = step
+            time.sleep(delay)
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+
+def make_payload(model, prompt="提取检查点"):
+    return {"model": model, "max_tokens": 100, "temperature": 0.1,
+            "messages": [{"role": "user", "content": prompt}]}
+
+
+class TestLLMProvider:
+    """统一调用层测试"""
+
+    @pytest.fixture()
+    def cache(self, tmp_path):
+        cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite"))
+        yield cache
+        cache.close()
+
+    def test_retries_with_server_hint(self, cache):
+        """测试可重试错误按 Retry-After 退避后成功"""
+        ok = {"content": [{"text": "ok"}]}
+        provider = ScriptedProvider([StatusError(529, {'retry-after': '0.05'}), ok], cache=cache)
+
+        assert provider.create(make_payload('retry-model')) == ok
+        assert provider.calls == 2
+
+    def test_client_error_not_retried(self, cache):
+        """测试400等请求错误不重试"""
+        provider = ScriptedProvider([StatusError(400)], cache=cache)
+
+        with pytest.raises(StatusError):
+            provider.create(make_payload('bad-request-model'))
+        assert provider.calls == 1
+
+    def test_exponential_backoff(self):
+        """测试无服务端提示时等待时间指数增长并有上限"""
+        provider = ScriptedProvider([], cache=object(), base_delay=1.0, max_delay=4.0)
+
+        assert 0.5 <= provider.backoff_delay(0) <= 1.0
+        assert 2.0 <= provider.backoff_delay(2) <= 4.0
+        assert provider.backoff_delay(10) <= 4.0
+        assert provider.backoff_delay(0, retry_after=3) == 3
+
+    def test_circuit_breaker_opens_per_model(self, cache):
+        """测试连续失败后熔断,其他模型不受影响"""
+        errors = [StatusError(500) for _ in range(4)]
+        provider = ScriptedProvider(errors + [{"content": [{"text": "ok"}]}], cache=cache,
+                                    max_retries=3, base_delay=0.001, failure_threshold=4)
+
+        with pytest.raises(StatusError):
+            provider.create(make_payload('breaker-model'))
+        with pytest.raises(CircuitOpenError):
+            provider.create(make_payload('breaker-model', "另一个请求"))
+        assert provider.calls == 4
+
+        assert provider.create(make_payload('healthy-model'))['content'][0]['text'] == 'ok'
+
+    def test_half_open_probe(self):
+        """测试冷却后放行一个试探请求,成功后关闭"""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        breaker.record_failure()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+        time.sleep(0.06)
+        breaker.before_call()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+        assert breaker.state == 'closed'
+
+    def test_probe_released_after_client_error(self, cache):
+        """测试试探请求遇到400等请求错误后释放试探名额,下一次请求仍可放行"""
+        ok = {"content": [{"text": "ok"}]}
+        provider = ScriptedProvider([StatusError(500), StatusError(400), ok], cache=cache,
+                                    max_retries=0, failure_threshold=1, reset_timeout=0.05)
+
+        with pytest.raises(StatusError):
+            provider.create(make_payload('probe-model'))
+        with pytest.raises(CircuitOpenError):
+            provider.create(make_payload('probe-model', "熔断中的请求"))
+
+        time.sleep(0.06)
+        with pytest.raises(StatusError):
+            provider.create(make_payload('probe-model', "试探请求"))
+        assert provider.create(make_payload('probe-model', "下一次请求")) == ok
+        assert provider.calls == 3
+
+    def test_hedged_request_takes_first_answer(self, cache):
+        """测试请求超过耗时分位数后发出对冲请求,返回先完成的结果"""
+        tracker = get_latency_tracker('scripted', 'hedge-model')
+        for _ in range(20):
+            tracker.record(0.05)
+        slow = (1.0, {"content": [{"text": "slow"}]})
+        fast = (0.01, {"content": [{"text": "fast"}]})
+        provider = ScriptedProvider([slow, fast], cache=cache, hedge_percentile=95)
+
+        started_at = time.monotonic()
+        result = provider.create(make_payload('hedge-model'))
+
+        assert result['content'][0]['text'] == 'fast'
+        assert time.monotonic() - started_at < 0.5
+        assert provider.calls == 2
+
+    def test_hedge_loser_usage_recorded(self, cache):
+        """测试对冲中落败的请求返回后,其用量同样计入统计"""
+        tracker = get_latency_tracker('scripted', 'hedge-usage-model')
+        for _ in range(20):
+            tracker.record(0.05)
+        usage = {"input_tokens": 100, "output_tokens": 10}
+        slow = (0.3, {"content": [{"text": "slow"}], "usage": usage})
+        fast = (0.01, {"content": [{"text": "fast"}], "usage": usage})
+        usage_tracker = UsageTracker()
+        provider = ScriptedProvider([slow, fast], cache=cache, hedge_percentile=95, usage_tracker=usage_tracker)
+
+        assert provider.create(make_payload('hedge-usage-model'))['content'][0]['text'] == 'fast'
+        time.sleep(0.4)
+
+        assert len(usage_tracker.records) == 2
+        assert usage_tracker.used_tokens() == 220
+
+    def test_zhipuai_provider_reuses_cache_key(self, cache, monkeypatch):
+        """测试智谱AI响应转换为统一格式,缓存键与单轮提示词一致"""
+        response = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='{"checkpoints": []}'))],
+            model='glm-4.7',
+            usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5, total_tokens=15)
+        )
+        requests = []
+        fake_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(
+            create=lambda **kwargs: requests.append(kwargs) or response)))
+        monkeypatch.setattr('api_clients.llm_provider.get_zhipuai_client', lambda api_key: fake_client)
+
+        provider = ZhipuAIProvider('key', cache=cache)
+        result = provider.create(make_payload('glm-4.7'))
+
+        assert result['usage']['total_tokens'] == 15
+        assert requests[0]['timeout'] == 60
+        assert cache.get('zhipuai', 'glm-4.7', "提取检查点", 0.1, 100) == result
@@ -0,0 +1,170 @@
+"""
+Claude批量提交(Message Batches)测试用例
+使用本地HTTP服务模拟批处理接口
+"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from api_clients.claude_client import ClaudeClient
+from api_clients.llm_cache import LLMResponseCache
+from bid_evaluation_pipeline import BidParserEvaluationPipeline
+
+
+class FakeBatchServer:
+    """模拟 /v1/messages/batches 接口的本地服务"""
+
+    def __init__(self):
+        self.batches = {}
+        self.submissions = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, body, content_type='application/json'):
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                server.submissions += 1
+                batch_id = f"msgbatch_{server.submissions}"
+                server.batches[batch_id] = {'requests': body['requests'], 'polls': 0}
+                self._send(json.dumps({'id': batch_id, 'processing_status': 'in_progress'}))
+
+            def do_GET(self):
+                parts = self.path.strip('/').split('/')
+                batch = server.batches[parts[3]]
+                if parts[-1] == 'results':
+                    self._send(server.render_results(batch['requests']), 'application/x-jsonl')
+                    return
+                batch['polls'] += 1
+                status = 'ended' if batch['polls'] > 1 else 'in_progress'
+                self._send(json.dumps({
+                    'id': parts[3],
+                    'processing_status': status,
+                    'request_counts': {'processing': 0 if status == 'ended' else len(batch['requests'])},
+                    'results_url': f"{server.url}/v1/messages/batches/{parts[3]}/results"
+                }))
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def render_results(requests):
+        """按请求顺序的逆序返回结果,含一个失败请求"""
+        lines = []
+        for item in reversed(requests):
+            if item['custom_id'] == 'bad':
+                result = {'type': 'errored', 'error': {'type': 'invalid_request_error'}}
+            else:
+                text = json.dumps({'checkpoints': [{'id': '1', 'content': item['custom_id']}]})
+                result = {'type': 'succeeded', 'message': {'content': [{'type': 'text', 'text': text}]}}
+            lines.append(json.dumps({'custom_id': item['custom_id'], 'result': result}, ensure_ascii=False))
+        return '\n'.join(lines)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class TestMessageBatch:
+    """批量提交模式测试"""
+
+    @pytest.fixture()
+    def server(self):
+        server = FakeBatchServer()
+        yield server
+        server.close()
+
+    @pytest.fixture()
+    def client(self, server, tmp_path):
+        cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite"))
+        yield ClaudeClient(api_key="test", base_url=server.url, cache=cache)
+        cache.close()
+
+    def test_results_mapped_by_custom_id(self, client, server, tmp_path):
+        """测试结果按custom_id对应回文档,失败请求单独标记"""
+        documents = {'doc-a': "投标保证金:10万元", 'doc-b': "工期:180日历天", 'bad': "无效"}
+
+        results = client.generate_reference_checkpoints_batch(documents, str(tmp_path), poll_interval=0)
+
+        assert results['doc-a'][0]['content'] == 'doc-a'
+        assert results['doc-b'][0]['content'] == 'doc-b'
+        assert 'invalid_request_error' in results['bad']['error']
+        assert (tmp_path / "reference.jsonl").exists()
+        assert not (tmp_path / "reference.state.json").exists()
+
+    def test_cached_requests_not_resubmitted(self, client, server, tmp_path):
+        """测试已完成的请求再次运行时从缓存读取"""
+        documents = {'doc-a': "投标保证金:10万元"}
+        client.generate_reference_checkpoints_batch(documents, str(tmp_path), poll_interval=0)
+        client.generate_reference_checkpoints_batch(documents, str(tmp_path), poll_interval=0)
+
+        assert server.submissions == 1
+
+    def test_resume_from_saved_batch_id(self, client, server, tmp_path):
+        """测试进程中断后从保存的批次ID恢复,不重复提交"""
+        payload = client.build_reference_payload("工期:180日历天")
+        server.batches['msgbatch_saved'] = {
+            'requests': [{'custom_id': 'doc-b', 'params': payload}],
+            'polls': 0
+        }
+        (tmp_path / "reference.state.json").write_text(json.dumps({
+            'batch_id': 'msgbatch_saved',
+            'custom_ids': ['doc-b']
+        }), encoding='utf-8')
+
+        results = client.generate_reference_checkpoints_batch(
+            {'doc-b': "工期:180日历天"}, str(tmp_path), poll_interval=0
+        )
+
+        assert server.submissions == 0
+        assert results['doc-b'][0]['content'] == 'doc-b'
+
+    def test_failed_reference_not_journaled(self, tmp_path, monkeypatch):
+        """测试离线批量生成参考答案失败的文档记为失败,不评估也不记录,继续运行时重新生成"""
+        documents = []
+        for name in ('a', 'b'):
+            doc_file = tmp_path / f"{name}.txt"
+            doc_file.write_text(f"招标文件{name} 投标人须具备信息系统集成资质", encoding='utf-8')
+            documents.append({'path': str(doc_file), 'document_id': name})
+        submitted = []
+
+        def make_pipeline(resume, expired):
+            pipeline = BidParserEvaluationPipeline({
+                'claude_api_key': '',
+                'output_dir': str(tmp_path / "output"),
+                'enable_dedup': False,
+                'resume': resume
+            })
+
+            def generate_batch(pending, batch_dir, poll_interval=60):
+                submitted.append(sorted(pending))
+                return {cid: {'error': '"expired"'} if cid in expired else [{'content': text[4]}]
+                        for cid, text in pending.items()}
+
+            monkeypatch.setattr(pipeline.algorithm_client, 'parse_bid_document',
+                                lambda document_id: [{'content': document_id}])
+            monkeypatch.setattr(pipeline.claude_client, 'generate_reference_checkpoints_batch', generate_batch)
+            monkeypatch.setattr(pipeline.evaluator, 'evaluate_offline_batch',
+                                lambda items, batch_dir, poll_interval=60: [{'overall_score': 90} for _ in items])
+            return pipeline
+
+        first = make_pipeline(resume=False, expired={'ref-1'}).evaluate_batch_offline(documents, poll_interval=0)
+        assert first[0]['overall_score'] == 90
+        assert 'expired' in first[1]['error']
+
+        second = make_pipeline(resume=True, expired=set()).evaluate_batch_offline(documents, poll_interval=0)
+        assert submitted == [['ref-0', 'ref-1'], ['ref-1']]
+        assert [r['overall_score'] for r in second] == [90, 90]
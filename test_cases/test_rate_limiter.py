@@ -0,0 +1,148 @@
+"""
+大模型限流与并发客户端测试用例
+"""
+import threading
+import time
+
+import pytest
+
+from api_clients.async_llm_client import AsyncLLMClient
+from api_clients.rate_limiter import RateLimiter, TokenBucket, extract_total_tokens, get_retry_after
+
+
+class FakeHTTPResponse:
+    """模拟带状态码和响应头的HTTP响应"""
+
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class RateLimitError(Exception):
+    """模拟限流异常"""
+
+    def __init__(self, retry_after=None):
+        super().__init__("429 Too Many Requests")
+        headers = {'retry-after': str(retry_after)} if retry_after is not None else {}
+        self.response = FakeHTTPResponse(429, headers)
+
+
+class TestRateLimiter:
+    """令牌桶限流测试"""
+
+    def test_token_bucket_wait(self):
+        """测试余额不足时返回等待时间"""
+        bucket = TokenBucket(60)  # 每秒补充1个
+
+        assert bucket.reserve(60) == 0.0
+        assert bucket.reserve(2) == pytest.approx(2.0, abs=0.1)
+
+    def test_reconcile_refunds_overestimate(self):
+        """测试实际用量小于预估时退还令牌"""
+        limiter = RateLimiter(tokens_per_minute=6000)
+        limiter.acquire(6000)
+        limiter.reconcile(6000, 1000)
+
+        assert limiter.token_bucket.tokens == pytest.approx(5000, abs=200)
+
+    def test_retry_after_parsing(self):
+        """测试解析Retry-After"""
+        assert get_retry_after(RateLimitError(retry_after=7)) == 7.0
+        assert get_retry_after(RateLimitError()) == 1.0
+        assert get_retry_after(ValueError("bad json")) is None
+
+    def test_extract_total_tokens(self):
+        """测试兼容智谱AI和Claude的usage格式"""
+        assert extract_total_tokens({'usage': {'total_tokens': 120}}) == 120
+        assert extract_total_tokens({'usage': {'input_tokens': 100, 'output_tokens': 20}}) == 120
+        assert extract_total_tokens({'content': []}) is None
+
+
+class TestAsyncLLMClient:
+    """异步并发客户端测试"""
+
+    def test_concurrency_limit_and_order(self):
+        """测试并发数不超过上限,结果按提交顺序返回"""
+        client = AsyncLLMClient(max_concurrent=3)
+        lock = threading.Lock()
+        state = {'running': 0, 'peak': 0}
+
+        def fake_call(i):
+            with lock:
+                state['running'] += 1
+                state['peak'] = max(state['peak'], state['running'])
+            time.sleep(0.05)
+            with lock:
+                state['running'] -= 1
+            return {'index': i, 'usage': {'total_tokens': 10}}
+
+        results = client.run(lambda: [client.call(fake_call, i, estimated_tokens=100) for i in range(9)])
+
+        assert [r['index'] for r in results] == list(range(9))
+        assert state['peak'] == 3
+
+    def test_retry_after_then_success(self):
+        """测试限流错误按Retry-After退避后重试"""
+        client = AsyncLLMClient(max_concurrent=1, max_retries=2)
+        attempts = []
+
+        def flaky_call():
+            attempts.append(time.monotonic())
+            if len(attempts) == 1:
+                raise RateLimitError(retry_after=0.2)
+            return {'ok': True}
+
+        results = client.run(lambda: [client.call(flaky_call)])
+
+        assert results == [{'ok': True}]
+        assert attempts[1] - attempts[0] >= 0.19
+
+    def test_failure_does_not_stop_others(self):
+        """测试单个调用失败不影响其他调用"""
+        client = AsyncLLMClient(max_concurrent=2)
+
+        def call(i):
+            if i == 1:
+                raise ValueError("解析失败")
+            return i
+
+        results = client.run(lambda: [client.call(call, i) for i in range(3)])
+
+        assert results[0] == 0 and results[2] == 2
+        assert isinstance(results[1], ValueError)
+
+    def test_claude_client_retries_rate_limit(self, tmp_path, monkeypatch):
+        """测试Claude客户端遇到429按Retry-After重试"""
+        from requests import HTTPError
+
+        from api_clients.claude_client import ClaudeClient
+        from api_clients.llm_cache import LLMResponseCache
+
+        class FakeResponse:
+            def __init__(self, status_code, data=None, headers=None):
+                self.status_code = status_code
+                self.headers = headers or {}
+                self._data = data
+
+            def raise_for_status(self):
+                if self.status_code >= 400:
+                    raise HTTPError(f"{self.status_code} Error", response=self)
+
+            def json(self):
+                return self._data
+
+        cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite"))
+        limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=100000)
+        client = ClaudeClient(api_key="test", cache=cache, rate_limiter=limiter)
+        responses = [
+            FakeResponse(429, headers={'retry-after': '0.1'}),
+            FakeResponse(200, {'content': [{'text': 'ok'}], 'usage': {'input_tokens': 5, 'output_tokens': 2}})
+        ]
+        monkeypatch.setattr(client.session, 'post', lambda *args, **kwargs: responses.pop(0))
+
+        result = client.create_message({'model': 'm', 'max_tokens': 10,
+                                        'messages': [{'role': 'user', 'content': '你好'}]})
+
+        assert result['content'][0]['text'] == 'ok'
+        assert responses == []
+        cache.close()
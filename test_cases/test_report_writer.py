@@ -0,0 +1,53 @@
+"""
+评估报告测试用例
+"""
+import csv
+import json
+
+from evaluators.claude_evaluator import ClaudeEvaluator
+from evaluators.report_writer import EvaluationReportWriter
+
+
+class TestReportWriter:
+    """流式评估报告测试"""
+
+    def test_empty_report(self, tmp_path):
+        """测试没有评估结果时生成报告不报错"""
+        report = ClaudeEvaluator(claude_client=None).generate_evaluation_report([])
+        assert "评估文档数量: 0" in report
+        assert "总体评分: 0.00" in report
+
+        with EvaluationReportWriter(str(tmp_path)) as writer:
+            pass
+        assert "评估文档数量: 0" in writer.text_path.read_text(encoding='utf-8')
+
+    def test_streams_rows_and_summarizes_on_close(self, tmp_path):
+        """测试每个文档写入后即可读取,关闭时汇总与一次性生成的报告一致"""
+        results = [
+            {'overall_score': 80, 'f1_score': 60, 'missing_checkpoints': [{}, {}],
+             'metadata': {'document_path': 'a.txt'}},
+            {'error': '算法接口超时'},
+            {'overall_score': 90, 'f1_score': 70, 'metadata': {'document_path': 'c.txt'}}
+        ]
+        writer = EvaluationReportWriter(str(tmp_path))
+        writer.add(results[0], 1)
+        writer.add(results[1], 2, 'b.txt')
+
+        # 运行中途: CSV和JSONL已包含完成的文档,文本报告尚未生成
+        with open(writer.csv_path, 'r', encoding='utf-8-sig') as f:
+            rows = list(csv.DictReader(f))
+        assert [(row['index'], row['document_path']) for row in rows] == [('1', 'a.txt'), ('2', 'b.txt')]
+        assert rows[0]['missing_checkpoints'] == '2'
+        assert rows[1]['error'] == '算法接口超时'
+        assert not writer.text_path.exists()
+
+        writer.add(results[2], 3)
+        summary = writer.close()
+
+        assert "评估文档数量: 3\n评估失败: 1" in summary
+        assert "总体评分: 56.67" in summary
+        lines = writer.jsonl_path.read_text(encoding='utf-8').splitlines()
+        assert [json.loads(line)['index'] for line in lines] == [1, 2, 3]
+        assert writer.text_path.read_text(encoding='utf-8') == \
+            ClaudeEvaluator(claude_client=None).generate_evaluation_report(results)
+        assert not writer.details_path.exists()
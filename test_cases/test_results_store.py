@@ -0,0 +1,122 @@
+"""
+评估结果库测试用例
+"""
+import csv
+import json
+import os
+import sqlite3
+import time
+
+import pytest
+
+import compare_results
+from utils.results_store import ResultsStore, find_latest_response, save_response
+
+
+class TestResultsStore:
+    """评估结果库测试"""
+
+    @pytest.fixture()
+    def store(self, tmp_path):
+        store = ResultsStore(str(tmp_path / "results.sqlite"))
+        yield store
+        store.close()
+
+    def test_latest_per_document_and_history(self, store):
+        """测试每个文档的最新结果和按时间倒序的历史"""
+        store.append('comparison', 'a.pdf', {'comparison': {'f1_score': 50.0}}, run_id='r1',
+                     evaluator_version='v1', created_at=100)
+        store.append('comparison', 'b.pdf', {'comparison': {'f1_score': 40.0}}, run_id='r1',
+                     evaluator_version='v1', created_at=101)
+        store.append('comparison', 'a.pdf', {'comparison': {'f1_score': 70.0}}, run_id='r2',
+                     evaluator_version='v2', created_at=200)
+
+        latest = store.latest('comparison', 'a.pdf')
+        assert (latest['run_id'], latest['f1_score']) == ('r2', 70.0)
+        assert latest['payload'] == {'comparison': {'f1_score': 70.0}}
+        assert store.latest('comparison', evaluator_version='v1')['document'] == 'b.pdf'
+        assert [row['run_id'] for row in store.history('comparison', 'a.pdf')] == ['r2', 'r1']
+        assert [(row['document'], row['run_id']) for row in store.latest_per_document('comparison')] == \
+            [('a.pdf', 'r2'), ('b.pdf', 'r1')]
+        assert store.latest('check_point_response') is None
+
+    def test_diff_and_trend(self, store):
+        """测试两次运行的指标差异和按运行汇总的趋势"""
+        for run_id, created_at, scores in (('r1', 100, {'a': 50, 'b': 40, 'c': 30}),
+                                           ('r2', 200, {'a': 70, 'b': 40, 'd': 90})):
+            for document, f1_score in scores.items():
+                store.append('pipeline', document, {'evaluation_result': {'f1_score': f1_score, 'overall_score': 80}},
+                             run_id=run_id, created_at=created_at)
+
+        diff = store.diff('r1', 'r2', 'pipeline')
+        assert diff['documents']['a']['f1_score'] == {'a': 50, 'b': 70, 'delta': 20}
+        assert diff['documents']['b']['f1_score']['delta'] == 0
+        assert (diff['only_in_a'], diff['only_in_b']) == (['c'], ['d'])
+
+        trend = store.trend('f1_score', 'pipeline')
+        assert [(row['run_id'], row['documents'], row['value']) for row in trend] == \
+            [('r1', 3, 40.0), ('r2', 3, pytest.approx(66.67, abs=0.01))]
+        assert [row['value'] for row in store.trend('f1_score', 'pipeline', document='a')] == [50, 70]
+        with pytest.raises(ValueError):
+            store.trend('payload', 'pipeline')
+
+    def test_append_only(self, store):
+        """测试已有记录不能修改或删除"""
+        store.append('comparison', 'a.pdf', {'f1_score': 1})
+        with pytest.raises(sqlite3.DatabaseError):
+            store._conn.execute("UPDATE results SET f1_score = 2")
+        with pytest.raises(sqlite3.DatabaseError):
+            store._conn.execute("DELETE FROM results")
+
+    def test_export_csv(self, store, tmp_path, monkeypatch):
+        """测试导出列式文件(不含结果JSON),无法导出Parquet时改为CSV"""
+        store.append('comparison', 'a.pdf', {'comparison': {'recall': 60.0, 'matched': 3}}, run_id='r1')
+        monkeypatch.setattr('utils.results_store.HAS_PANDAS', False)
+
+        path = store.export(str(tmp_path / "export" / "results.parquet"))
+        assert path.suffix == '.csv'
+        with open(path, 'r', encoding='utf-8-sig') as f:
+            rows = list(csv.DictReader(f))
+        assert rows[0]['run_id'] == 'r1'
+        assert (float(rows[0]['recall']), float(rows[0]['matched'])) == (60.0, 3.0)
+        assert 'payload' not in rows[0]
+
+    def test_responses_and_legacy_files(self, store, tmp_path):
+        """测试算法响应: 读取结果库中同一文档的记录,没有记录时读取旧版时间戳文件"""
+        legacy_dir = tmp_path / "responses"
+        legacy_dir.mkdir()
+        for timestamp in ('20240101_000000', '20240301_000000'):
+            (legacy_dir / f"check_point_response_{timestamp}.json").write_text(
+                json.dumps({'code': 200, 'timestamp': timestamp}), encoding='utf-8')
+
+        assert find_latest_response('check_point', store=store, legacy_dir=str(legacy_dir))['timestamp'] == \
+            '20240301_000000'
+
+        save_response('check_point', {'code': 200, 'data': 'a'}, 'a.pdf', store=store)
+        save_response('check_point', {'code': 200, 'data': 'b'}, 'b.pdf', store=store)
+        assert find_latest_response('check_point', 'a.pdf', store=store)['data'] == 'a'
+        # 指定的文档没有记录时不使用其他文档的响应,除非明确允许
+        empty_dir = str(tmp_path / "no_responses")
+        assert find_latest_response('check_point', 'c.pdf', store=store, legacy_dir=empty_dir) is None
+        assert find_latest_response('check_point', 'c.pdf', store=store, legacy_dir=str(legacy_dir))['timestamp'] == \
+            '20240301_000000'
+        assert find_latest_response('check_point', 'c.pdf', store=store, legacy_dir=empty_dir,
+                                    any_document=True)['data'] == 'b'
+
+    def test_compare_results_imports_legacy_files(self, store, tmp_path, monkeypatch):
+        """测试对比脚本导入旧版结果文件(只导入一次),并按评估器版本取最新结果"""
+        results_dir = tmp_path / "results"
+        results_dir.mkdir()
+        for name, matched in (('claude_comparison_20240101_000000.json', 1),
+                              ('claude_comparison_v2_20240102_000000.json', 2)):
+            path = results_dir / name
+            path.write_text(json.dumps({'comparison': {'matched': matched}}), encoding='utf-8')
+            os.utime(path, (time.time() - 100 + matched, time.time() - 100 + matched))
+        monkeypatch.setattr(compare_results, 'LEGACY_RESULTS_DIR', str(results_dir))
+
+        latest, second = compare_results.load_latest_results(store)
+        compare_results.load_latest_results(store)
+
+        assert (latest['evaluator_version'], latest['comparison']['matched']) == ('v2', 2)
+        assert (second['evaluator_version'], second['comparison']['matched']) == ('v1', 1)
+        assert len(store.history('comparison')) == 2
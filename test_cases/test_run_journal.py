@@ -0,0 +1,107 @@
+"""
+运行日志测试用例
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from bid_evaluation_pipeline import BidParserEvaluationPipeline
+from utils.run_journal import RunJournal
+
+
+class TestRunJournal:
+    """运行日志测试"""
+
+    def test_resume_replays_completed_stages(self, tmp_path):
+        """测试继续运行时恢复各阶段结果,重新完成前面的阶段会使后续阶段作废"""
+        path = tmp_path / "journal.jsonl"
+        journal = RunJournal(str(path))
+        journal.record('a.txt', 'extracted', {'document_text': 'v1'})
+        journal.record('a.txt', 'reference', {'reference_checkpoints': [1]})
+        journal.record('b.txt', 'extracted', {'document_text': 'b'})
+        journal.record('b.txt', 'parsed', {'algorithm_checkpoints': []})
+        journal.record('b.txt', 'extracted', {'document_text': 'b2'})
+        # 模拟写入中断留下的半行
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write('{"document": "a.txt", "stage": "evalu')
+
+        resumed = RunJournal(str(path), resume=True)
+        assert resumed.stages('a.txt') == {'extracted': {'document_text': 'v1'},
+                                          'reference': {'reference_checkpoints': [1]}}
+        assert resumed.stages('b.txt') == {'extracted': {'document_text': 'b2'}}
+
+        # 半行之后继续追加的记录在下次继续运行时仍可读取
+        resumed.record('b.txt', 'parsed', {'algorithm_checkpoints': [2]})
+        replayed = RunJournal(str(path), resume=True)
+        assert replayed.stages('b.txt') == {'extracted': {'document_text': 'b2'},
+                                           'parsed': {'algorithm_checkpoints': [2]}}
+        assert replayed.stages('a.txt') == resumed.stages('a.txt')
+
+        assert RunJournal(str(path)).stages('a.txt') == {}
+        assert not path.exists()
+
+    def test_concurrent_records(self, tmp_path):
+        """测试多线程同时写入时每行完整"""
+        path = tmp_path / "journal.jsonl"
+        journal = RunJournal(str(path))
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda i: journal.record(f"doc{i}", 'parsed', {'items': 'x' * 5000}), range(200)))
+
+        lines = path.read_text(encoding='utf-8').splitlines()
+        assert len(lines) == 200
+        assert all(json.loads(line)['stage'] == 'parsed' for line in lines)
+
+    def test_unknown_stage(self, tmp_path):
+        """测试未知阶段报错"""
+        with pytest.raises(ValueError):
+            RunJournal(str(tmp_path / "journal.jsonl")).record('a.txt', 'uploaded', {})
+
+    def test_pipeline_resume_skips_paid_calls(self, tmp_path, monkeypatch):
+        """测试流水线中断后继续运行: 已评估的文档跳过,已生成的参考答案不再生成"""
+        documents = []
+        for name in ('a', 'b'):
+            doc_file = tmp_path / f"{name}.txt"
+            doc_file.write_text(f"招标文件{name} 投标人须具备信息系统集成资质", encoding='utf-8')
+            documents.append({'path': str(doc_file), 'document_id': name})
+        calls = []
+
+        def make_pipeline(resume, fail_evaluation):
+            pipeline = BidParserEvaluationPipeline({
+                'claude_api_key': '',
+                'output_dir': str(tmp_path / "output"),
+                'enable_dedup': False,
+                'resume': resume
+            })
+
+            def create_message(payload, timeout=60):
+                # 客户端捕获接口异常后返回带 error 的评估结果,评估本身不会抛出
+                document = 'b' if '"content": "b"' in payload['messages'][0]['content'] else 'a'
+                calls.append(('evaluate', document))
+                if fail_evaluation and document == 'b':
+                    raise RuntimeError("连接中断")
+                return {'content': [{'text': '{"overall_score": 90}'}]}
+
+            monkeypatch.setattr(pipeline.algorithm_client, 'parse_bid_document',
+                                lambda document_id: calls.append(('parse', document_id)) or [{'content': document_id}])
+            monkeypatch.setattr(pipeline.claude_client, 'generate_reference_checkpoints',
+                                lambda text: calls.append(('reference', text[4])) or [{'content': text[4]}])
+            monkeypatch.setattr(pipeline.claude_client, 'create_message', create_message)
+            return pipeline
+
+        first = make_pipeline(resume=False, fail_evaluation=True).evaluate_batch(documents)
+        assert 'error' in first[1]
+        # 运行日志不保存文档全文,继续运行时重新提取
+        assert "信息系统集成资质" not in (tmp_path / "output" / "run_journal.jsonl").read_text(encoding='utf-8')
+
+        calls.clear()
+        second = make_pipeline(resume=True, fail_evaluation=False).evaluate_batch(documents)
+        assert calls == [('evaluate', 'b')]
+        assert [r['overall_score'] for r in second] == [90, 90]
+        assert second[0]['metadata']['document_path'] == documents[0]['path']
+
+        # 文件修改后记录作废,重新处理
+        calls.clear()
+        (tmp_path / "a.txt").write_text("招标文件a 修订版", encoding='utf-8')
+        make_pipeline(resume=True, fail_evaluation=False).evaluate_batch(documents)
+        assert calls == [('parse', 'a'), ('reference', 'a'), ('evaluate', 'a')]
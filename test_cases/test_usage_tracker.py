@@ -0,0 +1,151 @@
+"""
+大模型用量统计测试用例
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from api_clients.llm_cache import LLMResponseCache
+from api_clients.llm_provider import LLMProvider
+from api_clients.usage_tracker import BudgetExceededError, UsageTracker, usage_context
+from bid_evaluation_pipeline import BidParserEvaluationPipeline
+
+
+class FakeProvider(LLMProvider):
+    """固定返回带 usage 的响应"""
+
+    name = 'fake'
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.calls = 0
+
+    def _send(self, payload, timeout):
+        self.calls += 1
+        if self.calls == 1 and payload.get('fail_once'):
+            error = Exception("HTTP 529")
+            error.response = SimpleNamespace(status_code=529, headers={'retry-after': '0.01'})
+            raise error
+        return {"content": [{"text": "ok"}], "usage": {"input_tokens": 100, "output_tokens": 20}}
+
+
+def make_payload(prompt, **extra):
+    payload = {"model": "usage-model", "max_tokens": 100, "temperature": 0.1,
+               "messages": [{"role": "user", "content": prompt}]}
+    payload.update(extra)
+    return payload
+
+
+class TestUsageTracker:
+    """用量统计测试"""
+
+    @pytest.fixture()
+    def cache(self, tmp_path):
+        cache = LLMResponseCache(str(tmp_path / "llm_cache.sqlite"))
+        yield cache
+        cache.close()
+
+    def test_records_grouped_by_context(self):
+        """测试按 usage_context 标记的阶段和文档汇总"""
+        tracker = UsageTracker(prices={'m': {'input': 3, 'output': 15}})
+        with usage_context(document='a.pdf'):
+            with usage_context(stage='reference_generation'):
+                tracker.record('claude', 'm', {'input_tokens': 1000, 'output_tokens': 100}, latency=1.0)
+            with usage_context(stage='evaluation'):
+                tracker.record('claude', 'm', {'input_tokens': 500, 'output_tokens': 50}, latency=2.0, retries=1)
+        tracker.record('zhipuai', 'glm', {'prompt_tokens': 10, 'completion_tokens': 5}, stage='extraction')
+
+        summary = tracker.summary()
+        assert summary['total']['calls'] == 3
+        assert summary['total']['prompt_tokens'] == 1510
+        assert summary['total']['retries'] == 1
+        assert summary['by_stage']['evaluation']['completion_tokens'] == 50
+        assert summary['by_document']['a.pdf']['calls'] == 2
+        assert summary['by_document']['unknown']['calls'] == 1
+        assert summary['by_model']['claude/m']['cost'] == pytest.approx((1500 * 3 + 150 * 15) / 1_000_000)
+        assert summary['by_model']['zhipuai/glm']['cost'] is None
+
+    def test_prompt_cache_tokens(self):
+        """测试提示词缓存读取/写入Token单独统计,按缓存单价计费且缓存读取不计入预算"""
+        tracker = UsageTracker(token_budget=1000, prices={'m': {'input': 10, 'output': 0}})
+        tracker.record('claude', 'm', {'input_tokens': 100, 'output_tokens': 0,
+                                       'cache_creation_input_tokens': 400})
+        tracker.record('claude', 'm', {'input_tokens': 100, 'output_tokens': 0,
+                                       'cache_read_input_tokens': 400})
+
+        total = tracker.summary()['total']
+        assert (total['cache_write_tokens'], total['cache_read_tokens']) == (400, 400)
+        assert total['cost'] == pytest.approx((200 * 10 + 400 * 12.5 + 400 * 1) / 1_000_000)
+        assert tracker.used_tokens() == 600
+
+    def test_context_isolated_between_tasks(self):
+        """测试并发协程各自的上下文互不影响"""
+        tracker = UsageTracker()
+
+        async def evaluate(document):
+            with usage_context(document=document):
+                await asyncio.sleep(0)
+                await asyncio.to_thread(tracker.record, 'claude', 'm', {'input_tokens': 1})
+
+        async def main():
+            await asyncio.gather(*(evaluate(f"doc{i}") for i in range(5)))
+
+        asyncio.run(main())
+        assert sorted(tracker.summary()['by_document']) == [f"doc{i}" for i in range(5)]
+
+    def test_budget_guard(self):
+        """测试调用前预算检查和按进度推算"""
+        tracker = UsageTracker(token_budget=1000)
+        tracker.record('claude', 'm', {'input_tokens': 300, 'output_tokens': 100})
+
+        tracker.check_budget(500)
+        with pytest.raises(BudgetExceededError):
+            tracker.check_budget(700)
+
+        tracker.check_projection(1, 2)
+        with pytest.raises(BudgetExceededError):
+            tracker.check_projection(1, 3)
+
+    def test_provider_records_calls(self, cache, tmp_path):
+        """测试统一调用层记录耗时、重试和缓存命中,并保存JSON"""
+        tracker = UsageTracker()
+        provider = FakeProvider(cache=cache, usage_tracker=tracker, base_delay=0.01)
+
+        with usage_context(stage='evaluation', document='b.pdf'):
+            provider.create(make_payload("评估", fail_once=True))
+            provider.create(make_payload("评估", fail_once=True))
+
+        first, second = tracker.records
+        assert (first['retries'], first['cache_hit'], first['prompt_tokens']) == (1, False, 100)
+        assert first['latency'] is not None
+        assert (second['cache_hit'], second['prompt_tokens']) == (True, 0)
+
+        total = tracker.summary()['total']
+        assert total['cache_hit_rate'] == 50.0
+
+        data = json.loads(tracker.save(str(tmp_path / "llm_usage.json")).read_text(encoding='utf-8'))
+        assert data['by_stage']['evaluation']['calls'] == 2
+        assert len(data['records']) == 2
+
+    def test_provider_stops_over_budget(self, cache):
+        """测试超出预算时不再发送请求"""
+        tracker = UsageTracker(token_budget=150)
+        provider = FakeProvider(cache=cache, usage_tracker=tracker)
+
+        provider.create(make_payload("第一次"))
+        with pytest.raises(BudgetExceededError):
+            provider.create(make_payload("第二次"))
+        assert provider.calls == 1
+
+    def test_pipelines_keep_own_budget(self, tmp_path):
+        """测试同一进程中的多个流水线各自使用自己的预算和单价"""
+        limited = BidParserEvaluationPipeline({'claude_api_key': '', 'output_dir': str(tmp_path / "a"),
+                                               'llm_token_budget': 100, 'llm_prices': {'m': {'input': 3}}})
+        unlimited = BidParserEvaluationPipeline({'claude_api_key': '', 'output_dir': str(tmp_path / "b")})
+
+        assert limited.usage_tracker is not unlimited.usage_tracker
+        assert limited.claude_client.provider.usage_tracker is limited.usage_tracker
+        assert (limited.usage_tracker.token_budget, limited.usage_tracker.prices) == (100, {'m': {'input': 3}})
+        assert (unlimited.usage_tracker.token_budget, unlimited.usage_tracker.prices) == (None, {})
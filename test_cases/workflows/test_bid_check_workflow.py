@@ -8,9 +8,9 @@ import time
 import uuid
 import pytest
 import yaml
-from datetime import datetime
 
 from conf.set_conf import read_yaml, write_yaml
+from utils.results_store import save_response
 
 
 class TestBidCheckWorkflow:
@@ -24,18 +24,12 @@ class TestBidCheckWorkflow:
             response_type: 响应类型 ('check_point' 或 'bid_info')
             response_data: 响应数据字典
         """
-        output_dir = './test_data/evaluation/responses'
-        os.makedirs(output_dir, exist_ok=True)
-
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"{response_type}_response_{timestamp}.json"
-        filepath = os.path.join(output_dir, filename)
-
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(response_data, f, ensure_ascii=False, indent=2)
+        # 以招标文件路径作为文档标识,评估脚本按同一路径查找最新响应
+        with open('./test_data/bid_check_workflow.yaml', 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f) or {}
+        document = config.get('zb_upload', {}).get('files', {}).get('file') or 'unknown'
 
-        print(f"✓ 响应已保存到: {filepath}")
-        return filepath
+        return save_response(response_type, response_data, document)
 
     def test_01_upload_documents(self, api):
         """
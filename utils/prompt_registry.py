@@ -0,0 +1,155 @@
+"""
+提示词模板注册表
+模板在进程内只加载和校验一次,文件修改后自动重新读取;模板预先拆分为静态片段和变量,渲染时只做拼接
+"""
+import hashlib
+import os
+import threading
+from pathlib import Path
+from string import Formatter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+PROMPT_ROOT = Path(__file__).parents[1] / 'config'
+
+
+class PromptTemplateError(ValueError):
+    """模板格式错误或缺少必需的变量"""
+
+
+class PromptTemplate:
+    """预编译的提示词模板"""
+
+    def __init__(self, name: str, text: str, source: str = '<default>'):
+        """
+        编译模板
+        :param name: 模板名称
+        :param text: 模板文本(str.format 语法,{{ }} 表示字面量花括号)
+        :param source: 模板来源(文件路径或 <default>)
+        """
+        self.name = name
+        self.text = text
+        self.source = source
+        self.version = hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+        self.parts: List[Tuple[str, Optional[str], str, Optional[str]]] = []
+        try:
+            for literal, field, format_spec, conversion in Formatter().parse(text):
+                if field is not None and (not field or not field.isidentifier()):
+                    raise PromptTemplateError(f"模板 {name} 中的变量名不合法: {{{field}}}")
+                self.parts.append((literal, field, format_spec or '', conversion))
+        except ValueError as e:
+            if isinstance(e, PromptTemplateError):
+                raise
+            raise PromptTemplateError(f"模板 {name} 格式错误({source}): {e}") from e
+        self.fields = {field for _, field, _, _ in self.parts if field}
+
+    def render(self, **values) -> str:
+        """
+        填充变量,结果与 str.format 一致
+        :param values: 变量值
+        :return: 提示词文本
+        """
+        missing = self.fields - values.keys()
+        if missing:
+            raise PromptTemplateError(f"模板 {self.name} 缺少变量: {', '.join(sorted(missing))}")
+
+        pieces = []
+        for literal, field, format_spec, conversion in self.parts:
+            pieces.append(literal)
+            if field is None:
+                continue
+            value = values[field]
+            if conversion == 'r':
+                value = repr(value)
+            elif conversion == 'a':
+                value = ascii(value)
+            elif conversion == 's':
+                value = str(value)
+            pieces.append(format(value, format_spec) if format_spec else str(value))
+        return ''.join(pieces)
+
+
+class PromptRegistry:
+    """提示词模板注册表"""
+
+    def __init__(self, root: Path = PROMPT_ROOT):
+        """
+        :param root: 模板文件根目录,注册时的相对路径基于该目录
+        """
+        self.root = Path(root)
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, path: str, default: Optional[str] = None,
+                 required_fields: Iterable[str] = ()):
+        """
+        注册模板
+        :param name: 模板名称
+        :param path: 模板文件路径(相对 root)
+        :param default: 文件不存在时使用的默认模板
+        :param required_fields: 模板必须包含的变量,加载时校验
+        """
+        with self._lock:
+            self._entries[name] = {
+                'path': self.root / path,
+                'default': default,
+                'required_fields': set(required_fields),
+                'mtime': None,
+                'template': None
+            }
+
+    def get(self, name: str) -> PromptTemplate:
+        """
+        获取模板,文件修改时间变化时重新加载
+        :param name: 模板名称
+        :return: 编译后的模板
+        """
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                raise KeyError(f"未注册的提示词模板: {name}")
+
+            try:
+                mtime = os.stat(entry['path']).st_mtime_ns
+            except FileNotFoundError:
+                mtime = None
+
+            if entry['template'] is None or mtime != entry['mtime']:
+                entry['template'] = self._load(name, entry, mtime)
+                entry['mtime'] = mtime
+            return entry['template']
+
+    def render(self, name: str, **values) -> str:
+        """渲染模板"""
+        return self.get(name).render(**values)
+
+    def version(self, name: str) -> str:
+        """模板内容的哈希,模板修改后变化,可用作缓存键的一部分"""
+        return self.get(name).version
+
+    @staticmethod
+    def _load(name: str, entry: Dict, mtime: Optional[int]) -> PromptTemplate:
+        """读取并校验模板"""
+        if mtime is None:
+            if entry['default'] is None:
+                raise FileNotFoundError(f"提示词模板不存在: {entry['path']}")
+            template = PromptTemplate(name, entry['default'])
+        else:
+            with open(entry['path'], 'r', encoding='utf-8') as f:
+                template = PromptTemplate(name, f.read(), str(entry['path']))
+
+        missing = entry['required_fields'] - template.fields
+        unknown = template.fields - entry['required_fields'] if entry['required_fields'] else set()
+        if missing or unknown:
+            raise PromptTemplateError(
+                f"模板 {name} 变量不匹配({template.source}): "
+                f"缺少 {sorted(missing)}, 多余 {sorted(unknown)}"
+            )
+        return template
+
+
+_default_registry = PromptRegistry()
+
+
+def get_prompt_registry() -> PromptRegistry:
+    """获取进程内共享的提示词注册表"""
+    return _default_registry
@@ -0,0 +1,383 @@
+"""
+评估结果存储
+基于SQLite的只追加结果库,按文档、运行ID、时间和评估器版本建索引,替代按文件名/修改时间排序的时间戳JSON文件;
+支持每个文档的最新结果、两次运行的差异和指标趋势查询,可导出为Parquet/CSV列式文件
+"""
+import csv
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from conf.set_conf import resolve_path
+
+try:
+    import pandas as pd
+    HAS_PANDAS = True
+except ImportError:
+    HAS_PANDAS = False
+
+DEFAULT_STORE_PATH = './test_data/evaluation/results.sqlite'
+# 旧版按时间戳保存的算法响应文件目录(结果库中没有记录时从这里读取)
+LEGACY_RESPONSES_DIR = './test_data/evaluation/responses'
+
+# 单独建列的指标,趋势和差异查询只读这些列,不解析结果JSON
+METRIC_COLUMNS = ('overall_score', 'f1_score', 'precision', 'recall', 'coverage', 'matched')
+# 导出和查询返回的元数据列
+META_COLUMNS = ('id', 'kind', 'document', 'run_id', 'created_at', 'evaluator_version')
+
+
+def new_run_id() -> str:
+    """生成运行ID: 时间戳加随机后缀,按字符串排序即按时间排序"""
+    return f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+
+
+def extract_metrics(payload: Dict) -> Dict[str, Any]:
+    """
+    从结果中提取指标列: 依次查找顶层、comparison 和 evaluation_result 中的同名字段
+    :param payload: 结果
+    :return: {指标: 值},缺少的指标不包含在内
+    """
+    metrics = {}
+    for section in (payload, payload.get('comparison'), payload.get('evaluation_result')):
+        if not isinstance(section, dict):
+            continue
+        for name in METRIC_COLUMNS:
+            value = section.get(name)
+            if name not in metrics and isinstance(value, (int, float)) and not isinstance(value, bool):
+                metrics[name] = value
+    return metrics
+
+
+class ResultsStore:
+    """只追加的评估结果库"""
+
+    def __init__(self, db_path: str = DEFAULT_STORE_PATH):
+        """
+        打开结果库
+        :param db_path: SQLite数据库路径(相对路径基于项目根目录)
+        """
+        self.db_path = resolve_path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        metric_columns = ''.join(f"{name} REAL,\n" for name in METRIC_COLUMNS)
+        self._conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS results (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                document TEXT NOT NULL,
+                run_id TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                evaluator_version TEXT,
+                {metric_columns}
+                payload TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_results_document ON results(kind, document, created_at);
+            CREATE INDEX IF NOT EXISTS idx_results_run ON results(run_id, kind);
+            CREATE INDEX IF NOT EXISTS idx_results_version ON results(kind, evaluator_version, created_at);
+            CREATE TRIGGER IF NOT EXISTS results_no_update BEFORE UPDATE ON results
+                BEGIN SELECT RAISE(ABORT, 'results are append-only'); END;
+            CREATE TRIGGER IF NOT EXISTS results_no_delete BEFORE DELETE ON results
+                BEGIN SELECT RAISE(ABORT, 'results are append-only'); END;
+        """)
+        self._conn.commit()
+
+    def append(self, kind: str, document: str, payload: Dict, run_id: Optional[str] = None,
+               evaluator_version: Optional[str] = None, metrics: Optional[Dict] = None,
+               created_at: Optional[float] = None) -> Dict:
+        """
+        追加一条结果(已有记录不会被修改)
+        :param kind: 结果类型,如 'comparison'、'check_point_response'
+        :param document: 文档标识(如招标文件路径)
+        :param payload: 结果内容,需可JSON序列化
+        :param run_id: 运行ID,同一次运行的多个文档共用,默认新生成
+        :param evaluator_version: 评估器版本,如 'v2'
+        :param metrics: 指标列,默认从 payload 中提取(见 extract_metrics)
+        :param created_at: 记录时间(时间戳),默认当前时间
+        :return: {'id', 'run_id'}
+        """
+        run_id = run_id or new_run_id()
+        metrics = extract_metrics(payload) if metrics is None else metrics
+        unknown = set(metrics) - set(METRIC_COLUMNS)
+        if unknown:
+            raise ValueError(f"不支持的指标列: {', '.join(sorted(unknown))}")
+
+        columns = ['kind', 'document', 'run_id', 'created_at', 'evaluator_version', 'payload', *metrics]
+        values = [kind, document, run_id, created_at if created_at is not None else time.time(),
+                  evaluator_version, json.dumps(payload, ensure_ascii=False), *metrics.values()]
+        with self._lock:
+            cursor = self._conn.execute(
+                f"INSERT INTO results ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                values
+            )
+            self._conn.commit()
+        return {'id': cursor.lastrowid, 'run_id': run_id}
+
+    def latest(self, kind: str, document: Optional[str] = None,
+               evaluator_version: Optional[str] = None) -> Optional[Dict]:
+        """
+        最新的一条结果
+        :param kind: 结果类型
+        :param document: 文档标识,默认不限文档
+        :param evaluator_version: 评估器版本,默认不限版本
+        :return: 记录(含解析后的 payload),没有时返回None
+        """
+        rows = self.history(kind, document, evaluator_version, limit=1, with_payload=True)
+        return rows[0] if rows else None
+
+    def history(self, kind: str, document: Optional[str] = None, evaluator_version: Optional[str] = None,
+                limit: Optional[int] = None, with_payload: bool = False) -> List[Dict]:
+        """
+        按时间倒序的结果
+        :param limit: 最多返回条数,默认全部
+        :param with_payload: 是否返回解析后的 payload(只看指标时不需要)
+        :return: 记录列表
+        """
+        where, params = self._filters(kind=kind, document=document, evaluator_version=evaluator_version)
+        sql = (f"SELECT {self._select_columns(with_payload)} FROM results WHERE {where} "
+               f"ORDER BY created_at DESC, id DESC")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._query(sql, params)
+
+    def latest_per_document(self, kind: str, evaluator_version: Optional[str] = None,
+                            with_payload: bool = False) -> List[Dict]:
+        """
+        每个文档最新的一条结果
+        :return: 记录列表,按文档排序
+        """
+        where, params = self._filters(kind=kind, evaluator_version=evaluator_version)
+        sql = f"""
+            SELECT {self._select_columns(with_payload)} FROM (
+                SELECT *, ROW_NUMBER() OVER (
+                    PARTITION BY document ORDER BY created_at DESC, id DESC
+                ) AS position
+                FROM results WHERE {where}
+            ) WHERE position = 1 ORDER BY document
+        """
+        return self._query(sql, params)
+
+    def runs(self, kind: str, evaluator_version: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """
+        运行列表,按开始时间倒序
+        :return: [{'run_id', 'evaluator_version', 'started_at', 'documents'}]
+        """
+        where, params = self._filters(kind=kind, evaluator_version=evaluator_version)
+        sql = (f"SELECT run_id, MAX(evaluator_version) AS evaluator_version, MIN(created_at) AS started_at, "
+               f"COUNT(DISTINCT document) AS documents FROM results WHERE {where} "
+               f"GROUP BY run_id ORDER BY started_at DESC")
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return self._query(sql, params)
+
+    def diff(self, run_a: str, run_b: str, kind: str) -> Dict:
+        """
+        两次运行的指标差异(同一运行内一个文档有多条记录时取最新的一条)
+        :param run_a: 基准运行ID
+        :param run_b: 对比运行ID
+        :param kind: 结果类型
+        :return: {
+            'documents': {文档: {指标: {'a', 'b', 'delta'}}}(两次运行都有的文档),
+            'only_in_a': [文档], 'only_in_b': [文档]
+        }
+        """
+        side_a = {row['document']: row for row in self._run_rows(run_a, kind)}
+        side_b = {row['document']: row for row in self._run_rows(run_b, kind)}
+
+        documents = {}
+        for document in sorted(side_a.keys() & side_b.keys()):
+            changes = {}
+            for name in METRIC_COLUMNS:
+                a, b = side_a[document][name], side_b[document][name]
+                if a is None and b is None:
+                    continue
+                changes[name] = {'a': a, 'b': b, 'delta': None if a is None or b is None else round(b - a, 4)}
+            documents[document] = changes
+        return {
+            'documents': documents,
+            'only_in_a': sorted(side_a.keys() - side_b.keys()),
+            'only_in_b': sorted(side_b.keys() - side_a.keys())
+        }
+
+    def trend(self, metric: str, kind: str, document: Optional[str] = None,
+              evaluator_version: Optional[str] = None, since: Optional[float] = None) -> List[Dict]:
+        """
+        指标趋势: 每次运行的平均值,按时间顺序
+        :param metric: 指标列,取值见 METRIC_COLUMNS
+        :param since: 只统计该时间戳之后的记录
+        :return: [{'run_id', 'evaluator_version', 'started_at', 'documents', 'value'}]
+        """
+        if metric not in METRIC_COLUMNS:
+            raise ValueError(f"不支持的指标: {metric}")
+        where, params = self._filters(kind=kind, document=document, evaluator_version=evaluator_version)
+        if since is not None:
+            where += " AND created_at >= ?"
+            params.append(since)
+        sql = (f"SELECT run_id, MAX(evaluator_version) AS evaluator_version, MIN(created_at) AS started_at, "
+               f"COUNT(DISTINCT document) AS documents, AVG({metric}) AS value "
+               f"FROM results WHERE {where} AND {metric} IS NOT NULL "
+               f"GROUP BY run_id ORDER BY started_at")
+        return self._query(sql, params)
+
+    def export(self, path: str, kind: Optional[str] = None) -> Path:
+        """
+        导出元数据和指标列(不含结果JSON),后缀为 .parquet 时导出Parquet(需要 pandas 和 pyarrow),否则导出CSV
+        :param path: 导出文件路径
+        :param kind: 结果类型,默认全部
+        :return: 实际导出的文件路径(无法导出Parquet时改为同名 .csv)
+        """
+        where, params = self._filters(kind=kind)
+        rows = self._query(f"SELECT {self._select_columns(False)} FROM results WHERE {where} ORDER BY id", params)
+        columns = list(META_COLUMNS + METRIC_COLUMNS)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        if path.suffix == '.parquet':
+            if HAS_PANDAS:
+                try:
+                    pd.DataFrame(rows, columns=columns).to_parquet(path, index=False)
+                    return path
+                except ImportError:
+                    pass
+            print("[WARNING] 导出Parquet需要安装 pandas 和 pyarrow,改为导出CSV")
+            path = path.with_suffix('.csv')
+
+        with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=columns)
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def import_json_files(self, directory: str, pattern: str, kind: str,
+                          document: str = 'unknown', evaluator_version: Optional[str] = None) -> int:
+        """
+        导入旧的时间戳JSON结果文件(已导入的文件按 run_id 跳过),记录时间取文件修改时间
+        :param directory: 目录
+        :param pattern: 文件匹配模式,如 'claude_comparison_v2_*.json'
+        :param kind: 结果类型
+        :param document: 文档标识
+        :param evaluator_version: 评估器版本
+        :return: 导入的文件数
+        """
+        imported = 0
+        for file in sorted(Path(directory).glob(pattern)):
+            run_id = f"file:{file.name}"
+            with self._lock:
+                exists = self._conn.execute(
+                    "SELECT 1 FROM results WHERE run_id = ? AND kind = ? LIMIT 1", (run_id, kind)
+                ).fetchone()
+            if exists:
+                continue
+            try:
+                with open(file, 'r', encoding='utf-8') as f:
+                    payload = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"读取结果文件失败 {file}: {str(e)}")
+                continue
+            self.append(kind, document, payload, run_id=run_id, evaluator_version=evaluator_version,
+                        created_at=file.stat().st_mtime)
+            imported += 1
+        return imported
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+    def _run_rows(self, run_id: str, kind: str) -> List[Dict]:
+        """一次运行的记录,同一文档按时间顺序排列(后面的覆盖前面的)"""
+        return self._query(f"SELECT {self._select_columns(False)} FROM results "
+                           f"WHERE run_id = ? AND kind = ? ORDER BY created_at, id", [run_id, kind])
+
+    @staticmethod
+    def _filters(**conditions) -> tuple:
+        """值不为None的条件拼接为 WHERE 子句"""
+        clauses, params = ['1 = 1'], []
+        for column, value in conditions.items():
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        return ' AND '.join(clauses), params
+
+    @staticmethod
+    def _select_columns(with_payload: bool) -> str:
+        return ', '.join(META_COLUMNS + METRIC_COLUMNS + (('payload',) if with_payload else ()))
+
+    def _query(self, sql: str, params: List) -> List[Dict]:
+        with self._lock:
+            rows = [dict(row) for row in self._conn.execute(sql, params).fetchall()]
+        for row in rows:
+            if 'payload' in row:
+                row['payload'] = json.loads(row['payload'])
+        return rows
+
+
+_stores: Dict[str, ResultsStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_results_store(db_path: str = DEFAULT_STORE_PATH) -> ResultsStore:
+    """获取进程内共享的结果库(同一路径只打开一次)"""
+    key = str(resolve_path(db_path))
+    with _stores_lock:
+        if key not in _stores:
+            _stores[key] = ResultsStore(db_path)
+        return _stores[key]
+
+
+def save_response(response_type: str, response_data: Dict, document: str = 'unknown',
+                  store: Optional[ResultsStore] = None) -> Dict:
+    """
+    保存算法接口响应,供后续评估读取
+    :param response_type: 'check_point' 或 'bid_info'
+    :param response_data: 响应数据
+    :param document: 文档标识(招标文件路径)
+    :param store: 结果库,默认共享的结果库
+    :return: {'id', 'run_id'}
+    """
+    store = store or get_results_store()
+    record = store.append(f"{response_type}_response", document, response_data)
+    print(f"✓ 响应已保存到结果库: {store.db_path} (id={record['id']})")
+    return record
+
+
+def find_latest_response(response_type: str, document: Optional[str] = None,
+                         store: Optional[ResultsStore] = None,
+                         legacy_dir: str = LEGACY_RESPONSES_DIR, any_document: bool = False) -> Optional[Dict]:
+    """
+    查找最新的算法接口响应: 先查结果库,没有时读取旧版时间戳文件
+    :param response_type: 'check_point' 或 'bid_info'
+    :param document: 文档标识,指定时只取该文档的记录;默认不限文档
+    :param store: 结果库,默认共享的结果库
+    :param legacy_dir: 旧版响应文件目录
+    :param any_document: 指定文档没有记录时是否改用其他文档的最新记录(会打印警告),默认不使用
+    :return: 响应数据,没有时返回None
+    """
+    store = store or get_results_store()
+    kind = f"{response_type}_response"
+    record = store.latest(kind, document) if document else store.latest(kind)
+    if record is None and document and any_document:
+        record = store.latest(kind)
+        if record:
+            print(f"[WARNING] 结果库中没有 {document} 的响应,改用其他文档的最新响应: {record['document']}")
+    if record:
+        print(f"✓ 找到最新响应: {record['document']} (运行 {record['run_id']})")
+        return record['payload']
+
+    # 旧版文件名中的时间戳按字符串排序即按时间排序
+    legacy_dir = Path(legacy_dir)
+    files = sorted(legacy_dir.glob(f"{response_type}_response_*.json")) if legacy_dir.exists() else []
+    if not files:
+        return None
+    print(f"✓ 找到最新响应文件: {files[-1].name}")
+    with open(files[-1], 'r', encoding='utf-8') as f:
+        return json.load(f)
@@ -0,0 +1,110 @@
+"""
+评估运行日志(预写日志)
+每份文档完成一个阶段就追加一行JSON并落盘,运行中断后可从最后完成的阶段继续,
+已付费的大模型调用(参考答案、评估)不再重复
+"""
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+
+# 单份文档的处理阶段,按先后顺序排列
+STAGES = ('extracted', 'parsed', 'reference', 'evaluated')
+
+
+class RunJournal:
+    """追加写入的JSONL运行日志"""
+
+    def __init__(self, path: str, resume: bool = False):
+        """
+        打开运行日志
+        :param path: 日志文件路径
+        :param resume: True 时读取已有日志继续追加,False 时清空旧日志开始新的运行
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._stages: Dict[str, Dict[str, Dict]] = {}
+        self._lock = threading.Lock()
+        if resume:
+            self._load()
+        elif self.path.exists():
+            self.path.unlink()
+
+    def _load(self):
+        """重放已有日志,写入中断产生的不完整行将被忽略"""
+        if not self.path.exists():
+            return
+        self._truncate_partial_line()
+        skipped = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self._apply(entry['document'], entry['stage'], entry['data'])
+                except (ValueError, KeyError, TypeError):
+                    skipped += 1
+        if skipped:
+            print(f"[WARNING] 运行日志中有 {skipped} 行无法解析,已忽略: {self.path}")
+        print(f"已加载运行日志: {len(self._stages)} 个文档 ({self.path})")
+
+    def _truncate_partial_line(self):
+        """截掉写入中断留下的末尾半行,否则继续追加的第一条记录会接在半行后面而无法解析"""
+        with open(self.path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            if end == 0:
+                return
+            f.seek(end - 1)
+            if f.read(1) == b'\n':
+                return
+            # 从末尾向前按块查找最后一个换行符
+            position = end
+            keep = 0
+            while position > 0:
+                start = max(0, position - 65536)
+                f.seek(start)
+                newline = f.read(position - start).rfind(b'\n')
+                if newline >= 0:
+                    keep = start + newline + 1
+                    break
+                position = start
+            f.truncate(keep)
+        print(f"[WARNING] 运行日志末尾有写入中断的半行,已截掉: {self.path}")
+
+    def _apply(self, document: str, stage: str, data: Dict):
+        """更新内存中的阶段状态: 某阶段重新完成时,其后各阶段的旧结果作废"""
+        if stage not in STAGES:
+            raise ValueError(f"未知的阶段: {stage}")
+        stages = self._stages.setdefault(document, {})
+        for later in STAGES[STAGES.index(stage) + 1:]:
+            stages.pop(later, None)
+        stages[stage] = data
+
+    def record(self, document: str, stage: str, data: Dict):
+        """
+        记录文档完成了一个阶段(写入并 fsync 后才返回)
+        :param document: 文档键(如文档绝对路径)
+        :param stage: 阶段,取值见 STAGES
+        :param data: 该阶段的结果,需可JSON序列化
+        """
+        if stage not in STAGES:
+            raise ValueError(f"未知的阶段: {stage}")
+        line = json.dumps({'time': time.time(), 'document': document, 'stage': stage, 'data': data},
+                          ensure_ascii=False) + '\n'
+        # 多个线程共用一个日志,整行在锁内一次写入
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._apply(document, stage, data)
+
+    def stages(self, document: str) -> Dict[str, Dict]:
+        """
+        文档已完成的阶段
+        :param document: 文档键
+        :return: {阶段: 结果}
+        """
+        with self._lock:
+            return dict(self._stages.get(document, {}))